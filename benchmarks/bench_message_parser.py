@@ -0,0 +1,266 @@
+"""
+Benchmark do parser de mensagens de texto.
+
+Gera um corpus determinístico de milhares de frases (verbos, ordens,
+formatos de valor, datas, descrições, ruído e conversa sem transação) e
+mede mensagens/segundo do message_parser contra o parser antigo com
+regexes em sequência, além de conferir que as frases entendidas pelo
+parser antigo continuam com o mesmo tipo e valor.
+
+Também confere frases com resultado conhecido (CASES e MULTI_CASES) e o tempo de
+entradas longas que não casam (ADVERSARIAL), que não podem travar o
+event loop, e, com --min-gain, que o message_parser não ficou mais lento
+que o parser antigo; sai com código 1 quando alguma falha (usado no CI).
+
+Uso: python benchmarks/bench_message_parser.py [--messages 5000] [--repeat 10] [--min-gain 1.0]
+"""
+import argparse
+import os
+import random
+import re
+import sys
+import time
+from datetime import date
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, 'src'))
+
+from message_parser import parse_financial_message, parse_financial_messages  # noqa: E402
+
+CATEGORIES = [
+    'alimentação', 'mercado', 'uber', 'farmácia', 'aluguel', 'internet', 'academia', 'padaria',
+    'material de escritório', 'conta de luz', 'restaurante', 'gasolina', 'cinema', 'pet shop',
+]
+INCOMES = ['salário', 'freelancer', 'pix', 'aluguel', 'venda', 'dividendos', 'bônus', 'reembolso']
+DESCRIPTIONS = ['almoço no trabalho', 'ida ao centro', 'pagamento mensal', 'projeto website', 'compras da semana']
+DATES = ['hoje', 'ontem', 'anteontem', '12/10', '3/1', '28/02/2024']
+CHATTER = ['oi', 'bom dia!', 'quanto gastei esse mês?', 'obrigado', 'me ajuda aqui', 'qual meu saldo']
+
+EXPENSE_TEMPLATES = [
+    'gastei {amount} com {category}',
+    'gastei {amount} reais com {category} - {description}',
+    'gastei R$ {amount} em {category}',
+    'gastei {amount} no {category} {date}',
+    'despesa {amount} {category}',
+    'paguei {amount} de {category}: {description}',
+    'paguei {category} de {amount}',
+    'comprei {category} por {amount} reais',
+    'comprei {category} por R${amount}',
+    'pago {category} de {amount}',
+    'hoje gastei {amount} com {category}',
+    'gastei {amount} com {category} ({description})',
+    'gastei {amount} com {category}, farmácia',
+    'gastei {amount} com {category} & {description}',
+]
+INCOME_TEMPLATES = [
+    'recebi {amount} de {category}',
+    'recebi R$ {amount} do {category} - {description}',
+    'renda {amount} {category}',
+    'ganhei {amount} {category} {date}',
+    'depositei {amount} na {category}',
+    'entraram {amount} reais de {category}',
+]
+
+TODAY = date(2024, 10, 20)
+# Frase -> (tipo, valor, categoria, data) esperados, ou None quando não deve ser entendida
+CASES = {
+    'gastei 50 com mercado': ('despesa', 50.0, 'mercado', None),
+    'gastei 50 reais com alimentação - almoço': ('despesa', 50.0, 'alimentação', None),
+    'paguei aluguel de 800': ('despesa', 800.0, 'aluguel', None),
+    'gastei R$ 1.234,56 em material de escritório': ('despesa', 1234.56, 'material de escritório', None),
+    'gastei 50 com mercado ontem': ('despesa', 50.0, 'mercado', date(2024, 10, 19)),
+    'gastei 50 ontem com mercado': ('despesa', 50.0, 'mercado', date(2024, 10, 19)),
+    'gastei 50 em 12/10 com mercado': ('despesa', 50.0, 'mercado', date(2024, 10, 12)),
+    'gastei 50 no mercado 12/10/2023: feira': ('despesa', 50.0, 'mercado', date(2023, 10, 12)),
+    'hoje gastei 30 no almoço': ('despesa', 30.0, 'almoço', None),
+    'recebi r$50 de pix': ('receita', 50.0, 'pix', None),
+    'comprei pizza por 40 reais': ('despesa', 40.0, 'pizza', None),
+    'gastei 50 com pet-shop!': ('despesa', 50.0, 'pet-shop', None),
+    'gastei 50': None,
+    'gastei 50 com mercado em 31/02': None,
+    'gastei 50 com mercado 29/02/2023': None,
+    'gastei 50 com mercado! ok': ('despesa', 50.0, 'mercado', None),
+    'gastei 50 com mercado (feira)': ('despesa', 50.0, 'mercado', None),
+    'gastei 50 com mercado, farmácia': ('despesa', 50.0, 'mercado', None),
+    'gastei 30 com pão & leite': ('despesa', 30.0, 'pão', None),
+    'gastei (50) com mercado': None,
+    'quanto gastei esse mês?': None,
+}
+# Mensagem -> [(tipo, valor, categoria)] esperados de parse_financial_messages
+MULTI_CASES = {
+    'gastei 12 com café e 40 com uber; recebi 200 de pix': [
+        ('despesa', 12.0, 'café'), ('despesa', 40.0, 'uber'), ('receita', 200.0, 'pix')
+    ],
+    'gastei 12 com café, 40 com uber\nrecebi 200 de pix': [
+        ('despesa', 12.0, 'café'), ('despesa', 40.0, 'uber'), ('receita', 200.0, 'pix')
+    ],
+    'paguei 100 de luz - conta de 2 meses e 3 dias': [('despesa', 100.0, 'luz')],
+    'paguei 100 de luz: parcelas de 2, 3 e 4 e recebi 50 de pix': [
+        ('despesa', 100.0, 'luz'), ('receita', 50.0, 'pix')
+    ],
+}
+# Entradas longas que não casam; antes levavam segundos por retrocesso no regex
+ADVERSARIAL = [
+    'gastei ' + 'abc ' * 800 + '50 ' + 'de ' * 800 + '!x',
+    ('gastei ' + 'abc ' * 60 + '50 ' + 'de ' * 60 + '!x\n') * 20,
+    'gastei 50 ' + 'com ' * 1000 + '- ' * 500,
+    'gastei' + ' abc de' * 42 + ' 5',
+]
+ADVERSARIAL_BUDGET_MS = 50
+
+
+def check_cases():
+    """Lista de falhas das frases conhecidas e das entradas adversariais"""
+    failures = []
+    for message, expected in CASES.items():
+        result = parse_financial_message(message, TODAY)
+        got = result and (result['type'], result['amount'], result['category'], result['date'])
+        if got != expected:
+            failures.append(f"{message!r}: esperado {expected}, obtido {got}")
+    for message, expected in MULTI_CASES.items():
+        transactions, _ = parse_financial_messages(message, TODAY)
+        got = [(result['type'], result['amount'], result['category']) for result in transactions]
+        if got != expected:
+            failures.append(f"{message!r}: esperado {expected}, obtido {got}")
+    for message in ADVERSARIAL:
+        start = time.perf_counter()
+        parse_financial_messages(message, TODAY)
+        elapsed_ms = (time.perf_counter() - start) * 1000
+        if elapsed_ms > ADVERSARIAL_BUDGET_MS:
+            failures.append(f"entrada de {len(message)} caracteres levou {elapsed_ms:.0f} ms")
+    return failures
+
+
+def random_amount(rng):
+    value = rng.choice([rng.randint(1, 99), rng.randint(100, 999), rng.randint(1000, 25000)])
+    cents = rng.randint(0, 99)
+    style = rng.randrange(4)
+    if style == 0:
+        return str(value)
+    if style == 1:
+        return f"{value},{cents:02d}"
+    if style == 2:
+        return f"{value:,}".replace(',', '.') + f",{cents:02d}"
+    return f"{value}.{cents:02d}" if value < 1000 else str(value)
+
+
+def corpus(size: int, seed: int = 42):
+    rng = random.Random(seed)
+    messages = []
+    for _ in range(size):
+        roll = rng.random()
+        if roll < 0.1:
+            messages.append(rng.choice(CHATTER))
+            continue
+        if roll < 0.65:
+            template, category = rng.choice(EXPENSE_TEMPLATES), rng.choice(CATEGORIES)
+        else:
+            template, category = rng.choice(INCOME_TEMPLATES), rng.choice(INCOMES)
+        message = template.format(
+            amount=random_amount(rng), category=category,
+            description=rng.choice(DESCRIPTIONS), date=rng.choice(DATES)
+        )
+        messages.append(message.upper() if rng.random() < 0.05 else message)
+    return messages
+
+
+# Parser anterior (bot.parse_financial_message), mantido só para comparação
+LEGACY_EXPENSE = [
+    r'gastei\s+r?\$?\s*(\d+(?:[.,]\d+)?)\s*(?:reais?\s*)?(?:com|em|para|de|do|da)?\s*([\w\s]+)(?:\s*[-:]\s*(.+))?',
+    r'despesa\s+(\d+(?:[.,]\d+)?)\s*([\w\s]+)(?:\s*[-:]\s*(.+))?',
+    r'paguei\s+r?\$?\s*(\d+(?:[.,]\d+)?)\s*(?:reais?\s*)?(?:com|em|para|de|do|da)?\s*([\w\s]+)(?:\s*[-:]\s*(.+))?',
+    r'comprei\s+([\w\s]+?)\s*por\s+r?\$?\s*(\d+(?:[.,]\d+)?)\s*(?:reais?)?',
+    r'pago\s+([\w\s]+?)\s*de\s+r?\$?\s*(\d+(?:[.,]\d+)?)\s*(?:reais?)?'
+]
+LEGACY_INCOME = [
+    r'recebi\s+r?\$?\s*(\d+(?:[.,]\d+)?)\s*(?:reais?\s*)?(?:de|do|da)?\s*([\w\s]+)(?:\s*[-:]\s*(.+))?',
+    r'renda\s+(\d+(?:[.,]\d+)?)\s*([\w\s]+)(?:\s*[-:]\s*(.+))?',
+    r'ganhei\s+r?\$?\s*(\d+(?:[.,]\d+)?)\s*(?:reais?\s*)?(?:com|em)?\s*([\w\s]+)(?:\s*[-:]\s*(.+))?',
+    r'depositei\s+r?\$?\s*(\d+(?:[.,]\d+)?)\s*(?:reais?\s*)?(?:na|em)?\s*([\w\s]+)(?:\s*[-:]\s*(.+))?',
+    r'entraram\s+r?\$?\s*(\d+(?:[.,]\d+)?)\s*(?:reais?\s*)?(?:na|em)?\s*([\w\s]+)(?:\s*[-:]\s*(.+))?'
+]
+
+
+def legacy_parse(text):
+    """Cópia fiel de bot.parse_financial_message antes do message_parser, descrição incluída"""
+    text = text.lower()
+    for pattern in LEGACY_EXPENSE:
+        match = re.search(pattern, text)
+        if match:
+            if 'comprei' in pattern or 'pago' in pattern:
+                category = match.group(1).strip()
+                amount = float(match.group(2).replace(',', '.'))
+                description = f'compra por {amount}' if 'comprei' in pattern else f'pagamento de {amount}'
+            else:
+                amount = float(match.group(1).replace(',', '.'))
+                category = match.group(2).strip() if len(match.groups()) > 1 and match.group(2) else ''
+                description = match.group(3).strip() if len(match.groups()) > 2 and match.group(3) else ''
+            if category:
+                return {'type': 'despesa', 'amount': amount, 'category': category, 'description': description}
+    for pattern in LEGACY_INCOME:
+        match = re.search(pattern, text)
+        if match:
+            amount = float(match.group(1).replace(',', '.'))
+            category = match.group(2).strip() if len(match.groups()) > 1 and match.group(2) else ''
+            description = match.group(3).strip() if len(match.groups()) > 2 and match.group(3) else ''
+            if category:
+                return {'type': 'receita', 'amount': amount, 'category': category, 'description': description}
+    return None
+
+
+def measure(parsers, messages, repeat):
+    """Melhor tempo de cada parser, alternando as rodadas para reduzir ruído; retorna msgs/s"""
+    best = [float('inf')] * len(parsers)
+    for _ in range(repeat):
+        for index, func in enumerate(parsers):
+            start = time.perf_counter()
+            for message in messages:
+                func(message)
+            best[index] = min(best[index], time.perf_counter() - start)
+    return [len(messages) / elapsed for elapsed in best]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--messages', type=int, default=5000)
+    parser.add_argument('--repeat', type=int, default=10)
+    parser.add_argument('--min-gain', type=float, default=0.0,
+                        help='falha se message_parser ficar abaixo desta razão sobre o parser antigo')
+    args = parser.parse_args()
+
+    messages = corpus(args.messages)
+
+    new_results = [parse_financial_message(message) for message in messages]
+    old_results = [legacy_parse(message) for message in messages]
+    understood_new = sum(1 for result in new_results if result)
+    understood_old = sum(1 for result in old_results if result)
+
+    # Onde o parser antigo leu o valor certo (sem separador de milhar), tipo e valor devem coincidir;
+    # a categoria pode mudar porque o antigo mantinha conectivos e datas ("no mercado ontem")
+    divergent = []
+    for message, new, old in zip(messages, new_results, old_results):
+        if old and '.' not in message and (not new or (new['type'], new['amount']) != (old['type'], old['amount'])):
+            divergent.append((message, old, new))
+
+    new_rate, old_rate = measure([parse_financial_message, legacy_parse], messages, args.repeat)
+
+    print(f"corpus: {len(messages)} mensagens")
+    print(f"{'parser':<16}{'entendidas':>12}{'msgs/s':>14}")
+    print(f"{'message_parser':<16}{understood_new:>12}{new_rate:>14,.0f}")
+    print(f"{'antigo (regex)':<16}{understood_old:>12}{old_rate:>14,.0f}")
+    print(f"ganho: {new_rate / old_rate:.1f}x")
+    print(f"divergências com o parser antigo: {len(divergent)}")
+    for message, old, new in divergent[:10]:
+        print(f"  {message!r}: antigo={old} novo={new}")
+
+    failures = check_cases()
+    if new_rate / old_rate < args.min_gain:
+        failures.append(f"ganho de {new_rate / old_rate:.2f}x abaixo do mínimo de {args.min_gain:.2f}x")
+    print(f"frases conhecidas, entradas adversariais e ganho mínimo: {len(failures)} falhas")
+    for failure in failures:
+        print(f"  ❌ {failure}")
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
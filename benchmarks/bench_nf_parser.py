@@ -0,0 +1,111 @@
+"""
+Benchmark do parsing da página da NFC-e.
+
+Compara o extrator em uma passada (nf_parser, com lxml e com o HTMLParser
+da biblioteca padrão) com o extrator antigo baseado em BeautifulSoup,
+sobre páginas salvas em fixtures/nfce/ e páginas sintéticas de 10 a 500
+itens. O extrator antigo fica só aqui e precisa do beautifulsoup4
+(pip install beautifulsoup4), que o bot não usa mais.
+
+Uso: python benchmarks/bench_nf_parser.py [--repeat 20]
+"""
+import argparse
+import os
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, 'src'))
+
+from nf_parser import parse_nf_page, parse_with_html_parser, lxml  # noqa: E402
+from tools.nf_fixtures import render_receipt  # noqa: E402
+
+try:
+    from bs4 import BeautifulSoup
+except ImportError:
+    BeautifulSoup = None
+
+
+def extract_data_from_soup(soup):
+    """Extrator anterior ao nf_parser, mantido só para comparação"""
+    #Shop info
+    header = soup.find('div', {'class': 'txtCenter'})
+    divs = header.find_all('div')
+    
+    #Items
+    items = {}
+
+    span_descricao = [i.text.strip() for i in soup.find_all('span', {'class': 'txtTit'}) if i.text.strip()]
+    span_codigo = [i.text.split(':')[1].split(')')[0].strip() for i in soup.find_all('span', {'class': 'RCod'}) if i.text.strip()]
+    span_quantidade = [i.text.strip().split(':')[1].strip() for i in soup.find_all('span', {'class': 'Rqtd'}) if i.text.strip()]
+    span_unidade = [i.text.split(':')[1].strip() for i in soup.find_all('span', {'class': 'RUN'}) if i.text.strip()]
+    span_valor_unitario = [i.text.strip().split(':')[1].strip() for i in soup.find_all('span', {'class': 'RvlUnit'}) if i.text.strip()]
+    span_valor_total = [i.text.strip() for i in soup.find_all('span', {'class': 'valor'}) if i.text.strip()]
+
+    for i in range(len(span_descricao)):
+        items[str(i)] = {
+            'descricao': span_descricao[i] if i < len(span_descricao) else '',
+            'codigo': span_codigo[i] if i < len(span_codigo) else '',
+            'quantidade': span_quantidade[i] if i < len(span_quantidade) else '',
+            'unidade': span_unidade[i] if i < len(span_unidade) else '',
+            'valor_unitario': span_valor_unitario[i] if i < len(span_valor_unitario) else '',
+            'valor_total': span_valor_total[i] if i < len(span_valor_total) else '',
+        }
+
+    return {
+        'shop_info': {
+            "loja": divs[0].text.strip(),
+            "cnpj": divs[1].text.strip().split(':')[1].strip(),
+            "endereco": divs[2].text.strip().replace('\n', '').replace('\t', ''),
+        },
+        'items': items
+    }
+
+
+def parse_with_soup(html):
+    return extract_data_from_soup(BeautifulSoup(html, "html.parser"))
+
+
+def measure(func, html, repeat):
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func(html)
+        best = min(best, time.perf_counter() - start)
+    return best * 1000
+
+
+def pages():
+    fixtures = os.path.join(ROOT, 'fixtures', 'nfce')
+    for name in sorted(os.listdir(fixtures)):
+        with open(os.path.join(fixtures, name), encoding='utf-8') as f:
+            yield name, f.read()
+    for items in (10, 50, 100, 250, 500):
+        yield f"sintética {items} itens", render_receipt(items, seed=items)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+
+    baseline = parse_with_soup if BeautifulSoup else None
+    if baseline is None:
+        print("(sem comparação: beautifulsoup4 não instalado)")
+
+    print(f"{'página':<28}{'itens':>6}{'nf_parser':>12}{'streaming':>12}{'bs4':>12}{'ganho':>8}")
+    for name, html in pages():
+        data = parse_nf_page(html)
+        fast = measure(parse_nf_page, html, args.repeat)
+        streaming = measure(parse_with_html_parser, html, args.repeat)
+        line = f"{name:<28}{len(data['items']):>6}{fast:>10.2f}ms{streaming:>10.2f}ms"
+        if baseline:
+            assert baseline(html) == data, f"resultado divergente em {name}"
+            slow = measure(baseline, html, args.repeat)
+            line += f"{slow:>10.2f}ms{slow / fast:>7.1f}x"
+        print(line)
+    if lxml is None:
+        print("(lxml não instalado: nf_parser usou o HTMLParser)")
+
+if __name__ == "__main__":
+    main()
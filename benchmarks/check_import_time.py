@@ -0,0 +1,80 @@
+"""
+Confere o custo de importar o bot (python -X importtime).
+
+Importar bot.py não pode carregar o leitor de notas (pyzbar, Pillow, lxml,
+Selenium), o servidor do webhook nem bibliotecas fora de uso, e o tempo
+total de importação deve ficar abaixo do orçamento. Roda algumas vezes e
+usa o melhor tempo, para reduzir o ruído. Sai com código 1 quando falha
+(usado no CI).
+
+Uso: python benchmarks/check_import_time.py [--budget-ms 1500] [--runs 3]
+"""
+import argparse
+import os
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SRC = os.path.join(ROOT, 'src')
+
+# Só podem ser carregados na primeira foto/documento ou no modo webhook
+LAZY_MODULES = [
+    'read_qrcode', 'qr_detection', 'nf_parser', 'nf_fetcher', 'webdriver_pool',
+    'selenium', 'pyzbar', 'PIL', 'lxml', 'bs4', 'pandas', 'aiohttp', 'webhook_server', 'update_fanin',
+]
+
+
+def import_profile():
+    """{módulo: (próprio µs, acumulado µs)} de uma importação de bot em um processo novo"""
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', 'import bot'],
+        cwd=SRC, capture_output=True, text=True,
+        env={**os.environ, 'PYTHONPATH': SRC},
+    )
+    if result.returncode != 0:
+        raise RuntimeError(f"falha ao importar bot:\n{result.stderr[-2000:]}")
+
+    profile = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        own, cumulative, name = line[len('import time:'):].split('|')
+        profile.setdefault(name.strip(), (int(own), int(cumulative)))
+    return profile
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--budget-ms', type=float, default=float(os.getenv('IMPORT_TIME_BUDGET_MS', '1500')))
+    parser.add_argument('--runs', type=int, default=3)
+    args = parser.parse_args()
+
+    profiles = [import_profile() for _ in range(args.runs)]
+    best = min(profiles, key=lambda profile: profile['bot'][1])
+    total_ms = best['bot'][1] / 1000
+
+    loaded = sorted(
+        name for name in best
+        if any(name == module or name.startswith(module + '.') for module in LAZY_MODULES)
+    )
+
+    print(f"import bot: {total_ms:.0f} ms (orçamento {args.budget_ms:.0f} ms, melhor de {args.runs})")
+    print("maiores pacotes:")
+    top_level = {name: times for name, times in best.items() if '.' not in name and name != 'bot'}
+    for name, (_, cumulative) in sorted(top_level.items(), key=lambda item: -item[1][1])[:8]:
+        print(f"  {name:<24}{cumulative / 1000:>8.0f} ms")
+
+    failed = False
+    if loaded:
+        print(f"❌ módulos que deveriam ser carregados sob demanda: {', '.join(loaded)}")
+        failed = True
+    if total_ms > args.budget_ms:
+        print(f"❌ importação acima do orçamento ({total_ms:.0f} ms > {args.budget_ms:.0f} ms)")
+        failed = True
+    if not failed:
+        print("✅ importação dentro do orçamento")
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,86 @@
+"""
+Confere o UserStatePersistence num banco SQLite temporário.
+
+Cenário: com STATE_MAX_USERS=1, um usuário altera o estado, é descartado
+da memória (LRU) pela chegada de outro e volta antes da próxima gravação
+da Application. O estado alterado deve voltar com ele e continuar no
+banco depois do drop_user_data adiado que a Application faz do descarte.
+Sai com código 1 quando falha (usado no CI).
+
+Uso: python benchmarks/check_state_persistence.py
+"""
+import asyncio
+import os
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, 'src'))
+
+DB_PATH = os.path.join(tempfile.mkdtemp(), 'state.db')
+os.environ['DATABASE_URL'] = f"sqlite:///{DB_PATH}"
+os.environ['STATE_MAX_USERS'] = '1'
+
+from sqlalchemy import select  # noqa: E402
+from telegram.ext import ApplicationBuilder  # noqa: E402
+from state_persistence import UserStatePersistence  # noqa: E402
+from tools.database import init_database, close_database, get_async_session, UserState  # noqa: E402
+
+
+async def stored_keys(user_id: int) -> set:
+    session = get_async_session()
+    try:
+        rows = await session.execute(select(UserState.key).where(UserState.user_id == user_id))
+        return {key for key, in rows}
+    finally:
+        await session.close()
+
+
+async def handle(application, persistence, user_id: int) -> dict:
+    """O que a Application faz antes dos handlers de uma atualização do usuário"""
+    user_data = application.user_data[user_id]
+    await persistence.refresh_user_data(user_id, user_data)
+    return application.user_data[user_id]
+
+
+async def evicted_user_returns_before_flush():
+    persistence = UserStatePersistence()
+    application = ApplicationBuilder().token('123:check').persistence(persistence).build()
+    persistence.attach(application)
+
+    user_data = await handle(application, persistence, 1)
+    user_data['nf_data'] = {'total': 42.5}
+    application.mark_data_for_update_persistence(user_ids=1)
+
+    await handle(application, persistence, 2)                 # descarta o usuário 1 (LRU)
+    returned = await handle(application, persistence, 1)      # volta antes da gravação
+    failures = []
+    if returned.get('nf_data') != {'total': 42.5}:
+        failures.append(f"estado ao voltar: {dict(returned)}")
+
+    await application.update_persistence()                    # drop_user_data adiado do descarte
+    if 'nf_data' not in await stored_keys(1):
+        failures.append("nf_data apagado do banco pelo drop_user_data do descarte")
+    if application.user_data[1].get('nf_data') != {'total': 42.5}:
+        failures.append(f"estado em memória após a gravação: {dict(application.user_data[1])}")
+
+    await handle(application, persistence, 2)                 # descarta de novo e recarrega do banco
+    reloaded = await handle(application, persistence, 1)
+    if reloaded.get('nf_data') != {'total': 42.5}:
+        failures.append(f"estado recarregado do banco: {dict(reloaded)}")
+    return failures
+
+
+def main():
+    init_database()
+    failures = asyncio.run(evicted_user_returns_before_flush())
+    asyncio.run(close_database())
+    for failure in failures:
+        print(f"❌ {failure}")
+    if not failures:
+        print("✅ estado preservado para usuário descartado que volta antes da gravação")
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,95 +1,51 @@
 import os
-import re
-from typing import Optional, Dict
 from dotenv import load_dotenv
 from telegram import Update
 from command_menu.start_command import start
-from command_menu.add_command import add_transaction
+from command_menu.add_command import add_transaction, add_transactions_bulk
+from message_parser import parse_financial_messages
+from category_index import resolve_category
 from command_menu.balance_command import saldo
 from command_menu.help_command import ajuda
-from command_menu.delete_command import excluir
+from command_menu.delete_command import excluir, delete_transaction
 from command_menu.edit_command import editar
 from command_menu.category_command import categorias
 from command_menu.goal_command import metas
 from command_menu.report_command import relatorio
 from command_menu.statement_command import extrato
+from command_menu.recalculate_command import recalcular
+from command_menu.receipt_command import nota
+from command_menu.alias_command import apelido
 
 from telegram.ext import ApplicationBuilder, CommandHandler, MessageHandler, ContextTypes, filters, CallbackQueryHandler
-from photo_handler import handle_photo, handle_document, nf_callback_handler
-from tools.database import get_session, Transaction, Category, TransactionType, Budget, init_database
-
-# Load environment variables
-load_dotenv()
-
-# Get bot token from environment variable
-BOT_TOKEN = os.getenv("BOT_TOKEN")
-
-# Initialize database
-init_database()
-# Funções usando SQLAlchemy
-
-def parse_financial_message(text: str) -> Optional[Dict]:
-    text = text.lower()
-    
-    # Patterns for expense messages - mais flexíveis para capturar descrição
-    expense_patterns = [
-        r'gastei\s+r?\$?\s*(\d+(?:[.,]\d+)?)\s*(?:reais?\s*)?(?:com|em|para|de|do|da)?\s*([\w\s]+)(?:\s*[-:]\s*(.+))?',
-        r'despesa\s+(\d+(?:[.,]\d+)?)\s*([\w\s]+)(?:\s*[-:]\s*(.+))?',
-        r'paguei\s+r?\$?\s*(\d+(?:[.,]\d+)?)\s*(?:reais?\s*)?(?:com|em|para|de|do|da)?\s*([\w\s]+)(?:\s*[-:]\s*(.+))?',
-        r'comprei\s+([\w\s]+?)\s*por\s+r?\$?\s*(\d+(?:[.,]\d+)?)\s*(?:reais?)?',
-        r'pago\s+([\w\s]+?)\s*de\s+r?\$?\s*(\d+(?:[.,]\d+)?)\s*(?:reais?)?'
-    ]
-    
-    # Pattern for income messages - mais flexíveis para capturar descrição
-    income_patterns = [
-        r'recebi\s+r?\$?\s*(\d+(?:[.,]\d+)?)\s*(?:reais?\s*)?(?:de|do|da)?\s*([\w\s]+)(?:\s*[-:]\s*(.+))?',
-        r'renda\s+(\d+(?:[.,]\d+)?)\s*([\w\s]+)(?:\s*[-:]\s*(.+))?',
-        r'ganhei\s+r?\$?\s*(\d+(?:[.,]\d+)?)\s*(?:reais?\s*)?(?:com|em)?\s*([\w\s]+)(?:\s*[-:]\s*(.+))?',
-        r'depositei\s+r?\$?\s*(\d+(?:[.,]\d+)?)\s*(?:reais?\s*)?(?:na|em)?\s*([\w\s]+)(?:\s*[-:]\s*(.+))?',
-        r'entraram\s+r?\$?\s*(\d+(?:[.,]\d+)?)\s*(?:reais?\s*)?(?:na|em)?\s*([\w\s]+)(?:\s*[-:]\s*(.+))?'
-    ]
-    
-    # Verificar patterns de despesa
-    for pattern in expense_patterns:
-        match = re.search(pattern, text)
-        if match:
-            # Para patterns "comprei" e "pago", a ordem é diferente
-            if 'comprei' in pattern or 'pago' in pattern:
-                category = match.group(1).strip()
-                amount = float(match.group(2).replace(',', '.'))
-                description = f'compra por {amount}' if 'comprei' in pattern else f'pagamento de {amount}'
-            else:
-                amount = float(match.group(1).replace(',', '.'))
-                category = match.group(2).strip() if len(match.groups()) > 1 and match.group(2) else ''
-                description = match.group(3).strip() if len(match.groups()) > 2 and match.group(3) else ''
-            
-            if category:
-                return {'type': 'despesa', 'amount': amount, 'category': category, 'description': description}
-    
-    # Verificar patterns de receita
-    for pattern in income_patterns:
-        match = re.search(pattern, text)
-        if match:
-            amount = float(match.group(1).replace(',', '.'))
-            category = match.group(2).strip() if len(match.groups()) > 1 and match.group(2) else ''
-            description = match.group(3).strip() if len(match.groups()) > 2 and match.group(3) else ''
-            
-            if category:
-                return {'type': 'receita', 'amount': amount, 'category': category, 'description': description}
-    
-    return None
+from photo_handler import handle_photo, handle_document, nf_callback_handler, warm_up_nf_reader, close_nf_reader
+from tools.database import init_database, close_database
+from update_processor import PerUserUpdateProcessor
+from rate_limiter import OutboundRateLimiter
+from state_persistence import UserStatePersistence
 
 async def handle_message(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     text = update.message.text
     user_id = update.effective_user.id
     
-    # Try to parse as financial message
-    parsed = parse_financial_message(text)
+    # Uma ou várias transações (por linha, ';' ou "e gastei ...")
+    transactions, unparsed = parse_financial_messages(text)
+    
+    # "alimentacao", "Alimentação" e "almoço" caem na mesma categoria existente
+    for parsed in transactions:
+        parsed['category'] = await resolve_category(user_id, parsed['type'], parsed['category'])
     
-    if parsed:
+    if len(transactions) == 1 and not unparsed:
+        parsed = transactions[0]
         description = parsed.get('description', '')
-        result = await add_transaction(user_id, parsed['type'], parsed['amount'], parsed['category'], description)
+        result = await add_transaction(
+            user_id, parsed['type'], parsed['amount'], parsed['category'], description, parsed['date']
+        )
         await update.message.reply_text(result)
+    elif transactions:
+        # Todas em uma sessão e um commit, com uma única resposta
+        results = await add_transactions_bulk(user_id, transactions)
+        await update.message.reply_text(format_bulk_reply(transactions, results, unparsed))
     else:
         await update.message.reply_text(
             "❌ Não entendi sua mensagem.\n\n"
@@ -99,6 +55,29 @@ async def handle_message(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
             "Ou use /ajuda para ver todos os comandos."
         )
 
+def format_bulk_reply(transactions: list, results: list, unparsed: list) -> str:
+    """Resposta consolidada de uma mensagem com várias transações"""
+    added = [(parsed, result) for parsed, result in zip(transactions, results) if result['success']]
+    failed = [(parsed, result) for parsed, result in zip(transactions, results) if not result['success']]
+    
+    message = f"✅ {len(added)} transações registradas:\n\n" if added else "❌ Nenhuma transação registrada.\n\n"
+    for parsed, result in added:
+        emoji = "💰" if parsed['type'] == "receita" else "💸"
+        when = f" ({parsed['date'].strftime('%d/%m')})" if parsed['date'] else ""
+        message += f"{emoji} R${result['amount']:.2f} em '{result['category']}'{when}\n"
+    
+    if added:
+        receitas = sum(result['amount'] for parsed, result in added if parsed['type'] == "receita")
+        despesas = sum(result['amount'] for parsed, result in added if parsed['type'] == "despesa")
+        message += f"\n💰 Receitas: R${receitas:.2f}\n💸 Despesas: R${despesas:.2f}\n"
+    
+    if failed:
+        message += f"\n❌ Erro ao registrar {len(failed)}: {failed[0][1]['error']}\n"
+    if unparsed:
+        message += "\n⚠️ Não entendi: " + "; ".join(f"'{clause}'" for clause in unparsed)
+    
+    return message
+
 async def button_callback(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     """Handle button callbacks for delete confirmation and NF processing"""
     query = update.callback_query
@@ -110,30 +89,14 @@ async def button_callback(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
     if data.startswith("confirm_delete_"):
         transaction_id = int(data.split("_")[2])
         
-        success = await excluir(user_id, transaction_id)
+        transaction = await delete_transaction(user_id, transaction_id)
         
-        if success:
-            # Buscar transação para mostrar mensagem
-            session = get_session()
-            try:
-                transaction = session.query(Transaction).filter(
-                    Transaction.id == transaction_id,
-                    Transaction.user_id == user_id
-                ).first()
-                
-                if transaction:
-                    emoji = "💰" if transaction.type == TransactionType.RECEITA else "💸"
-                    type_str = "receita" if transaction.type == TransactionType.RECEITA else "despesa"
-                    await query.edit_message_text(
-                        f"✅ {emoji} Transação #{transaction_id} excluída com sucesso!\n\n"
-                        f"{type_str.title()}: R${transaction.amount:.2f} em {transaction.category}"
-                    )
-                else:
-                    await query.edit_message_text("❌ Transação não encontrada!")
-            except Exception as e:
-                print(f"Erro ao buscar transação para exclusão: {e}")
-            finally:
-                session.close()
+        if transaction:
+            emoji = "💰" if transaction['type'] == "receita" else "💸"
+            await query.edit_message_text(
+                f"✅ {emoji} Transação #{transaction_id} excluída com sucesso!\n\n"
+                f"{transaction['type'].title()}: R${transaction['amount']:.2f} em {transaction['category']}"
+            )
         else:
             await query.edit_message_text("❌ Falha ao excluir transação!")
         
@@ -141,25 +104,73 @@ async def button_callback(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
         await query.edit_message_text("❌ Exclusão cancelada.")
 
 
-app = ApplicationBuilder().token(BOT_TOKEN).build()
+async def on_startup(application) -> None:
+    # Fila de notas (e, com NF_PRELOAD=1, o leitor e o pool do Selenium) sem atrasar o início
+    application.create_task(warm_up_nf_reader())
+
+async def on_shutdown(application) -> None:
+    await close_nf_reader()
+    await close_database()
+
+
+def build_application(token: str):
+    """Monta a Application com todos os handlers (sem tocar no banco nem na rede)"""
+    # Estado das conversas (fluxo das notas) no banco, carregado por usuário e com expiração
+    persistence = UserStatePersistence()
+    # Usuários diferentes em paralelo, cada usuário em ordem; envios dentro dos limites do Telegram
+    app = (
+        ApplicationBuilder()
+        .token(token)
+        .concurrent_updates(PerUserUpdateProcessor())
+        .rate_limiter(OutboundRateLimiter())
+        .persistence(persistence)
+        .post_init(on_startup)
+        .post_shutdown(on_shutdown)
+        .build()
+    )
+    persistence.attach(app)
 
-app.add_handler(CommandHandler("start", start))
-app.add_handler(CommandHandler("editar", editar))
-app.add_handler(CommandHandler("excluir", excluir))
-app.add_handler(CommandHandler("saldo", saldo))
-app.add_handler(CommandHandler("relatorio", relatorio))
-app.add_handler(CommandHandler("categorias", categorias))
-app.add_handler(CommandHandler("metas", metas))
-app.add_handler(CommandHandler("extrato", extrato))
-app.add_handler(CommandHandler("ajuda", ajuda))
+    app.add_handler(CommandHandler("start", start))
+    app.add_handler(CommandHandler("editar", editar))
+    app.add_handler(CommandHandler("excluir", excluir))
+    app.add_handler(CommandHandler("saldo", saldo))
+    app.add_handler(CommandHandler("relatorio", relatorio))
+    app.add_handler(CommandHandler("categorias", categorias))
+    app.add_handler(CommandHandler("metas", metas))
+    app.add_handler(CommandHandler("extrato", extrato))
+    app.add_handler(CommandHandler("ajuda", ajuda))
+    app.add_handler(CommandHandler("recalcular", recalcular))
+    app.add_handler(CommandHandler("nota", nota))
+    app.add_handler(CommandHandler("apelido", apelido))
 
-app.add_handler(CallbackQueryHandler(button_callback, pattern="^(confirm_delete_|cancel_delete_)"))
+    app.add_handler(CallbackQueryHandler(button_callback, pattern="^(confirm_delete_|cancel_delete_)"))
 
-app.add_handler(MessageHandler(filters.TEXT & ~filters.COMMAND, handle_message))
+    app.add_handler(MessageHandler(filters.TEXT & ~filters.COMMAND, handle_message))
+
+    # Leitor de notas (pyzbar/Selenium) só é carregado na primeira foto ou documento
+    app.add_handler(MessageHandler(filters.PHOTO, handle_photo))
+    app.add_handler(MessageHandler(filters.Document.ALL, handle_document))
+    app.add_handler(CallbackQueryHandler(nf_callback_handler, pattern=r'^(nf_cat_|nf_batch_cat_|confirm_nf_add|confirm_nf_batch|cancel_nf|nf_job_cancel_)'))
+
+    return app
+
+
+def main() -> None:
+    """Inicialização explícita: variáveis de ambiente, banco (migrações) e modo de recebimento"""
+    load_dotenv()
+    init_database()
+    app = build_application(os.getenv("BOT_TOKEN"))
+
+    print("🤖 Bot financeiro iniciado!")
+    if int(os.getenv("BOT_WORKERS", "1")) > 1:
+        from update_fanin import run_worker
+        run_worker(app)
+    elif os.getenv("BOT_MODE", "polling").lower() == "webhook":
+        from webhook_server import run_webhook
+        run_webhook(app)
+    else:
+        app.run_polling()
 
-app.add_handler(MessageHandler(filters.PHOTO, handle_photo))
-app.add_handler(MessageHandler(filters.Document.ALL, handle_document))
-app.add_handler(CallbackQueryHandler(nf_callback_handler, pattern=r'^(nf_cat_|confirm_nf_add|cancel_nf)'))
 
-print("🤖 Bot financeiro iniciado!")
-app.run_polling()
\ No newline at end of file
+if __name__ == "__main__":
+    main()
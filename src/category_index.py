@@ -0,0 +1,197 @@
+"""
+Índice de categorias por usuário, em memória.
+
+Mapeia o texto livre da mensagem ("alimentacao", "Alimentação ", "almoço")
+para uma categoria já existente do usuário, sem consultar o banco a cada
+mensagem. A busca tenta, em ordem: nome exato sem acentos, apelido
+(tabela category_aliases ou apelidos padrão), prefixo único e, por fim,
+similaridade de trigramas. Sem correspondência, o texto é mantido.
+
+Um apelido padrão ("mercado" -> alimentação) só vale quando o usuário não
+tem uma categoria com esse mesmo nome, seja cadastrada ou já usada nas
+transações (monthly_totals): quem sempre lançou "mercado" continua em
+"mercado". Apelidos criados com /apelido valem sempre.
+
+O índice de cada usuário é carregado na primeira mensagem e descartado
+(invalidate) quando as categorias ou apelidos dele mudam.
+"""
+import os
+import re
+import unicodedata
+from collections import OrderedDict
+from sqlalchemy import select
+from tools.database import get_async_session, Category, CategoryAlias, MonthlyTotal, TransactionType
+
+# Apelidos usados quando o usuário tem a categoria de destino (as padrão do /start) e não tem
+# uma categoria com o nome do apelido
+DEFAULT_ALIASES = {
+    TransactionType.DESPESA: {
+        'alimentação': ['almoço', 'jantar', 'lanche', 'café', 'restaurante', 'mercado', 'supermercado',
+                        'padaria', 'ifood', 'comida'],
+        'transporte': ['uber', 'ônibus', 'metrô', 'gasolina', 'combustível', 'táxi', '99', 'estacionamento'],
+        'moradia': ['aluguel', 'condomínio', 'luz', 'energia', 'água', 'gás', 'internet', 'iptu'],
+        'saúde': ['farmácia', 'remédio', 'médico', 'consulta', 'dentista', 'academia', 'plano de saúde'],
+        'lazer': ['cinema', 'bar', 'show', 'viagem', 'streaming', 'netflix'],
+        'educação': ['curso', 'escola', 'faculdade', 'livro', 'livros', 'mensalidade'],
+    },
+    TransactionType.RECEITA: {
+        'salário': ['salario', 'pagamento', 'holerite', 'adiantamento'],
+        'freelancer': ['freela', 'projeto', 'bico'],
+        'investimentos': ['dividendos', 'rendimento', 'juros', 'ações'],
+    },
+}
+
+MIN_PREFIX = 3
+MIN_SIMILARITY = float(os.getenv('CATEGORY_MIN_SIMILARITY', '0.5'))
+
+SPACES = re.compile(r'\s+')
+
+
+def fold(text: str) -> str:
+    """Minúsculas, sem acentos e com espaços normalizados"""
+    text = unicodedata.normalize('NFKD', text.lower())
+    text = ''.join(char for char in text if not unicodedata.combining(char))
+    return SPACES.sub(' ', text).strip()
+
+
+def trigrams(folded: str) -> set:
+    padded = f"  {folded} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+class CategoryIndex:
+    """Categorias de um usuário, por tipo, prontas para busca"""
+
+    def __init__(self, categories, aliases=(), used=()):
+        # tipo -> {nome sem acentos: nome original}
+        self.names = {trans_type: {} for trans_type in TransactionType}
+        # tipo -> {apelido sem acentos: nome original}
+        self.aliases = {trans_type: {} for trans_type in TransactionType}
+        # tipo -> {trigrama: {nome sem acentos}}
+        self.grams = {trans_type: {} for trans_type in TransactionType}
+        self.sizes = {}
+
+        for trans_type, name in categories:
+            folded = fold(name)
+            if not folded or folded in self.names[trans_type]:
+                continue
+            self.names[trans_type][folded] = name
+            grams = trigrams(folded)
+            self.sizes[(trans_type, folded)] = len(grams)
+            for gram in grams:
+                self.grams[trans_type].setdefault(gram, set()).add(folded)
+
+        # Nomes que já são categorias do usuário (cadastradas ou usadas nas transações)
+        taken = {trans_type: set(self.names[trans_type]) for trans_type in TransactionType}
+        for trans_type, category in used:
+            taken[trans_type].add(fold(category))
+
+        for trans_type, targets in DEFAULT_ALIASES.items():
+            for target, alias_names in targets.items():
+                name = self.names[trans_type].get(fold(target))
+                if name:
+                    for alias in alias_names:
+                        folded = fold(alias)
+                        if folded not in taken[trans_type]:
+                            self.aliases[trans_type][folded] = name
+
+        # Apelidos do usuário têm prioridade sobre os padrão
+        for trans_type, alias, category in aliases:
+            name = self.names[trans_type].get(fold(category), category)
+            self.aliases[trans_type][fold(alias)] = name
+
+    def resolve(self, trans_type: TransactionType, text: str):
+        """Nome da categoria existente que corresponde ao texto, ou None"""
+        folded = fold(text)
+        if not folded:
+            return None
+
+        names = self.names[trans_type]
+        if folded in names:
+            return names[folded]
+
+        alias = self.aliases[trans_type].get(folded)
+        if alias:
+            return alias
+
+        if len(folded) >= MIN_PREFIX:
+            matches = [name for key, name in names.items() if key.startswith(folded)]
+            if len(matches) == 1:
+                return matches[0]
+
+        return self._similar(trans_type, folded)
+
+    def _similar(self, trans_type: TransactionType, folded: str):
+        grams = trigrams(folded)
+        shared = {}
+        index = self.grams[trans_type]
+        for gram in grams:
+            for key in index.get(gram, ()):
+                shared[key] = shared.get(key, 0) + 1
+
+        best, best_score = None, MIN_SIMILARITY
+        for key, count in shared.items():
+            # Coeficiente de Dice entre os conjuntos de trigramas
+            score = 2 * count / (len(grams) + self.sizes[(trans_type, key)])
+            if score >= best_score:
+                best, best_score = key, score
+        return self.names[trans_type][best] if best else None
+
+
+class CategoryIndexCache:
+    """Índices carregados sob demanda, por usuário, com limite de usuários em memória (LRU)"""
+
+    def __init__(self):
+        self.max_users = int(os.getenv('CATEGORY_INDEX_MAX_USERS', '1000'))
+        self._indexes = OrderedDict()
+
+    async def get(self, user_id: int) -> CategoryIndex:
+        index = self._indexes.get(user_id)
+        if index is not None:
+            self._indexes.move_to_end(user_id)
+            return index
+
+        index = await self._load(user_id)
+        self._indexes[user_id] = index
+        while len(self._indexes) > self.max_users:
+            self._indexes.popitem(last=False)
+        return index
+
+    def invalidate(self, user_id: int):
+        self._indexes.pop(user_id, None)
+
+    async def _load(self, user_id: int) -> CategoryIndex:
+        session = get_async_session()
+        try:
+            categories = (await session.execute(
+                select(Category.type, Category.name).where(Category.user_id == user_id)
+            )).all()
+            aliases = (await session.execute(
+                select(CategoryAlias.type, CategoryAlias.alias, CategoryAlias.category)
+                .where(CategoryAlias.user_id == user_id)
+            )).all()
+            used = (await session.execute(
+                select(MonthlyTotal.type, MonthlyTotal.category).distinct()
+                .where(MonthlyTotal.user_id == user_id, MonthlyTotal.count > 0)
+            )).all()
+            return CategoryIndex(categories, aliases, used)
+        finally:
+            await session.close()
+
+
+category_indexes = CategoryIndexCache()
+
+
+async def resolve_category(user_id: int, trans_type: str, text: str) -> str:
+    """Categoria existente do usuário para o texto informado; sem correspondência, o próprio texto"""
+    try:
+        index = await category_indexes.get(user_id)
+        return index.resolve(TransactionType(trans_type), text) or text
+    except Exception as e:
+        print(f"Erro ao resolver categoria: {e}")
+        return text
+
+
+def invalidate_categories(user_id: int):
+    """Descarta o índice do usuário; chamar após alterar categorias ou apelidos"""
+    category_indexes.invalidate(user_id)
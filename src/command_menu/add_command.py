@@ -1,12 +1,15 @@
 
 from telegram import Update
 from telegram.ext import ContextTypes
-from tools.database import get_session, Transaction, TransactionType
+from sqlalchemy import insert
+from tools.database import get_async_session, Transaction, TransactionType
+from tools.rollup import record_transaction, apply_delta
 from datetime import date
+from decimal import Decimal
 
-async def add_transaction(user_id: int, trans_type: str, amount: float, category: str, description: str = ""):
-    """ Função que adiciona uma transação ao banco de dados """
-    session = get_session()
+async def add_transaction(user_id: int, trans_type: str, amount: float, category: str, description: str = "", transaction_date: date = None):
+    """ Função que adiciona uma transação ao banco de dados (na data de hoje, se não informada) """
+    session = get_async_session()
     try:
         # Converter string para enum
         if trans_type == "receita":
@@ -22,16 +25,73 @@ async def add_transaction(user_id: int, trans_type: str, amount: float, category
             amount=amount,
             category=category,
             description=description,
-            date=date.today()
+            date=transaction_date or date.today()
         )
         session.add(transaction)
-        session.commit()
+        await record_transaction(session, transaction)
+        await session.commit()
         
         emoji = "💰" if trans_type == "receita" else "💸"
-        return f"{emoji} {trans_type.title()} de R${amount:.2f} em '{category}' registrada com sucesso!"
+        when = f" em {transaction.date.strftime('%d/%m/%Y')}" if transaction.date != date.today() else ""
+        return f"{emoji} {trans_type.title()} de R${amount:.2f} em '{category}'{when} registrada com sucesso!"
     except Exception as e:
-        session.rollback()
+        await session.rollback()
         return f"❌ Erro ao registrar transação: {str(e)}"
     finally:
-        session.close()
+        await session.close()
 
+async def add_transactions_bulk(user_id: int, items: list):
+    """
+    Adiciona várias transações em uma única sessão e um único commit.
+    
+    Cada item é um dict com 'type', 'amount', 'category' e opcionalmente
+    'description' e 'date'. Retorna um resultado por item, na mesma ordem:
+    {'success': bool, 'amount': float, 'category': str, 'error': str}
+    """
+    results = []
+    rows = []
+    deltas = {}
+    
+    for item in items:
+        try:
+            trans_type = TransactionType(item['type'])
+            amount = Decimal(str(item['amount']))
+            row = {
+                'user_id': user_id,
+                'type': trans_type,
+                'amount': amount,
+                'category': item['category'],
+                'description': item.get('description', ''),
+                'date': item.get('date') or date.today()
+            }
+        except Exception as e:
+            results.append({'success': False, 'amount': item.get('amount'), 'category': item.get('category'), 'error': str(e)})
+            continue
+        
+        rows.append(row)
+        results.append({'success': True, 'amount': float(amount), 'category': row['category'], 'error': None})
+        
+        # Agrupa os deltas do rollup para uma atualização por mês/categoria
+        key = (row['date'], trans_type, row['category'])
+        total, count = deltas.get(key, (Decimal(0), 0))
+        deltas[key] = (total + amount, count + 1)
+    
+    if not rows:
+        return results
+    
+    session = get_async_session()
+    try:
+        await session.execute(insert(Transaction), rows)
+        for (day, trans_type, category), (total, count) in deltas.items():
+            await apply_delta(session, user_id, day, trans_type, category, total, count)
+        await session.commit()
+    except Exception as e:
+        await session.rollback()
+        for result in results:
+            if result['success']:
+                result['success'] = False
+                result['error'] = str(e)
+    finally:
+        await session.close()
+    
+    return results
@@ -0,0 +1,91 @@
+from telegram import Update
+from telegram.ext import ContextTypes
+from sqlalchemy import select, delete
+from tools.database import get_async_session, Category, CategoryAlias
+from category_index import fold, invalidate_categories
+
+
+async def apelido(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """
+    Gerencia apelidos de categoria:
+    /apelido                          lista os apelidos
+    /apelido almoço = alimentação     cria/atualiza um apelido
+    /apelido remover almoço           remove um apelido
+    """
+    user_id = update.effective_user.id
+    text = ' '.join(context.args)
+
+    session = get_async_session()
+    try:
+        if not text:
+            aliases = (await session.scalars(
+                select(CategoryAlias).where(CategoryAlias.user_id == user_id).order_by(CategoryAlias.category)
+            )).all()
+
+            if not aliases:
+                await update.message.reply_text(
+                    "🏷️ Nenhum apelido cadastrado.\n\n"
+                    "Use: /apelido <apelido> = <categoria>\n"
+                    "Exemplo: /apelido almoço = alimentação"
+                )
+                return
+
+            message = "🏷️ *Seus Apelidos*\n\n"
+            for alias in aliases:
+                message += f"  • {alias.alias} → {alias.category}\n"
+            await update.message.reply_text(message, parse_mode='Markdown')
+            return
+
+        if context.args[0].lower() == 'remover' and len(context.args) > 1:
+            alias = fold(' '.join(context.args[1:]))
+            result = await session.execute(delete(CategoryAlias).where(
+                CategoryAlias.user_id == user_id,
+                CategoryAlias.alias == alias
+            ))
+            await session.commit()
+            invalidate_categories(user_id)
+            if result.rowcount:
+                await update.message.reply_text(f"✅ Apelido '{alias}' removido.")
+            else:
+                await update.message.reply_text(f"❌ Apelido '{alias}' não encontrado.")
+            return
+
+        if '=' in text:
+            alias_text, category_text = text.split('=', 1)
+        elif len(context.args) >= 2:
+            alias_text, category_text = context.args[0], ' '.join(context.args[1:])
+        else:
+            await update.message.reply_text(
+                "❌ Formato incorreto!\n\n"
+                "Use: /apelido <apelido> = <categoria>\n"
+                "Exemplo: /apelido almoço = alimentação"
+            )
+            return
+
+        alias = fold(alias_text)
+        wanted = fold(category_text)
+        categories = (await session.execute(
+            select(Category.type, Category.name).where(Category.user_id == user_id)
+        )).all()
+        matches = [(trans_type, name) for trans_type, name in categories if fold(name) == wanted]
+
+        if not alias or not matches:
+            await update.message.reply_text(
+                f"❌ Categoria '{category_text.strip()}' não encontrada.\n\n"
+                "💡 Use /categorias para ver suas categorias"
+            )
+            return
+
+        # O mesmo nome pode existir como receita e despesa
+        for trans_type, name in dict(matches).items():
+            await session.merge(CategoryAlias(user_id=user_id, type=trans_type, alias=alias, category=name))
+        await session.commit()
+        invalidate_categories(user_id)
+
+        await update.message.reply_text(f"✅ Apelido criado: '{alias}' → {matches[0][1]}")
+    except Exception as e:
+        await session.rollback()
+        print(f"Erro ao gerenciar apelidos: {e}")
+        await update.message.reply_text("❌ Erro ao gerenciar apelidos.")
+    finally:
+        await session.close()
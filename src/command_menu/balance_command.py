@@ -1,31 +1,33 @@
 from telegram import Update
 from telegram.ext import ContextTypes
-from tools.database import get_session, Transaction, TransactionType
+from sqlalchemy import select, func
+from tools.database import get_async_session, MonthlyTotal, TransactionType
+from tools.rollup import month_key
 from datetime import date
 
 async def saldo(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     user_id = update.effective_user.id
     
-    session = get_session()
+    session = get_async_session()
     try:
-        from sqlalchemy import func
-        
-        results = session.query(
-            Transaction.type,
-            func.sum(Transaction.amount).label('total')
-        ).filter(
-            Transaction.user_id == user_id,
-            Transaction.date >= date.today().replace(day=1)
-        ).group_by(Transaction.type).all()
+        results = (await session.execute(
+            select(
+                MonthlyTotal.type,
+                func.sum(MonthlyTotal.total_cents).label('total')
+            ).where(
+                MonthlyTotal.user_id == user_id,
+                MonthlyTotal.month == month_key(date.today())
+            ).group_by(MonthlyTotal.type)
+        )).all()
         
         receitas = 0
         despesas = 0
         
         for trans_type, total in results:
             if trans_type == TransactionType.RECEITA:
-                receitas = float(total)
+                receitas = total / 100
             elif trans_type == TransactionType.DESPESA:
-                despesas = float(total)
+                despesas = total / 100
         
         saldo_atual = receitas - despesas
         
@@ -45,4 +47,4 @@ async def saldo(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     except Exception as e:
         print(f"Erro ao buscar saldo: {e}")
     finally:
-        session.close()
+        await session.close()
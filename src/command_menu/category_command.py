@@ -1,6 +1,7 @@
 from telegram import Update
 from telegram.ext import ContextTypes
-from tools.database import get_session, Category, TransactionType
+from sqlalchemy import select
+from tools.database import get_async_session, Category, TransactionType
 
 
 async def categorias(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
@@ -9,11 +10,13 @@ async def categorias(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None
     """
     user_id = update.effective_user.id
     
-    session = get_session()
+    session = get_async_session()
     try:
-        categories = session.query(Category).filter(
-            Category.user_id == user_id
-        ).order_by(Category.type, Category.name).all()
+        categories = (await session.scalars(
+            select(Category).where(
+                Category.user_id == user_id
+            ).order_by(Category.type, Category.name)
+        )).all()
         
         if not categories:
             await update.message.reply_text("Nenhuma categoria encontrada.")
@@ -46,4 +49,4 @@ async def categorias(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None
     except Exception as e:
         print(f"Erro ao buscar categorias: {e}")
     finally:
-        session.close()
+        await session.close()
@@ -1,15 +1,20 @@
 from telegram import Update
 from telegram.ext import ContextTypes
-from tools.database import get_session, Transaction, TransactionType
+from sqlalchemy import select
+from tools.database import get_async_session, Transaction, TransactionType
+from tools.rollup import unrecord_transaction
+from command_menu.receipt_command import delete_receipt
 from telegram import InlineKeyboardButton, InlineKeyboardMarkup
 
 
 async def get_user_transactions(user_id: int, limit: int = 10):
-    session = get_session()
+    session = get_async_session()
     try:
-        transactions = session.query(Transaction).filter(
-            Transaction.user_id == user_id
-        ).order_by(Transaction.date.desc(), Transaction.id.desc()).limit(limit).all()
+        transactions = (await session.scalars(
+            select(Transaction).where(
+                Transaction.user_id == user_id
+            ).order_by(Transaction.date.desc(), Transaction.id.desc()).limit(limit)
+        )).all()
         
         return [
             {
@@ -26,7 +31,42 @@ async def get_user_transactions(user_id: int, limit: int = 10):
         print(f"Erro ao buscar transações: {e}")
         return []
     finally:
-        session.close()
+        await session.close()
+
+async def delete_transaction(user_id: int, transaction_id: int):
+    """
+    Exclui a transação do usuário e retorna seus dados, ou None se não existir.
+    """
+    session = get_async_session()
+    try:
+        transaction = await session.scalar(
+            select(Transaction).where(
+                Transaction.id == transaction_id,
+                Transaction.user_id == user_id
+            )
+        )
+        
+        if not transaction:
+            return None
+        
+        deleted = {
+            'id': transaction.id,
+            'type': 'receita' if transaction.type == TransactionType.RECEITA else 'despesa',
+            'amount': float(transaction.amount),
+            'category': transaction.category
+        }
+        await unrecord_transaction(session, transaction)
+        if transaction.receipt_id:
+            await delete_receipt(session, user_id, transaction.receipt_id)
+        await session.delete(transaction)
+        await session.commit()
+        return deleted
+    except Exception as e:
+        await session.rollback()
+        print(f"Erro ao excluir transação: {e}")
+        return None
+    finally:
+        await session.close()
 
 async def excluir(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     user_id = update.effective_user.id
@@ -68,12 +108,14 @@ async def excluir(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
         await update.message.reply_text("❌ ID deve ser um número!")
         return
     
-    session = get_session()
+    session = get_async_session()
     try:
-        transaction = session.query(Transaction).filter(
-            Transaction.id == transaction_id,
-            Transaction.user_id == user_id
-        ).first()
+        transaction = await session.scalar(
+            select(Transaction).where(
+                Transaction.id == transaction_id,
+                Transaction.user_id == user_id
+            )
+        )
         
         if not transaction:
             await update.message.reply_text("❌ Transação não encontrada!")
@@ -99,7 +141,7 @@ async def excluir(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
             reply_markup=reply_markup
         )
     except Exception as e:
-        session.rollback()
+        await session.rollback()
         print(f"Erro ao excluir transação: {e}")
     finally:
-        session.close()
+        await session.close()
@@ -1,13 +1,17 @@
 from telegram import Update
 from telegram.ext import ContextTypes
-from tools.database import get_session, Transaction, TransactionType
+from sqlalchemy import select
+from tools.database import get_async_session, Transaction, TransactionType
+from tools.rollup import record_transaction, unrecord_transaction
 
 async def get_user_transactions(user_id: int, limit: int = 10):
-    session = get_session()
+    session = get_async_session()
     try:
-        transactions = session.query(Transaction).filter(
-            Transaction.user_id == user_id
-        ).order_by(Transaction.date.desc(), Transaction.id.desc()).limit(limit).all()
+        transactions = (await session.scalars(
+            select(Transaction).where(
+                Transaction.user_id == user_id
+            ).order_by(Transaction.date.desc(), Transaction.id.desc()).limit(limit)
+        )).all()
         
         return [
             {
@@ -24,7 +28,7 @@ async def get_user_transactions(user_id: int, limit: int = 10):
         print(f"Erro ao buscar transações: {e}")
         return []
     finally:
-        session.close()
+        await session.close()
 
 async def editar(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     user_id = update.effective_user.id
@@ -67,12 +71,14 @@ async def editar(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
         await update.message.reply_text("❌ ID deve ser um número!")
         return
     
-    session = get_session()
+    session = get_async_session()
     try:
-        transaction = session.query(Transaction).filter(
-            Transaction.id == transaction_id,
-            Transaction.user_id == user_id
-        ).first()
+        transaction = await session.scalar(
+            select(Transaction).where(
+                Transaction.id == transaction_id,
+                Transaction.user_id == user_id
+            )
+        )
         
         if not transaction:
             await update.message.reply_text("❌ Transação não encontrada!")
@@ -98,17 +104,31 @@ async def editar(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
             new_amount = float(context.args[1].replace(',', '.'))
             new_category = ' '.join(context.args[2:]) if len(context.args) > 2 else transaction.category
             description = transaction.description  # Mantém a descrição original
+            old_amount, old_category = float(transaction.amount), transaction.category
+            
+            # O valor de uma nota é a soma dos itens (/nota); só a categoria pode mudar
+            if transaction.receipt_id and new_amount != old_amount:
+                await update.message.reply_text(
+                    f"❌ A transação #{transaction.id} veio de uma nota fiscal e o valor "
+                    f"é a soma dos itens (R${old_amount:.2f}).\n\n"
+                    f"Para trocar só a categoria: /editar {transaction.id} {old_amount:.2f} <nova_categoria>\n"
+                    f"Para corrigir o valor, apague com /excluir {transaction.id} e registre de novo."
+                )
+                return
             
+            # Move o valor antigo para fora do total mensal e registra o novo
+            await unrecord_transaction(session, transaction)
             transaction.amount = new_amount
             transaction.category = new_category
+            await record_transaction(session, transaction)
             
-            session.commit()
+            await session.commit()
             
             emoji = "💰" if transaction.type == TransactionType.RECEITA else "💸"
             await update.message.reply_text(
                 f"✅ {emoji} Transação #{transaction.id} atualizada!\n\n"
-                f"Valor: R${transaction.amount:.2f} → R${new_amount:.2f}\n"
-                f"Categoria: {transaction.category} → {new_category}"
+                f"Valor: R${old_amount:.2f} → R${new_amount:.2f}\n"
+                f"Categoria: {old_category} → {new_category}"
             )
         
         except (ValueError, IndexError):
@@ -118,7 +138,7 @@ async def editar(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
                 "Exemplo: /editar 5 75.00 transporte"
             )
     except Exception as e:
-        session.rollback()
+        await session.rollback()
         print(f"Erro ao editar transação: {e}")
     finally:
-        session.close()
+        await session.close()
@@ -13,6 +13,9 @@ async def ajuda(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     message += "/saldo - Ver saldo do mês\n"
     message += "/relatorio - Relatório detalhado\n"
     message += "/categorias - Listar categorias\n"
+    message += "/apelido <apelido> = <categoria> - Apelidos de categoria\n"
+    message += "/nota <id> - Itens de uma nota fiscal registrada\n"
+    message += "/recalcular - Conferir e corrigir os totais mensais\n"
     message += "/metas - Metas financeiras\n"
     message += "/ajuda - Esta ajuda\n\n"
     message += "💡 *Mensagens inteligentes:*\n"
@@ -20,7 +23,9 @@ async def ajuda(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     message += "'recebi 1000 de salário - pagamento mensal'\n"
     message += "'comprei material de escritório por 150 reais'\n"
     message += "'paguei aluguel de 800 - apartamento'\n"
-    message += "'ganhei 500 freelancer - projeto website'\n\n"
+    message += "'ganhei 500 freelancer - projeto website'\n"
+    message += "'gastei R$ 35,90 no mercado ontem'\n"
+    message += "Várias de uma vez: uma por linha ou 'gastei 12 com café e 40 com uber'\n\n"
     message += "🔧 *Gerenciamento:*\n"
     message += "Use /recentes para ver os IDs das transações\n"
     message += "Use /editar <id> para modificar\n"
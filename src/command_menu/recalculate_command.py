@@ -0,0 +1,33 @@
+from telegram import Update
+from telegram.ext import ContextTypes
+from tools.database import get_async_session
+from tools.rollup import verify_monthly_totals, rebuild_monthly_totals
+
+
+async def recalcular(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """
+    Confere os totais mensais do usuário com as transações e reconstrói se houver divergência.
+    """
+    user_id = update.effective_user.id
+
+    session = get_async_session()
+    try:
+        drift = await verify_monthly_totals(session, user_id)
+
+        if not drift:
+            await update.message.reply_text("✅ Seus totais mensais estão corretos.")
+            return
+
+        await rebuild_monthly_totals(session, user_id)
+        await session.commit()
+
+        months = sorted({item['month'] for item in drift})
+        await update.message.reply_text(
+            f"🔧 {len(drift)} total(is) corrigido(s).\n\n"
+            f"📅 Meses afetados: {', '.join(months)}"
+        )
+    except Exception as e:
+        await session.rollback()
+        print(f"Erro ao recalcular totais: {e}")
+    finally:
+        await session.close()
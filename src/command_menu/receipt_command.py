@@ -0,0 +1,232 @@
+from telegram import Update
+from telegram.ext import ContextTypes
+from sqlalchemy import select, insert, delete
+from tools.database import (
+    get_async_session, Transaction, TransactionType, Receipt, ReceiptItem, NfConfirmation
+)
+from tools.rollup import record_transaction
+from datetime import date, datetime
+from decimal import Decimal, InvalidOperation
+
+MAX_MESSAGE_LENGTH = 4000
+
+
+def to_decimal(text: str):
+    """Converte valores da nota ('1.234,56', '0,5') para Decimal, ou None"""
+    text = (text or '').strip()
+    if ',' in text:
+        text = text.replace('.', '').replace(',', '.')
+    try:
+        return Decimal(text)
+    except InvalidOperation:
+        return None
+
+
+def receipt_items(nf_data: dict):
+    """Itens da nota convertidos para receipt_items; itens sem valor válido são ignorados"""
+    items = []
+    for key, item in nf_data.get('items', {}).items():
+        total = to_decimal(item.get('valor_total'))
+        if total is None:
+            print(f"Erro ao converter item {key}: valor '{item.get('valor_total')}'")
+            continue
+        items.append({
+            'position': len(items),
+            'code': item.get('codigo') or None,
+            'description': item.get('descricao', ''),
+            'quantity': to_decimal(item.get('quantidade')),
+            'unit': item.get('unidade') or None,
+            'unit_price': to_decimal(item.get('valor_unitario')),
+            'total': total
+        })
+    return items
+
+
+async def add_receipt(user_id: int, nf_data: dict, category: str):
+    """
+    Registra a nota fiscal em uma única transação.
+
+    Cria a nota (receipts), seus itens (receipt_items) e uma transação de
+    despesa com o total da nota, atualiza os totais mensais e marca a nota
+    como confirmada, tudo no mesmo commit. Retorna um dict com
+    'transaction_id', 'receipt_id', 'total', 'items' e 'skipped', ou None em erro.
+    """
+    results = await add_receipts(user_id, [(nf_data, category)])
+    return results[0] if results else None
+
+
+async def add_receipts(user_id: int, entries: list):
+    """
+    Registra várias notas (lista de (nf_data, categoria)) em um único commit.
+    Retorna um resultado por nota registrada, como em add_receipt; lista vazia em erro.
+    """
+    parsed = []
+    for nf_data, category in entries:
+        items = receipt_items(nf_data)
+        if items:
+            parsed.append((nf_data, category, items))
+
+    if not parsed:
+        return []
+
+    today = date.today()
+    session = get_async_session()
+    try:
+        receipts = []
+        for nf_data, category, items in parsed:
+            shop_info = nf_data.get('shop_info', {})
+            receipt = Receipt(
+                user_id=user_id,
+                access_key=nf_data.get('access_key'),
+                cnpj=shop_info.get('cnpj') or None,
+                store=shop_info.get('loja') or 'Desconhecido',
+                total=sum((item['total'] for item in items), Decimal(0)),
+                date=today
+            )
+            session.add(receipt)
+            receipts.append(receipt)
+        await session.flush()
+
+        # Itens de todas as notas em um único executemany
+        await session.execute(insert(ReceiptItem), [
+            dict(item, receipt_id=receipt.id)
+            for receipt, (nf_data, category, items) in zip(receipts, parsed)
+            for item in items
+        ])
+
+        results = []
+        for receipt, (nf_data, category, items) in zip(receipts, parsed):
+            transaction = Transaction(
+                user_id=user_id,
+                type=TransactionType.DESPESA,
+                amount=receipt.total,
+                category=category,
+                description=f"NF {receipt.store} ({len(items)} itens)",
+                date=today,
+                receipt_id=receipt.id
+            )
+            session.add(transaction)
+            await record_transaction(session, transaction)
+
+            if receipt.access_key:
+                await session.merge(NfConfirmation(
+                    user_id=user_id, access_key=receipt.access_key, confirmed_at=datetime.utcnow()
+                ))
+            results.append((transaction, receipt, len(items), len(nf_data.get('items', {})) - len(items)))
+
+        await session.commit()
+        return [
+            {
+                'transaction_id': transaction.id,
+                'receipt_id': receipt.id,
+                'total': float(receipt.total),
+                'items': items,
+                'skipped': skipped
+            }
+            for transaction, receipt, items, skipped in results
+        ]
+    except Exception as e:
+        await session.rollback()
+        print(f"Erro ao registrar nota fiscal: {e}")
+        return []
+    finally:
+        await session.close()
+
+
+async def delete_receipt(session, user_id: int, receipt_id: int):
+    """Remove a nota, seus itens e a confirmação (usar na mesma sessão que exclui a transação)"""
+    receipt = await session.get(Receipt, receipt_id)
+    if receipt is None or receipt.user_id != user_id:
+        return
+    await session.execute(delete(ReceiptItem).where(ReceiptItem.receipt_id == receipt_id))
+    if receipt.access_key:
+        await session.execute(delete(NfConfirmation).where(
+            NfConfirmation.user_id == user_id,
+            NfConfirmation.access_key == receipt.access_key
+        ))
+    await session.delete(receipt)
+
+
+def format_quantity(quantity) -> str:
+    if quantity is None:
+        return ""
+    return f"{quantity.normalize():f}".replace('.', ',')
+
+
+async def nota(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """
+    Detalha os itens de uma nota fiscal registrada ('/nota <id da transação>').
+    Sem argumentos, lista as últimas notas.
+    """
+    user_id = update.effective_user.id
+
+    session = get_async_session()
+    try:
+        if len(context.args) == 0:
+            rows = (await session.execute(
+                select(Transaction.id, Receipt.store, Receipt.total, Receipt.date)
+                .join(Receipt, Receipt.id == Transaction.receipt_id)
+                .where(Transaction.user_id == user_id)
+                .order_by(Receipt.date.desc(), Receipt.id.desc())
+                .limit(10)
+            )).all()
+
+            if not rows:
+                await update.message.reply_text("🧾 Nenhuma nota fiscal registrada.")
+                return
+
+            message = "🧾 *Últimas Notas Fiscais*\n\n"
+            for transaction_id, store, total, day in rows:
+                message += f"*#{transaction_id}* {store} - R${total:.2f} ({day.strftime('%d/%m/%Y')})\n"
+            message += "\n💡 Use /nota <id> para ver os itens"
+
+            await update.message.reply_text(message, parse_mode='Markdown')
+            return
+
+        try:
+            transaction_id = int(context.args[0])
+        except ValueError:
+            await update.message.reply_text("❌ ID deve ser um número!")
+            return
+
+        receipt = await session.scalar(
+            select(Receipt)
+            .join(Transaction, Transaction.receipt_id == Receipt.id)
+            .where(Transaction.id == transaction_id, Transaction.user_id == user_id)
+        )
+
+        if not receipt:
+            await update.message.reply_text("❌ Nota fiscal não encontrada para esta transação!")
+            return
+
+        items = (await session.scalars(
+            select(ReceiptItem)
+            .where(ReceiptItem.receipt_id == receipt.id)
+            .order_by(ReceiptItem.position)
+        )).all()
+
+        lines = [f"🧾 Nota #{transaction_id}\n", f"🏪 Loja: {receipt.store}"]
+        if receipt.cnpj:
+            lines.append(f"📋 CNPJ: {receipt.cnpj}")
+        lines.append(f"📅 Data: {receipt.date.strftime('%d/%m/%Y')}")
+        lines.append(f"💰 Total: R$ {receipt.total:.2f}\n")
+        lines.append(f"🛒 Itens ({len(items)}):")
+        for item in items:
+            quantity = format_quantity(item.quantity)
+            unit = f" {item.unit}" if item.unit else ""
+            detail = f" ({quantity}{unit})" if quantity else ""
+            lines.append(f"• {item.description}{detail}: R$ {item.total:.2f}")
+
+        # Notas grandes passam do limite de uma mensagem do Telegram
+        message = ""
+        for line in lines:
+            if len(message) + len(line) + 1 > MAX_MESSAGE_LENGTH:
+                await update.message.reply_text(message)
+                message = ""
+            message += line + "\n"
+        await update.message.reply_text(message)
+    except Exception as e:
+        print(f"Erro ao detalhar nota fiscal: {e}")
+        await update.message.reply_text("❌ Erro ao buscar a nota fiscal.")
+    finally:
+        await session.close()
@@ -1,6 +1,8 @@
 from telegram import Update
 from telegram.ext import ContextTypes
-from tools.database import get_session, Transaction, TransactionType
+from sqlalchemy import select
+from tools.database import get_async_session, MonthlyTotal, TransactionType
+from tools.rollup import month_key
 from datetime import date
 
 async def relatorio(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
@@ -9,19 +11,19 @@ async def relatorio(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     """
     user_id = update.effective_user.id
 
-    session = get_session()
+    session = get_async_session()
     try:
-        from sqlalchemy import func
-
-        results = session.query(
-            Transaction.category,
-            Transaction.type,
-            func.sum(Transaction.amount).label('total'),
-            func.count(Transaction.id).label('count')
-        ).filter(
-            Transaction.user_id == user_id,
-            Transaction.date >= date.today().replace(day=1)
-        ).group_by(Transaction.category, Transaction.type).order_by(func.sum(Transaction.amount).desc()).all()
+        results = (await session.execute(
+            select(
+                MonthlyTotal.category,
+                MonthlyTotal.type,
+                MonthlyTotal.total_cents,
+                MonthlyTotal.count
+            ).where(
+                MonthlyTotal.user_id == user_id,
+                MonthlyTotal.month == month_key(date.today())
+            ).order_by(MonthlyTotal.total_cents.desc())
+        )).all()
 
         if not results:
             await update.message.reply_text("📊 Nenhuma transação encontrada este mês.")
@@ -35,7 +37,7 @@ async def relatorio(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
         total_despesas = 0
 
         for category, trans_type, total, count in results:
-            total = float(total)
+            total = total / 100
             if trans_type == TransactionType.RECEITA:
                 receitas_por_categoria[category] = {'total': total, 'count': count}
                 total_receitas += total
@@ -62,4 +64,4 @@ async def relatorio(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     except Exception as e:
         print(f"Erro ao buscar relatório: {e}")
     finally:
-        session.close()
+        await session.close()
@@ -1,7 +1,8 @@
 
-from tools.database import get_session, Category, TransactionType
+from tools.database import get_async_session, Category, TransactionType
 from telegram import Update
 from telegram.ext import ContextTypes
+from category_index import invalidate_categories
 
 
 async def start(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
@@ -11,20 +12,21 @@ async def start(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     user_id = update.effective_user.id
     
     # Add default categories for new users using SQLAlchemy
-    session = get_session()
+    session = get_async_session()
     try:
         default_expense_categories = ["alimentação", "transporte", "moradia", "lazer", "saúde", "educação", "outros"]
         default_income_categories = ["salário", "freelancer", "investimentos", "outros"]
         
         for cat in default_expense_categories:
             category = Category(user_id=user_id, name=cat, type=TransactionType.DESPESA)
-            session.merge(category)  # Usar merge para evitar duplicatas
+            await session.merge(category)  # Usar merge para evitar duplicatas
         
         for cat in default_income_categories:
             category = Category(user_id=user_id, name=cat, type=TransactionType.RECEITA)
-            session.merge(category)  # Usar merge para evitar duplicatas
+            await session.merge(category)  # Usar merge para evitar duplicatas
         
-        session.commit()
+        await session.commit()
+        invalidate_categories(user_id)
         
         await update.message.reply_text(
             f"👋 Olá {update.effective_user.first_name}!\n\n"
@@ -48,4 +50,4 @@ async def start(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     except Exception as e:
         await update.message.reply_text(f"❌ Erro ao configurar categorias: {str(e)}")
     finally:
-        session.close()
\ No newline at end of file
+        await session.close()
\ No newline at end of file
@@ -1,6 +1,7 @@
 from telegram import Update
 from telegram.ext import ContextTypes
-from tools.database import get_session, Transaction, TransactionType
+from sqlalchemy import select
+from tools.database import get_async_session, Transaction, TransactionType
 from datetime import datetime, date
 import calendar
 
@@ -8,7 +9,7 @@ async def get_user_transactions(user_id: int):
     """
     Busca as transações do usuário do mês e ano corrente.
     """
-    session = get_session()
+    session = get_async_session()
     try:
         # Obter data atual
         today = date.today()
@@ -19,11 +20,13 @@ async def get_user_transactions(user_id: int):
         last_day_of_month = calendar.monthrange(current_year, current_month)[1]
         
         # Filtrar transações do mês e ano corrente
-        transactions = session.query(Transaction).filter(
-            Transaction.user_id == user_id,
-            Transaction.date >= date(current_year, current_month, 1),
-            Transaction.date <= date(current_year, current_month, last_day_of_month)
-        ).order_by(Transaction.date.desc(), Transaction.id.desc()).all()
+        transactions = (await session.scalars(
+            select(Transaction).where(
+                Transaction.user_id == user_id,
+                Transaction.date >= date(current_year, current_month, 1),
+                Transaction.date <= date(current_year, current_month, last_day_of_month)
+            ).order_by(Transaction.date.desc(), Transaction.id.desc())
+        )).all()
         
         return [
             {
@@ -32,7 +35,8 @@ async def get_user_transactions(user_id: int):
                 'amount': float(t.amount),
                 'category': t.category,
                 'date': t.date.strftime('%d/%m/%Y'),
-                'description': t.description
+                'description': t.description,
+                'receipt_id': t.receipt_id
             }
             for t in transactions
         ]
@@ -40,7 +44,7 @@ async def get_user_transactions(user_id: int):
         print(f"Erro ao buscar transações: {e}")
         return []
     finally:
-        session.close()
+        await session.close()
 
 async def extrato(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     """
@@ -75,6 +79,7 @@ async def extrato(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     for trans in transactions:
         emoji = "💰" if trans['type'] == 'receita' else "💸"
         desc = f" - {trans['description']}" if trans['description'] else ""
-        message += f"{emoji} {trans['date']} - {trans['category']}: R$ {trans['amount']:.2f}{desc}\n"
+        receipt = f" 🧾 /nota {trans['id']}" if trans['receipt_id'] else ""
+        message += f"{emoji} {trans['date']} - {trans['category']}: R$ {trans['amount']:.2f}{desc}{receipt}\n"
     
     await update.message.reply_text(message)
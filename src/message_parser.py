@@ -0,0 +1,292 @@
+"""
+Interpretação das mensagens de texto com transações.
+
+A frase é dividida em tokens uma única vez (valor, data, palavra ou
+pontuação), cada um casado por um regex simples e sem repetições
+aninhadas, e a gramática é conferida sobre a lista de tokens em tempo
+linear:
+
+    [texto] VERBO [palavras] VALOR [palavras] [pontuação ...] [ - descrição]
+
+Datas podem aparecer em qualquer ponto depois do verbo; o que vem depois
+da primeira pontuação ("(", ",", "&", "!") é ignorado. A categoria são
+as palavras antes do valor ("paguei aluguel de 800") ou, se não houver,
+as palavras depois dele ("gastei 50 com mercado"), sem os conectivos das
+pontas. Valores aceitam "50", "50,90", "R$ 1.234,56" e
+"12.5"; datas aceitam "hoje", "ontem", "anteontem", "12/10" e "12/10/2024"
+(uma data inexistente, como "31/02", faz a frase não ser entendida).
+Frases acima de MAX_CLAUSE_LENGTH caracteres não são interpretadas.
+
+A maioria das mensagens ("gastei 50 com mercado", "paguei aluguel de 800")
+nem chega a ser tokenizada: SIMPLE casa a frase inteira de uma vez e já
+separa categoria, valor e data; o resultado é o mesmo do caminho geral,
+que fica para o resto (datas no meio, números na categoria, espaços duplos).
+"""
+import re
+from datetime import date, timedelta
+from typing import Optional, Dict, List, Tuple
+
+# Verbo -> (tipo, descrição padrão quando a mensagem não traz uma)
+VERBS = {
+    'gastei': ('despesa', None),
+    'despesa': ('despesa', None),
+    'paguei': ('despesa', None),
+    'comprei': ('despesa', 'compra por {amount}'),
+    'pago': ('despesa', 'pagamento de {amount}'),
+    'recebi': ('receita', None),
+    'renda': ('receita', None),
+    'ganhei': ('receita', None),
+    'depositei': ('receita', None),
+    'entraram': ('receita', None),
+}
+
+# Conectivos removidos do início/fim da categoria
+CONNECTORS = {
+    'com', 'em', 'no', 'na', 'nos', 'nas', 'para', 'pra', 'pro', 'de', 'do', 'da', 'dos', 'das',
+    'por', 'o', 'a', 'os', 'as', 'um', 'uma', 'dia', 'reais', 'real',
+}
+
+RELATIVE_DAYS = {'hoje': timedelta(0), 'ontem': timedelta(1), 'anteontem': timedelta(2)}
+
+# Uma frase maior que isso não é uma transação; nem chega a ser interpretada
+MAX_CLAUSE_LENGTH = 300
+# Limite de uma mensagem do Telegram
+MAX_MESSAGE_LENGTH = 4096
+
+DATE = r'(?:hoje|ontem|anteontem|\d{1,2}/\d{1,2}(?:/\d{2}(?:\d{2})?)?)\b'
+AMOUNT = r'(?:r\$\s*)?(?:\d{1,3}(?:\.\d{3})+(?:,\d{1,2})?|\d+(?:,\d{1,2}|\.\d{1,2})?)(?![\d/]|[.,]\d)'
+WORD = r'[^\W_]+(?:-[^\W_]+)*'
+# Palavras só com letras latinas, mais baratas de casar que WORD; as demais vão pelo caminho geral
+LETTERS = r'[a-zà-öø-ÿ]+'
+VERB = re.compile(rf"\b(?:{'|'.join(VERBS)})\b")
+CURRENCY_SPACE = re.compile(r'r\$\s+')
+SEPARATOR = re.compile(r'\s*:\s*|\s+[-–]\s*|\s*[-–]\s+')
+# "verbo [conectivos] [categoria] [conectivos] valor [conectivos] [categoria] [conectivos] [data]",
+# um espaço entre tokens, até o fim ou uma pontuação; os grupos já saem sem os conectivos
+# das pontas. Palavras não têm dígitos e os conectivos são possessivos: com o limite de
+# MAX_CLAUSE_LENGTH, o pior caso é uma fração de milissegundo
+CONNECTOR = rf"(?:{'|'.join(sorted(CONNECTORS, key=len, reverse=True))})\b"
+SIMPLE = re.compile(rf"""
+    ({'|'.join(VERBS)}) (?:\ {CONNECTOR})*+ (?:\ ({LETTERS}(?:\ {LETTERS})*?))? (?:\ {CONNECTOR})*+
+    \ ((?>{AMOUNT})) (?:\ {CONNECTOR})*+ (?:\ ({LETTERS}(?:\ {LETTERS})*?))? (?:\ {CONNECTOR})*+
+    (?:\ ((?>{DATE})))? (?=\s*(?:$|[^\w\s$-])|\s+-|-(?![^\W_]))
+""", re.VERBOSE)
+# Um token por casamento; a ordem das alternativas decide "hoje" (data, não
+# palavra) e "12/10" (data, não valor)
+TOKEN = re.compile(rf"(?P<date>{DATE})|(?P<amount>{AMOUNT})|(?P<word>{WORD})|(?P<other>\S)")
+
+# Fronteiras entre transações: linha, ';' ou ", "/" e " antes de um verbo ou,
+# fora da descrição, antes de um valor (", " exige espaço para não quebrar "1.234,56")
+LINE_SPLIT = re.compile(r'[\n;]')
+VERB_SPLIT = re.compile(rf"(?:,\s*|,?\s+e\s+)(?=(?:{'|'.join(VERBS)})\b)")
+AMOUNT_SPLIT = re.compile(r'(?:,\s+|,?\s+e\s+)(?=(?:r\$|\d))')
+
+THOUSANDS = re.compile(r'\d{1,3}(?:\.\d{3})+')
+
+
+def parse_amount(token: str) -> float:
+    """'1.234,56' -> 1234.56, '12.5' -> 12.5, '1.500' -> 1500.0"""
+    if token.isdecimal():
+        return float(token)
+    number = token.lstrip('r$ \t')
+    if ',' in number:
+        return float(number.replace('.', '').replace(',', '.'))
+    if THOUSANDS.fullmatch(number):
+        return float(number.replace('.', ''))
+    return float(number)
+
+
+def parse_date(token: str, today: date) -> Optional[date]:
+    if token in RELATIVE_DAYS:
+        return today - RELATIVE_DAYS[token]
+
+    parts = [int(part) for part in token.split('/')]
+    day, month = parts[0], parts[1]
+    if len(parts) == 3:
+        year = parts[2] + 2000 if parts[2] < 100 else parts[2]
+    else:
+        year = today.year
+    try:
+        result = date(year, month, day)
+    except ValueError:
+        return None
+    # "28/12" enviado em janeiro é do ano passado
+    if len(parts) == 2 and result > today:
+        result = result.replace(year=year - 1)
+    return result
+
+
+def tokenize(text: str) -> List[Tuple[str, str]]:
+    """Lista de (tipo, texto), tipo em 'date', 'amount', 'word' ou 'other', em uma única passada"""
+    tokens = []
+    # Palavras e números simples dispensam o regex
+    if 'r$' in text:
+        text = CURRENCY_SPACE.sub('r$', text)
+    for chunk in text.split():
+        if chunk.isalpha():
+            tokens.append(('date' if chunk in RELATIVE_DAYS else 'word', chunk))
+        elif chunk.isdecimal():
+            tokens.append(('amount', chunk))
+        else:
+            tokens.extend((match.lastgroup, match.group()) for match in TOKEN.finditer(chunk))
+    return tokens
+
+
+def strip_connectors(words: List[str]) -> str:
+    if not words or (words[0] not in CONNECTORS and words[-1] not in CONNECTORS):
+        return ' '.join(words)
+    start, end = 0, len(words)
+    while start < end and words[start] in CONNECTORS:
+        start += 1
+    while end > start and words[end - 1] in CONNECTORS:
+        end -= 1
+    return ' '.join(words[start:end])
+
+
+def parse_from_verb(tokens: list, index: int, description: str, today: date):
+    """Confere a gramática a partir do verbo tokens[index]; None quando a frase não casa"""
+    verb = tokens[index][1]
+    before, after, amount, found = [], [], None, None
+
+    for position in range(index + 1, len(tokens)):
+        kind, value = tokens[position]
+        if kind == 'word' or (kind == 'amount' and amount is not None):
+            # Números depois do valor fazem parte da categoria ("3 parcelas de 100")
+            (after if amount else before).append(value)
+        elif kind == 'amount':
+            amount = value
+        elif kind == 'date':
+            found = found or value
+        else:
+            # A frase termina na primeira pontuação: "gastei 50 com mercado (feira)" é "mercado"
+            break
+
+    if amount is None:
+        return None
+    category = strip_connectors(before) or strip_connectors(after)
+    return verb, transaction(verb, amount, category, found, description, today)
+
+
+def transaction(verb: str, amount: str, category: str, found: Optional[str],
+                description: str, today: date) -> Optional[Dict]:
+    """Monta o resultado da frase; None sem categoria ou com data inválida"""
+    if not category:
+        return None
+    if found:
+        day = parse_date(found, today or date.today())
+        if day is None:
+            # "31/02" não vira hoje: a frase não é entendida
+            return None
+    else:
+        day = None
+
+    amount = parse_amount(amount)
+    trans_type, default_description = VERBS[verb]
+    if not description and default_description:
+        description = default_description.format(amount=amount)
+
+    return {
+        'type': trans_type,
+        'amount': amount,
+        'category': category,
+        'description': description,
+        'date': day
+    }
+
+
+def parse_simple(simple, text: str, today: date):
+    """Resultado da frase casada por SIMPLE, sem tokenizar; equivale a parse_from_verb"""
+    verb, before, amount, after, found = simple.groups()
+    # O separador não aparece dentro do casamento: a descrição, se houver, vem depois
+    description = ''
+    if simple.end() < len(text) and (':' in text or '-' in text or '–' in text):
+        separator = SEPARATOR.search(text, simple.end())
+        if separator:
+            description = text[separator.end():].strip()
+    return verb, transaction(verb, amount, before or after, found, description, today)
+
+
+def parse_clause(text: str, today: date = None):
+    """Retorna (verbo, resultado) da frase já em minúsculas, ou (None, None)"""
+    if len(text) > MAX_CLAUSE_LENGTH:
+        return None, None
+
+    simple = SIMPLE.match(text)
+    if simple is None:
+        # Tudo antes do verbo é ignorado
+        first_verb = VERB.search(text)
+        if first_verb is None:
+            return None, None
+        text = text[first_verb.start():]
+        simple = SIMPLE.match(text)
+
+    # Caminho rápido para a frase mais comum. Datas por extenso casariam como
+    # palavra da categoria: só "gastei 50 no uber ontem", com a data no fim, fica aqui
+    if simple and ('hoje' not in text and 'ontem' not in text
+                   or simple.group(5) in RELATIVE_DAYS and text.count('hoje') + text.count('ontem') == 1):
+        return parse_simple(simple, text, today)
+
+    # O separador não aparece dentro de nenhum token: tudo depois dele é a descrição
+    separator = SEPARATOR.search(text) if ':' in text or '-' in text or '–' in text else None
+    description = ''
+    if separator:
+        text, description = text[:separator.start()], text[separator.end():].strip()
+
+    tokens = tokenize(text)
+    # Se a frase não casar a partir de um verbo, tenta o próximo
+    for index, (kind, value) in enumerate(tokens):
+        if kind == 'word' and value in VERBS:
+            parsed = parse_from_verb(tokens, index, description, today)
+            if parsed is not None:
+                return parsed
+    return None, None
+
+
+def parse_financial_message(text: str, today: date = None) -> Optional[Dict]:
+    """
+    Retorna {'type', 'amount', 'category', 'description', 'date'} ou None
+    quando a mensagem não tem verbo conhecido, valor ou categoria.
+    'date' é None quando a mensagem não informa data (hoje).
+    """
+    return parse_clause(text.lower(), today)[1]
+
+
+def split_clauses(text: str) -> List[str]:
+    """Divide a mensagem (já em minúsculas) nas frases de cada transação"""
+    clauses = []
+    for line in LINE_SPLIT.split(text):
+        for sentence in VERB_SPLIT.split(line):
+            # "paguei 100 de luz - conta de 2 meses e 3 dias": o " e 3" é da descrição
+            separator = SEPARATOR.search(sentence) if ':' in sentence or '-' in sentence or '–' in sentence else None
+            head, tail = (sentence[:separator.start()], sentence[separator.start():]) if separator else (sentence, '')
+            parts = AMOUNT_SPLIT.split(head)
+            parts[-1] += tail
+            clauses.extend(parts)
+    return clauses
+
+
+def parse_financial_messages(text: str, today: date = None) -> Tuple[List[Dict], List[str]]:
+    """
+    Interpreta mensagens com várias transações, uma por linha, separadas
+    por ';' ou encadeadas ("gastei 12 com café e 40 com uber, recebi 200 de pix").
+    Frases sem verbo herdam o verbo da anterior. Retorna (transações, trechos não entendidos).
+    """
+    transactions, unparsed = [], []
+    last_verb = None
+
+    for clause in split_clauses(text[:MAX_MESSAGE_LENGTH].lower()):
+        clause = clause.strip(' \t,.')
+        if not clause:
+            continue
+
+        verb, result = parse_clause(clause, today)
+        if verb is None and last_verb:
+            verb, result = parse_clause(f"{last_verb} {clause}", today)
+
+        if result:
+            transactions.append(result)
+            last_verb = verb
+        else:
+            unparsed.append(clause)
+
+    return transactions, unparsed
@@ -0,0 +1,63 @@
+import asyncio
+import os
+
+
+class Album:
+    def __init__(self, update, context):
+        self.update = update                # primeira mensagem do álbum (usada nas respostas)
+        self.context = context
+        self.images = []                    # (message_id, bytes)
+        self.timer = None
+
+
+class AlbumCollector:
+    """
+    Junta as imagens de um álbum do Telegram (mesmo media_group_id).
+
+    O Telegram entrega cada foto do álbum como uma atualização separada e
+    não avisa quando o álbum termina; o coletor espera NF_ALBUM_DELAY
+    segundos sem novas fotos do grupo e então chama on_album uma única vez
+    com todas as imagens, na ordem das mensagens.
+    """
+
+    def __init__(self, on_album):
+        self.on_album = on_album            # async (update, context, images) -> None
+        self.delay = float(os.getenv('NF_ALBUM_DELAY', '1.5'))
+        self._albums = {}
+        self._tasks = set()
+
+    def add(self, update, context, image: bytes):
+        key = (update.effective_user.id, update.message.media_group_id)
+        album = self._albums.get(key)
+        if album is None:
+            album = self._albums[key] = Album(update, context)
+        album.images.append((update.message.message_id, image))
+
+        # Cada nova foto adia o fechamento do álbum
+        if album.timer is not None:
+            album.timer.cancel()
+        album.timer = asyncio.get_running_loop().call_later(self.delay, self._flush, key)
+
+    def _flush(self, key):
+        album = self._albums.pop(key, None)
+        if album is None:
+            return
+        images = [image for _, image in sorted(album.images, key=lambda entry: entry[0])]
+        task = asyncio.create_task(self._run(album, images))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _run(self, album: Album, images: list):
+        try:
+            await self.on_album(album.update, album.context, images)
+        except Exception as e:
+            print(f"Erro ao processar álbum de notas: {e}")
+
+    async def stop(self):
+        for album in self._albums.values():
+            if album.timer is not None:
+                album.timer.cancel()
+        self._albums.clear()
+        for task in list(self._tasks):
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
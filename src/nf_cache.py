@@ -0,0 +1,114 @@
+import json
+import os
+import re
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from urllib.parse import unquote
+from sqlalchemy import select
+from tools.database import get_async_session, NfCache, NfConfirmation
+
+# Chave de acesso da NFC-e: 44 dígitos no parâmetro p= (ou chNFe=) da URL do QR Code
+ACCESS_KEY = re.compile(r'(?<!\d)\d{44}(?!\d)')
+
+
+def extract_access_key(url: str):
+    """Extrai a chave de acesso de 44 dígitos da URL do QR Code, ou None"""
+    if not url:
+        return None
+    match = ACCESS_KEY.search(re.sub(r'\s', '', unquote(url)))
+    return match.group(0) if match else None
+
+
+class ReceiptCache:
+    """
+    Cache dos dados já extraídos de cada NFC-e, pela chave de acesso.
+
+    Primeiro nível em memória (LRU com TTL); segundo nível opcional na
+    tabela nf_cache, que sobrevive a reinícios. A nota emitida não muda,
+    então o TTL só limita o tamanho/idade do cache.
+    """
+
+    def __init__(self):
+        self.max_entries = int(os.getenv('NF_CACHE_MAX_ENTRIES', '512'))
+        self.ttl = float(os.getenv('NF_CACHE_TTL', '86400'))
+        self.persistent = os.getenv('NF_CACHE_PERSISTENT', 'true').lower() == 'true'
+        self.persistent_ttl = timedelta(days=int(os.getenv('NF_CACHE_DB_TTL_DAYS', '30')))
+        self._entries = OrderedDict()
+
+    async def get(self, access_key: str):
+        if not access_key:
+            return None
+
+        entry = self._entries.get(access_key)
+        if entry is not None:
+            data, expires_at = entry
+            if expires_at > time.monotonic():
+                self._entries.move_to_end(access_key)
+                return data
+            del self._entries[access_key]
+
+        if not self.persistent:
+            return None
+
+        session = get_async_session()
+        try:
+            cached = await session.get(NfCache, access_key)
+            if cached is None or cached.fetched_at < datetime.utcnow() - self.persistent_ttl:
+                return None
+            data = json.loads(cached.payload)
+            self._remember(access_key, data)
+            return data
+        except Exception as e:
+            print(f"Erro ao ler cache da NF: {e}")
+            return None
+        finally:
+            await session.close()
+
+    async def set(self, access_key: str, data: dict):
+        if not access_key or not data:
+            return
+
+        self._remember(access_key, data)
+        if not self.persistent:
+            return
+
+        session = get_async_session()
+        try:
+            await session.merge(NfCache(
+                access_key=access_key,
+                payload=json.dumps(data, ensure_ascii=False),
+                fetched_at=datetime.utcnow()
+            ))
+            await session.commit()
+        except Exception as e:
+            await session.rollback()
+            print(f"Erro ao gravar cache da NF: {e}")
+        finally:
+            await session.close()
+
+    def _remember(self, access_key: str, data: dict):
+        self._entries[access_key] = (data, time.monotonic() + self.ttl)
+        self._entries.move_to_end(access_key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+
+async def get_confirmation(user_id: int, access_key: str):
+    """Retorna quando o usuário já registrou esta nota, ou None"""
+    if not access_key:
+        return None
+    session = get_async_session()
+    try:
+        return await session.scalar(
+            select(NfConfirmation.confirmed_at).where(
+                NfConfirmation.user_id == user_id,
+                NfConfirmation.access_key == access_key
+            )
+        )
+    except Exception as e:
+        print(f"Erro ao verificar nota duplicada: {e}")
+        return None
+    finally:
+        await session.close()
+
@@ -0,0 +1,55 @@
+import os
+import re
+import httpx
+
+# A tabela de itens já vem no HTML das páginas renderizadas no servidor
+TAB_RESULT = re.compile(r'id\s*=\s*["\']?tabResult\b', re.IGNORECASE)
+
+
+class NfHttpFetcher:
+    """
+    Busca a página de consulta da NFC-e com um GET direto, sem navegador.
+
+    Usa um único AsyncClient (pool de conexões com keep-alive) criado sob
+    demanda no event loop do bot. fetch() retorna None quando a página não
+    contém #tabResult, indicando que ela precisa de JavaScript (Selenium).
+    """
+
+    def __init__(self, user_agent: str):
+        self.user_agent = user_agent
+        self.timeout = float(os.getenv('NF_HTTP_TIMEOUT', '10'))
+        self.max_connections = int(os.getenv('NF_HTTP_MAX_CONNECTIONS', '20'))
+        self.verify_ssl = os.getenv('NF_HTTP_VERIFY_SSL', 'true').lower() == 'true'
+        self._client = None
+
+    def get_client(self) -> httpx.AsyncClient:
+        if self._client is None or self._client.is_closed:
+            self._client = httpx.AsyncClient(
+                headers={'User-Agent': self.user_agent},
+                timeout=httpx.Timeout(self.timeout, connect=min(self.timeout, 5)),
+                limits=httpx.Limits(
+                    max_connections=self.max_connections,
+                    max_keepalive_connections=self.max_connections,
+                    keepalive_expiry=60
+                ),
+                follow_redirects=True,
+                verify=self.verify_ssl
+            )
+        return self._client
+
+    async def fetch(self, url: str):
+        """Retorna o HTML da nota ou None se for preciso recorrer ao Selenium"""
+        try:
+            response = await self.get_client().get(url)
+        except httpx.HTTPError as e:
+            print(f"Erro ao buscar NF via HTTP: {e}")
+            return None
+
+        if response.status_code != 200 or not TAB_RESULT.search(response.text):
+            return None
+        return response.text
+
+    async def close(self):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
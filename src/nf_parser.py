@@ -0,0 +1,177 @@
+"""
+Extrator da página de consulta da NFC-e em uma única passada.
+
+Em vez de montar a árvore com BeautifulSoup e varrer o documento uma vez
+por classe, cada linha (<tr>) de #tabResult é percorrida uma vez e o item
+é preenchido a partir dos seus próprios spans, então os campos nunca
+ficam desalinhados quando algum span está ausente.
+
+Usa lxml (parser em C) quando instalado; sem ele, um HTMLParser em
+streaming da biblioteca padrão faz o mesmo trabalho.
+"""
+from html.parser import HTMLParser
+
+try:
+    import lxml.html
+except ImportError:
+    lxml = None
+
+# Classe do span -> campo do item
+ITEM_FIELDS = {
+    'txtTit': 'descricao',
+    'RCod': 'codigo',
+    'Rqtd': 'quantidade',
+    'RUN': 'unidade',
+    'RvlUnit': 'valor_unitario',
+    'valor': 'valor_total',
+}
+
+VOID_TAGS = {'br', 'img', 'hr', 'input', 'meta', 'link', 'col', 'wbr', 'area', 'base', 'source'}
+
+
+def after_colon(text: str) -> str:
+    return text.split(':', 1)[1].strip() if ':' in text else text.strip()
+
+
+def clean_field(field: str, text: str) -> str:
+    text = text.strip()
+    if field == 'codigo':
+        return after_colon(text).split(')')[0].strip()
+    if field in ('quantidade', 'unidade', 'valor_unitario'):
+        return after_colon(text)
+    return text
+
+
+class NfPageParser(HTMLParser):
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.header_depth = 0       # profundidade de div dentro de div.txtCenter
+        self.header_divs = []
+        self.header_text = None     # índice do div do cabeçalho sendo lido
+        self.in_table = 0           # profundidade de table dentro de #tabResult
+        self.row = None
+        self.rows = []
+        self.field = None
+        self.field_depth = 0
+        self.buffer = []
+
+    def handle_starttag(self, tag, attrs):
+        if tag in VOID_TAGS:
+            return
+        attributes = dict(attrs)
+        classes = (attributes.get('class') or '').split()
+
+        if tag == 'div':
+            if self.header_depth:
+                self.header_depth += 1
+                self.header_divs.append([])
+                self.header_text = len(self.header_divs) - 1
+            elif 'txtCenter' in classes and not self.header_divs:
+                self.header_depth = 1
+            return
+
+        if tag == 'table':
+            if self.in_table:
+                self.in_table += 1
+            elif attributes.get('id') == 'tabResult':
+                self.in_table = 1
+            return
+
+        if not self.in_table:
+            return
+
+        if tag == 'tr':
+            self.row = {}
+            self.rows.append(self.row)
+        elif self.field:
+            self.field_depth += 1
+        elif tag == 'span' and self.row is not None:
+            for css_class in classes:
+                field = ITEM_FIELDS.get(css_class)
+                if field and field not in self.row:
+                    self.field = field
+                    self.field_depth = 1
+                    self.buffer = []
+                    break
+
+    def handle_endtag(self, tag):
+        if tag in VOID_TAGS:
+            return
+
+        if tag == 'div' and self.header_depth:
+            self.header_depth -= 1
+            self.header_text = None
+            return
+
+        if tag == 'table' and self.in_table:
+            self.in_table -= 1
+            return
+
+        if self.field:
+            self.field_depth -= 1
+            if self.field_depth == 0:
+                self.row[self.field] = clean_field(self.field, ''.join(self.buffer))
+                self.field = None
+        elif tag == 'tr':
+            self.row = None
+
+    def handle_data(self, data):
+        if self.field:
+            self.buffer.append(data)
+        elif self.header_text is not None:
+            self.header_divs[self.header_text].append(data)
+
+
+def parse_with_lxml(html: str):
+    """Retorna (divs do cabeçalho, linhas de itens) usando lxml"""
+    root = lxml.html.fromstring(html)
+
+    header = root.find_class('txtCenter')
+    header_divs = [div.text_content() for div in header[0].iter('div') if div is not header[0]] if header else []
+
+    rows = []
+    for table in root.xpath('//table[@id="tabResult"]'):
+        for tr in table.iter('tr'):
+            row = {}
+            for span in tr.iter('span'):
+                for css_class in (span.get('class') or '').split():
+                    field = ITEM_FIELDS.get(css_class)
+                    if field and field not in row:
+                        row[field] = clean_field(field, span.text_content())
+                        break
+            rows.append(row)
+    return header_divs, rows
+
+
+def parse_with_html_parser(html: str):
+    """Retorna (divs do cabeçalho, linhas de itens) com o HTMLParser da biblioteca padrão"""
+    parser = NfPageParser()
+    parser.feed(html)
+    parser.close()
+    return [''.join(parts) for parts in parser.header_divs], parser.rows
+
+
+def parse_nf_page(html: str) -> dict:
+    """Extrai loja e itens da página da NFC-e no mesmo formato do extrator antigo (ver benchmarks/bench_nf_parser.py)"""
+    if lxml is not None:
+        header_divs, rows = parse_with_lxml(html)
+    else:
+        header_divs, rows = parse_with_html_parser(html)
+
+    header = [text.strip() for text in header_divs]
+    header += [''] * (3 - len(header))
+
+    items = {}
+    for row in rows:
+        if not row.get('descricao'):
+            continue
+        items[str(len(items))] = {field: row.get(field, '') for field in ITEM_FIELDS.values()}
+
+    return {
+        'shop_info': {
+            "loja": header[0],
+            "cnpj": after_colon(header[1]),
+            "endereco": header[2].replace('\n', '').replace('\t', ''),
+        },
+        'items': items
+    }
@@ -0,0 +1,224 @@
+import asyncio
+import itertools
+import os
+import time
+from collections import deque
+from telegram import InlineKeyboardButton, InlineKeyboardMarkup
+from rate_limiter import BULK
+
+
+class QueueFullError(Exception):
+    """A fila global de notas está cheia (backpressure)"""
+
+
+class UserLimitError(Exception):
+    """O usuário já tem o máximo de notas na fila/em processamento"""
+
+
+class NfJob:
+    def __init__(self, job_id: int, user_id: int, image, on_result, status_message, run_job=None):
+        self.id = job_id
+        self.user_id = user_id
+        self.image = image
+        self.on_result = on_result          # async (job, result_data) -> None
+        self.run_job = run_job              # substitui o run_job da fila (ex.: álbum)
+        self.status_message = status_message
+        self.created_at = time.monotonic()
+        self.position = None
+        self.task = None
+        self.cancelled = False
+
+
+class NfJobQueue:
+    """
+    Fila de processamento de notas fiscais.
+
+    Um número fixo de workers (NF_MAX_CONCURRENCY) consome a fila em ordem;
+    cada usuário tem um limite de notas pendentes e a fila tem tamanho
+    máximo, recusando novas notas quando cheia. A mensagem de status de
+    cada nota é editada no lugar com a posição na fila e o progresso, e
+    pode ser cancelada pelo botão enquanto espera ou processa.
+
+    As posições são atualizadas em segundo plano por uma única tarefa, no
+    máximo a cada NF_POSITION_UPDATE_INTERVAL segundos e só nas notas cuja
+    posição mudou; os workers nunca esperam por essas edições, nem pelo
+    aviso de início do processamento.
+    """
+
+    def __init__(self, run_job):
+        self.run_job = run_job              # async (image, progress) -> result_data
+        self.workers = int(os.getenv('NF_MAX_CONCURRENCY', '4'))
+        self.max_size = int(os.getenv('NF_QUEUE_MAX_SIZE', '100'))
+        self.max_per_user = int(os.getenv('NF_MAX_JOBS_PER_USER', '3'))
+        self.wait_timeout = float(os.getenv('NF_QUEUE_WAIT_TIMEOUT', '300'))
+        self.position_interval = float(os.getenv('NF_POSITION_UPDATE_INTERVAL', '2'))
+        self._waiting = deque()
+        self._reserved = 0                  # vagas reservadas por submit ainda respondendo
+        self._jobs = {}
+        self._ids = itertools.count(1)
+        self._condition = None
+        self._tasks = []
+        self._positions_task = None
+        self._positions_dirty = False
+        self._edits = set()                 # edições de status em segundo plano
+
+    def start(self):
+        if self._tasks:
+            return
+        self._condition = asyncio.Condition()
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+
+    async def stop(self):
+        tasks = self._tasks + ([self._positions_task] if self._positions_task else []) + list(self._edits)
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self._tasks = []
+        self._positions_task = None
+
+    def pending_for(self, user_id: int) -> int:
+        return sum(1 for job in self._jobs.values() if job.user_id == user_id)
+
+    async def submit(self, message, user_id: int, image, on_result, run_job=None):
+        """
+        Enfileira a imagem e responde com a mensagem de status da nota.
+        run_job, se informado, processa este job no lugar do run_job da fila.
+        Levanta QueueFullError/UserLimitError quando não há espaço.
+        """
+        self.start()
+        if len(self._waiting) + self._reserved >= self.max_size:
+            raise QueueFullError()
+        if self.pending_for(user_id) >= self.max_per_user:
+            raise UserLimitError()
+
+        # Reserva a vaga antes do primeiro await: submits simultâneos não passam juntos pelos limites
+        job = NfJob(next(self._ids), user_id, image, on_result, None, run_job)
+        job.position = len(self._waiting) + self._reserved + 1
+        self._jobs[job.id] = job
+        self._reserved += 1
+        try:
+            job.status_message = await message.reply_text(
+                self._waiting_text(job.position),
+                reply_markup=self._cancel_markup(job.id)
+            )
+        except Exception:
+            self._jobs.pop(job.id, None)
+            raise
+        finally:
+            self._reserved -= 1
+
+        async with self._condition:
+            self._waiting.append(job)
+            self._condition.notify()
+        # Outra nota pode ter entrado ou saído enquanto a resposta era enviada
+        self._schedule_positions()
+        return job
+
+    async def cancel(self, job_id: int, user_id: int) -> bool:
+        job = self._jobs.get(job_id)
+        if job is None or job.user_id != user_id:
+            return False
+
+        job.cancelled = True
+        if job in self._waiting:
+            self._waiting.remove(job)
+            self._jobs.pop(job_id, None)
+            self._schedule_positions()
+        elif job.task is not None:
+            job.task.cancel()
+        await self._edit(job, "❌ Processamento da nota cancelado.")
+        return True
+
+    async def _worker(self):
+        while True:
+            async with self._condition:
+                await self._condition.wait_for(lambda: self._waiting)
+                job = self._waiting.popleft()
+            self._schedule_positions()
+
+            try:
+                # Cancelada entre a retirada da fila e aqui: cancel() já avisou o usuário
+                if job.cancelled:
+                    continue
+                if time.monotonic() - job.created_at > self.wait_timeout:
+                    await self._edit(job, "⌛ A nota esperou demais na fila. Envie a foto novamente.")
+                    continue
+
+                notice = self._edit_later(job, "⏳ Processando a nota fiscal...", cancellable=True)
+                job.task = asyncio.create_task(self._run(job, notice))
+                await asyncio.wait({job.task})
+            except Exception as e:
+                print(f"Erro no worker da fila de notas: {e}")
+            finally:
+                self._jobs.pop(job.id, None)
+
+    async def _run(self, job: NfJob, notice: asyncio.Task):
+        # O aviso de início sai em paralelo com o job; as edições seguintes esperam por ele para não serem sobrescritas
+        async def progress(text: str):
+            await asyncio.wait({notice})
+            await self._edit(job, text, cancellable=True)
+
+        try:
+            result_data = await (job.run_job or self.run_job)(job.image, progress)
+            await asyncio.wait({notice})
+            if not job.cancelled:
+                await job.on_result(job, result_data)
+        except asyncio.CancelledError:
+            pass
+        except Exception as e:
+            await asyncio.wait({notice})
+            await self._edit(job, f"❌ Erro ao processar a nota: {str(e)}")
+        finally:
+            job.image = None
+
+    def _schedule_positions(self):
+        """Agenda a atualização das posições; várias chamadas seguidas viram uma só"""
+        self._positions_dirty = True
+        if self._positions_task is None or self._positions_task.done():
+            self._positions_task = asyncio.create_task(self._update_positions())
+
+    async def _update_positions(self):
+        while self._positions_dirty:
+            # Espera as mudanças se acumularem antes de editar
+            await asyncio.sleep(self.position_interval)
+            self._positions_dirty = False
+            for position, job in enumerate(list(self._waiting), start=1):
+                # A nota pode ter saído da fila enquanto as anteriores eram editadas
+                if job.position == position or job not in self._waiting:
+                    continue
+                changed = self._waiting_text(job.position) != self._waiting_text(position)
+                job.position = position
+                if changed:
+                    await self._edit(job, self._waiting_text(position), cancellable=True)
+
+    def _edit_later(self, job: NfJob, text: str, cancellable: bool = False):
+        """Edita o status em segundo plano, sem que o worker espere pelo envio"""
+        task = asyncio.create_task(self._edit(job, text, cancellable))
+        self._edits.add(task)
+        task.add_done_callback(self._edits.discard)
+        return task
+
+    async def _edit(self, job: NfJob, text: str, cancellable: bool = False):
+        # Depois do cancelamento só a mensagem final (sem botão) é enviada
+        if cancellable and job.cancelled:
+            return
+        try:
+            # Posição/andamento (com botão de cancelar) vão na fila de baixa prioridade de envio
+            await job.status_message.get_bot().edit_message_text(
+                text,
+                chat_id=job.status_message.chat_id,
+                message_id=job.status_message.message_id,
+                reply_markup=self._cancel_markup(job.id) if cancellable else None,
+                rate_limit_args=BULK if cancellable else None
+            )
+        except Exception as e:
+            # Ex.: "message is not modified" ou mensagem apagada pelo usuário
+            print(f"Erro ao atualizar status da nota #{job.id}: {e}")
+
+    def _waiting_text(self, position: int) -> str:
+        if position <= 1:
+            return "🧾 Nota recebida! Aguardando processamento..."
+        return f"🧾 Nota recebida! Posição na fila: {position}"
+
+    def _cancel_markup(self, job_id: int):
+        return InlineKeyboardMarkup([[InlineKeyboardButton("❌ Cancelar", callback_data=f"nf_job_cancel_{job_id}")]])
@@ -0,0 +1,76 @@
+import asyncio
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+
+def process_context():
+    methods = multiprocessing.get_all_start_methods()
+    return multiprocessing.get_context('forkserver' if 'forkserver' in methods else 'spawn')
+
+
+def grid_sessions():
+    """Sessões do Selenium deste worker: o limite do grid (SE_NODE_MAX_SESSIONS) é dividido entre os BOT_WORKERS"""
+    workers = max(1, int(os.getenv('BOT_WORKERS', '1')))
+    return max(1, int(os.getenv('SE_NODE_MAX_SESSIONS', '5')) // workers)
+
+
+class NfWorkerPool:
+    """
+    Executores do processamento de notas fiscais.
+
+    Decodificação do QR Code e parsing do HTML (CPU) rodam em processos;
+    o Selenium (bloqueante, I/O) roda em threads. Cada nota é um job com
+    limite global de concorrência e timeout, aguardado pelos handlers sem
+    travar o event loop.
+
+    Os processos partem de um servidor de fork (forkserver) ou são criados
+    do zero (spawn), nunca com fork do bot: quando o pool é criado o bot já
+    tem threads (aiosqlite, to_thread, nf-io) e um fork copiaria locks
+    presos por elas.
+    """
+
+    def __init__(self):
+        self.cpu_mode = os.getenv('NF_CPU_EXECUTOR', 'process')  # 'process' ou 'thread'
+        self.cpu_workers = int(os.getenv('NF_CPU_WORKERS', str(min(2, os.cpu_count() or 1))))
+        self.io_workers = int(os.getenv('NF_IO_WORKERS', str(grid_sessions())))
+        self.max_concurrency = int(os.getenv('NF_MAX_CONCURRENCY', '4'))
+        self.job_timeout = float(os.getenv('NF_JOB_TIMEOUT', '60'))
+        self._cpu_executor = None
+        self._io_executor = None
+        self._semaphore = asyncio.Semaphore(self.max_concurrency)
+
+    @property
+    def cpu_executor(self):
+        if self._cpu_executor is None:
+            if self.cpu_mode == 'process':
+                self._cpu_executor = ProcessPoolExecutor(max_workers=self.cpu_workers, mp_context=process_context())
+            else:
+                self._cpu_executor = ThreadPoolExecutor(max_workers=self.cpu_workers, thread_name_prefix='nf-cpu')
+        return self._cpu_executor
+
+    @property
+    def io_executor(self):
+        if self._io_executor is None:
+            self._io_executor = ThreadPoolExecutor(max_workers=self.io_workers, thread_name_prefix='nf-io')
+        return self._io_executor
+
+    async def run_cpu(self, func, *args):
+        """Executa uma função picklable (nível de módulo) no executor de CPU"""
+        return await asyncio.get_running_loop().run_in_executor(self.cpu_executor, func, *args)
+
+    async def run_io(self, func, *args):
+        """Executa uma função bloqueante de I/O em thread"""
+        return await asyncio.get_running_loop().run_in_executor(self.io_executor, func, *args)
+
+    async def run_job(self, coroutine):
+        """Aguarda uma vaga de concorrência e executa o job com timeout"""
+        async with self._semaphore:
+            return await asyncio.wait_for(coroutine, timeout=self.job_timeout)
+
+    def shutdown(self):
+        for executor in (self._cpu_executor, self._io_executor):
+            if executor is not None:
+                executor.shutdown(wait=False, cancel_futures=True)
+        self._cpu_executor = None
+        self._io_executor = None
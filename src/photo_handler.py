@@ -1,22 +1,83 @@
 import os
-import tempfile
+import asyncio
+from decimal import Decimal
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
 from telegram.ext import ContextTypes
-from read_qrcode import ReadQrcode
-from tools.database import get_session, Category, TransactionType
-from command_menu.add_command import add_transaction
+from sqlalchemy import select
+from tools.database import get_async_session, Category, TransactionType
+from command_menu.receipt_command import add_receipt, add_receipts, to_decimal
+from nf_cache import get_confirmation
+from nf_queue import NfJobQueue, QueueFullError, UserLimitError
+from nf_album import AlbumCollector
 
-# Instância do leitor de QR Code
-qr_reader = ReadQrcode()
+# Leitor de QR Code, criado na primeira foto/documento: réplicas que só recebem
+# texto nunca carregam pyzbar, Pillow, lxml ou Selenium
+qr_reader = None
+_reader_lock = asyncio.Lock()
 
-def get_user_expense_categories(user_id: int):
+def load_nf_reader():
+    from read_qrcode import ReadQrcode
+    return ReadQrcode()
+
+async def get_nf_reader():
+    """Leitor de notas, carregado (fora do event loop) no primeiro uso"""
+    global qr_reader
+    if qr_reader is None:
+        async with _reader_lock:
+            if qr_reader is None:
+                qr_reader = await asyncio.to_thread(load_nf_reader)
+    return qr_reader
+
+async def extract_nf_data(image, progress=None):
+    reader = await get_nf_reader()
+    return await reader.extract_nf_data_async(image, progress)
+
+# Fila de processamento das notas (limite global, por usuário e backpressure)
+nf_queue = NfJobQueue(extract_nf_data)
+
+NF_READ_ERROR = (
+    "❌ Não foi possível ler a nota fiscal.\n\n"
+    "💡 Verifique se:\n"
+    "• A foto está nítida\n"
+    "• O QR Code está visível\n"
+    "• A nota fiscal é válida"
+)
+
+# Tamanho máximo de imagens enviadas como documento (baixadas para a memória)
+MAX_DOCUMENT_BYTES = int(os.getenv('NF_MAX_DOCUMENT_BYTES', str(10 * 1024 * 1024)))
+
+async def warm_up_nf_reader() -> None:
+    """
+    Inicia a fila de notas. Com NF_PRELOAD=1 também carrega o leitor e abre
+    sessões do Selenium, para a primeira nota não esperar o Chrome.
+    """
+    nf_queue.start()
+    if os.getenv('NF_PRELOAD', '0') != '1':
+        return
+    reader = await get_nf_reader()
+    count = int(os.getenv('NF_DRIVER_WARMUP', '1'))
+    await asyncio.to_thread(reader.driver_pool.warm_up, count)
+
+async def close_nf_reader() -> None:
+    """Encerra a fila de notas, as sessões do Selenium e o cliente HTTP mantidos pelo leitor"""
+    await album_collector.stop()
+    await nf_queue.stop()
+    if qr_reader is None:
+        return
+    await qr_reader.http_fetcher.close()
+    await asyncio.to_thread(qr_reader.driver_pool.close)
+    qr_reader.workers.shutdown()
+
+async def get_user_expense_categories(user_id: int):
     """Obtém as categorias de despesa do usuário sem duplicatas"""
-    session = get_session()
+    session = get_async_session()
     try:
-        categories = session.query(Category).filter(
-            Category.user_id == user_id,
-            Category.type == TransactionType.DESPESA
-        ).distinct().all()
+        categories = (await session.scalars(
+            select(Category).where(
+                Category.user_id == user_id,
+                Category.type == TransactionType.DESPESA
+            ).distinct()
+        )).all()
         # Remover duplicatas e ordenar
         unique_categories = list(set(cat.name for cat in categories))
         unique_categories.sort()
@@ -25,42 +86,24 @@ def get_user_expense_categories(user_id: int):
         print(f"Erro ao buscar categorias: {e}")
         return ["outros"]  # Categoria padrão
     finally:
-        session.close()
+        await session.close()
 
 async def handle_photo(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     """Handler para quando usuário envia uma foto"""
     user_id = update.effective_user.id
     
     try:
-        # Baixar a foto para um arquivo temporário
+        # Baixar a foto direto para a memória (sem arquivo temporário)
         photo_file = await update.message.photo[-1].get_file()
+        image_bytes = bytes(await photo_file.download_as_bytearray())
         
-        # Criar arquivo temporário
-        with tempfile.NamedTemporaryFile(delete=False, suffix='.jpg') as temp_file:
-            await photo_file.download_to_drive(temp_file.name)
-            temp_path = temp_file.name
-        
-        # Processar a imagem com o ReadQrcode
-        qr_reader.image_name = temp_path
-        qr_reader.image_folder = os.path.dirname(temp_path)
-        
-        # Extrair dados da nota fiscal
-        result_data = qr_reader.extract_nf_data(temp_path)
-        
-        # Limpar arquivo temporário
-        os.unlink(temp_path)
+        # Fotos de um álbum são juntadas e processadas em um único job
+        if update.message.media_group_id:
+            album_collector.add(update, context, image_bytes)
+            return
         
-        if result_data:
-            # Enviar resumo com seleção de categoria
-            await send_nf_summary(update, result_data, context)
-        else:
-            await update.message.reply_text(
-                "❌ Não foi possível ler a nota fiscal.\n\n"
-                "💡 Verifique se:\n"
-                "• A foto está nítida\n"
-                "• O QR Code está visível\n"
-                "• A nota fiscal é válida"
-            )
+        # Enfileirar a extração dos dados da nota fiscal
+        await enqueue_nf_image(update, context, image_bytes, NF_READ_ERROR)
             
     except Exception as e:
         await update.message.reply_text(f"❌ Erro ao processar a imagem: {str(e)}")
@@ -77,39 +120,117 @@ async def handle_document(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
             await update.message.reply_text("❌ Por favor, envie apenas arquivos de imagem (JPG, PNG).")
             return
         
-        # Baixar o documento
+        # Limitar o tamanho antes de baixar para a memória
+        if document.file_size and document.file_size > MAX_DOCUMENT_BYTES:
+            await update.message.reply_text(
+                f"❌ Arquivo muito grande. Envie imagens de até {MAX_DOCUMENT_BYTES // (1024 * 1024)} MB."
+            )
+            return
+        
+        # Baixar o documento direto para a memória
         doc_file = await document.get_file()
+        image_bytes = bytes(await doc_file.download_as_bytearray())
         
-        # Criar arquivo temporário
-        with tempfile.NamedTemporaryFile(delete=False, suffix='.jpg') as temp_file:
-            await doc_file.download_to_drive(temp_file.name)
-            temp_path = temp_file.name
+        if update.message.media_group_id:
+            album_collector.add(update, context, image_bytes)
+            return
         
         # Processar igual a foto
-        qr_reader.image_name = temp_path
-        qr_reader.image_folder = os.path.dirname(temp_path)
-        
-        result_data = qr_reader.extract_nf_data()
-        
-        # Limpar arquivo temporário
-        os.unlink(temp_path)
-        
-        if result_data:
-            # Mesma lógica do handle_photo
-            await send_nf_summary(update, result_data, context)
-        else:
-            await update.message.reply_text("❌ Não foi possível processar a imagem do documento.")
+        await enqueue_nf_image(update, context, image_bytes, "❌ Não foi possível processar a imagem do documento.")
             
     except Exception as e:
         await update.message.reply_text(f"❌ Erro ao processar o documento: {str(e)}")
 
-async def send_nf_summary(update: Update, result_data: dict, context: ContextTypes.DEFAULT_TYPE) -> None:
+async def enqueue_nf_image(update: Update, context: ContextTypes.DEFAULT_TYPE, image_bytes: bytes, error_message: str) -> None:
+    """Coloca a imagem na fila de notas; o resumo substitui a mensagem de status ao terminar"""
+    
+    async def on_result(job, result_data):
+        if result_data:
+            await send_nf_summary(update, result_data, context, job.status_message)
+        else:
+            await job.status_message.edit_text(error_message)
+    
+    await submit_nf_job(update, image_bytes, on_result)
+
+async def enqueue_nf_album(update: Update, context: ContextTypes.DEFAULT_TYPE, images: list) -> None:
+    """Coloca o álbum na fila como um único job: as notas são lidas em paralelo e resumidas juntas"""
+    
+    async def scan_album(images, progress):
+        done = 0
+        
+        async def scan(image):
+            nonlocal done
+            result_data = await extract_nf_data(image)
+            done += 1
+            await progress(f"📸 {done}/{len(images)} notas lidas...")
+            return result_data
+        
+        # Limitado pelo NF_MAX_CONCURRENCY do pool de workers
+        return await asyncio.gather(*(scan(image) for image in images))
+    
+    async def on_result(job, results):
+        receipts = [result_data for result_data in results if result_data]
+        if receipts:
+            await send_album_summary(update, receipts, len(results), context, job.status_message)
+        else:
+            await job.status_message.edit_text(NF_READ_ERROR)
+    
+    await submit_nf_job(update, images, on_result, scan_album)
+
+# Álbuns (media_group_id) viram um único job na fila
+album_collector = AlbumCollector(enqueue_nf_album)
+
+async def submit_nf_job(update: Update, image, on_result, run_job=None) -> None:
+    """Envia o job para a fila, avisando o usuário quando não há espaço"""
+    try:
+        await nf_queue.submit(update.message, update.effective_user.id, image, on_result, run_job)
+    except QueueFullError:
+        await update.message.reply_text("🚦 Muitas notas sendo processadas agora. Tente novamente em alguns minutos.")
+    except UserLimitError:
+        await update.message.reply_text(
+            f"⏳ Você já tem {nf_queue.max_per_user} notas em processamento. Aguarde a conclusão para enviar outra."
+        )
+
+def nf_total(nf_data: dict) -> Decimal:
+    """Soma dos itens da nota (itens com valor inválido são ignorados)"""
+    total = Decimal(0)
+    for item in nf_data.get('items', {}).values():
+        value = to_decimal(item.get('valor_total'))
+        if value is not None:
+            total += value
+    return total
+
+def category_keyboard(categories: list, prefix: str):
+    """Botões com as categorias (2 por linha), usar nome da loja e cancelar"""
+    keyboard = []
+    for i in range(0, len(categories), 2):
+        row = []
+        if i < len(categories):
+            row.append(InlineKeyboardButton(categories[i], callback_data=f"{prefix}{categories[i]}"))
+        if i + 1 < len(categories):
+            row.append(InlineKeyboardButton(categories[i + 1], callback_data=f"{prefix}{categories[i + 1]}"))
+        keyboard.append(row)
+    
+    # Adicionar botões especiais na última linha
+    keyboard.append([
+        InlineKeyboardButton(f"🏪 Usar nome da loja", callback_data=f"{prefix}loja"),
+        InlineKeyboardButton("❌ Cancelar", callback_data="cancel_nf")
+    ])
+    
+    return InlineKeyboardMarkup(keyboard)
+
+async def send_nf_summary(update: Update, result_data: dict, context: ContextTypes.DEFAULT_TYPE, status_message=None) -> None:
     """Função auxiliar para enviar resumo da nota fiscal com seleção de categoria"""
     shop_info = result_data.get('shop_info', {})
     items = result_data.get('items', {})
     user_id = update.effective_user.id
     
     message = f"🧾 *Nota Fiscal Detectada*\n\n"
+    
+    confirmed_at = await get_confirmation(user_id, result_data.get('access_key'))
+    if confirmed_at:
+        message += f"⚠️ *Esta nota já foi registrada em {confirmed_at.strftime('%d/%m/%Y')}.*\n\n"
+    
     message += f"🏪 *Loja:* {shop_info.get('loja', 'N/A')}\n"
     message += f"📋 *CNPJ:* {shop_info.get('cnpj', 'N/A')}\n\n"
     message += f"🛒 *Itens ({len(items)}):*\n\n"
@@ -123,31 +244,49 @@ async def send_nf_summary(update: Update, result_data: dict, context: ContextTyp
         message += f"  💰 R$ {item.get('valor_total', '0,00')}\n\n"
     
     # Obter categorias do usuário
-    categories = get_user_expense_categories(user_id)
+    categories = await get_user_expense_categories(user_id)
     
     message += f"📂 *Escolha a categoria para estas despesas:*"
     
     context.user_data['nf_data'] = result_data
+    # Resultado chega pela fila, depois do handler: marcar para a persistência gravar
+    context.application.mark_data_for_update_persistence(user_ids=user_id)
     
-    # Criar botões com as categorias (2 por linha)
-    keyboard = []
-    for i in range(0, len(categories), 2):
-        row = []
-        if i < len(categories):
-            row.append(InlineKeyboardButton(categories[i], callback_data=f"nf_cat_{categories[i]}"))
-        if i + 1 < len(categories):
-            row.append(InlineKeyboardButton(categories[i + 1], callback_data=f"nf_cat_{categories[i + 1]}"))
-        keyboard.append(row)
+    reply_markup = category_keyboard(categories, "nf_cat_")
     
-    # Adicionar botões especiais na última linha
-    keyboard.append([
-        InlineKeyboardButton(f"🏪 Usar nome da loja", callback_data="nf_cat_loja"),
-        InlineKeyboardButton("❌ Cancelar", callback_data="cancel_nf")
-    ])
+    if status_message:
+        await status_message.edit_text(message, parse_mode='Markdown', reply_markup=reply_markup)
+    else:
+        await update.message.reply_text(message, parse_mode='Markdown', reply_markup=reply_markup)
+
+async def send_album_summary(update: Update, receipts: list, scanned: int, context: ContextTypes.DEFAULT_TYPE, status_message) -> None:
+    """Resumo único das notas de um álbum, com uma seleção de categoria para todas"""
+    user_id = update.effective_user.id
+    
+    message = f"🧾 *{len(receipts)} Notas Fiscais Detectadas*\n\n"
+    if len(receipts) < scanned:
+        message += f"⚠️ {scanned - len(receipts)} foto(s) não puderam ser lidas.\n\n"
+    
+    total_amount = Decimal(0)
+    for i, result_data in enumerate(receipts, start=1):
+        shop_info = result_data.get('shop_info', {})
+        total = nf_total(result_data)
+        total_amount += total
+        message += f"{i}. 🏪 {shop_info.get('loja', 'N/A')}\n"
+        message += f"   💰 R$ {total:.2f} ({len(result_data.get('items', {}))} itens)\n"
+        confirmed_at = await get_confirmation(user_id, result_data.get('access_key'))
+        if confirmed_at:
+            message += f"   ⚠️ Já registrada em {confirmed_at.strftime('%d/%m/%Y')}\n"
+        message += "\n"
+    
+    message += f"💰 *Total:* R$ {total_amount:.2f}\n\n"
+    message += f"📂 *Escolha a categoria para estas despesas:*"
     
-    reply_markup = InlineKeyboardMarkup(keyboard)
+    context.user_data['nf_batch'] = receipts
+    context.application.mark_data_for_update_persistence(user_ids=user_id)
     
-    await update.message.reply_text(message, parse_mode='Markdown', reply_markup=reply_markup)
+    categories = await get_user_expense_categories(user_id)
+    await status_message.edit_text(message, parse_mode='Markdown', reply_markup=category_keyboard(categories, "nf_batch_cat_"))
 
 async def nf_callback_handler(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     """Handler para callbacks dos botões da nota fiscal"""
@@ -179,14 +318,7 @@ async def nf_callback_handler(update: Update, context: ContextTypes.DEFAULT_TYPE
         shop_info = nf_data.get('shop_info', {})
         shop_name = shop_info.get('loja', 'Desconhecido')
         
-        # Calcular total
-        total_amount = 0
-        for key, item in items.items():
-            try:
-                valor_str = item.get('valor_total', '0').replace(',', '.')
-                total_amount += float(valor_str)
-            except:
-                pass
+        total_amount = nf_total(nf_data)
         
         message = f"📋 *Confirmar Registro*\n\n"
         message += f"🏪 *Loja:* {shop_name}\n"
@@ -205,18 +337,54 @@ async def nf_callback_handler(update: Update, context: ContextTypes.DEFAULT_TYPE
         
         await query.edit_message_text(message, parse_mode='Markdown', reply_markup=reply_markup)
         
+    elif data.startswith("nf_batch_cat_"):
+        receipts = context.user_data.get('nf_batch')
+        if not receipts:
+            await query.edit_message_text("❌ Dados das notas fiscais não encontrados.")
+            return
+        
+        # "loja" usa o nome da loja de cada nota como categoria
+        selected_category = data.replace("nf_batch_cat_", "")
+        context.user_data['selected_category'] = selected_category
+        category_label = "nome da loja de cada nota" if selected_category == "loja" else selected_category
+        
+        message = f"📋 *Confirmar Registro*\n\n"
+        message += f"🧾 *Notas:* {len(receipts)}\n"
+        message += f"📂 *Categoria:* {category_label}\n"
+        message += f"🛒 *Itens:* {sum(len(r.get('items', {})) for r in receipts)}\n"
+        message += f"💰 *Total:* R$ {sum(nf_total(r) for r in receipts):.2f}\n\n"
+        message += f"❓ *Confirmar adição destas despesas?*"
+        
+        keyboard = [
+            [
+                InlineKeyboardButton("✅ Confirmar", callback_data="confirm_nf_batch"),
+                InlineKeyboardButton("❌ Cancelar", callback_data="cancel_nf")
+            ]
+        ]
+        
+        await query.edit_message_text(message, parse_mode='Markdown', reply_markup=InlineKeyboardMarkup(keyboard))
+        
+    elif data == "confirm_nf_batch":
+        await add_nf_album(update, context, context.user_data.get('selected_category'))
+        
     elif data == "confirm_nf_add":
         # Confirmar e adicionar transações
         selected_category = context.user_data.get('selected_category')
         await add_nf_transactions(update, context, selected_category)
         
+    elif data.startswith("nf_job_cancel_"):
+        # Cancela a nota na fila ou em processamento (ignora se já terminou)
+        job_id = int(data.replace("nf_job_cancel_", ""))
+        await nf_queue.cancel(job_id, user_id)
+        
     elif data == "cancel_nf":
         await query.edit_message_text("❌ Operação cancelada.")
         context.user_data.pop('nf_data', None)
+        context.user_data.pop('nf_batch', None)
         context.user_data.pop('selected_category', None)
 
 async def add_nf_transactions(update: Update, context: ContextTypes.DEFAULT_TYPE, category: str) -> None:
-    """Adiciona as transações da nota fiscal com a categoria especificada"""
+    """Registra a nota fiscal como uma única despesa na categoria especificada (itens em /nota)"""
     query = update.callback_query
     user_id = update.effective_user.id
     nf_data = context.user_data.get('nf_data')
@@ -226,35 +394,20 @@ async def add_nf_transactions(update: Update, context: ContextTypes.DEFAULT_TYPE
         shop_info = nf_data.get('shop_info', {})
         shop_name = shop_info.get('loja', 'Desconhecido')
         
-        added_count = 0
-        total_amount = 0
+        # Nota, itens, transação resumo e totais mensais em um único commit
+        result = await add_receipt(user_id, nf_data, category)
         
-        for key, item in items.items():
-            try:
-                # Converter valor de vírgula para ponto
-                valor_str = item.get('valor_total', '0').replace(',', '.')
-                valor = float(valor_str)
-                
-                # Adicionar como despesa
-                await add_transaction(
-                    user_id=user_id,
-                    trans_type="despesa",
-                    amount=valor,
-                    category=category,
-                    description=item.get('descricao', '')
-                )
-                added_count += 1
-                total_amount += valor
-                
-            except Exception as e:
-                print(f"Erro ao adicionar item {key}: {e}")
+        if not result:
+            await query.edit_message_text("❌ Não foi possível registrar a nota fiscal.")
+            return
         
         await query.edit_message_text(
-            f"✅ *{added_count} despesas adicionadas com sucesso!*\n\n"
+            f"✅ *Nota registrada com sucesso!*\n\n"
             f"🏪 Loja: {shop_name}\n"
             f"📂 Categoria: {category}\n"
-            f"💰 Total: R$ {total_amount:.2f}\n"
-            f"📊 Itens processados: {len(items)}"
+            f"💰 Total: R$ {result['total']:.2f}\n"
+            f"📊 Itens processados: {result['items']} de {len(items)}\n\n"
+            f"🔎 Use /nota {result['transaction_id']} para ver os itens"
         )
         
         # Limpar dados do contexto
@@ -263,3 +416,31 @@ async def add_nf_transactions(update: Update, context: ContextTypes.DEFAULT_TYPE
     else:
         await query.edit_message_text("❌ Dados da nota fiscal não encontrados.")
 
+async def add_nf_album(update: Update, context: ContextTypes.DEFAULT_TYPE, category: str) -> None:
+    """Registra todas as notas do álbum (uma despesa por nota) em um único commit"""
+    query = update.callback_query
+    user_id = update.effective_user.id
+    receipts = context.user_data.get('nf_batch')
+    
+    if not receipts:
+        await query.edit_message_text("❌ Dados das notas fiscais não encontrados.")
+        return
+    
+    entries = [
+        (nf_data, nf_data.get('shop_info', {}).get('loja', 'Desconhecido') if category == "loja" else category)
+        for nf_data in receipts
+    ]
+    results = await add_receipts(user_id, entries)
+    
+    if not results:
+        await query.edit_message_text("❌ Não foi possível registrar as notas fiscais.")
+        return
+    
+    message = f"✅ *{len(results)} notas registradas com sucesso!*\n\n"
+    for result in results:
+        message += f"🧾 /nota {result['transaction_id']} - R$ {result['total']:.2f} ({result['items']} itens)\n"
+    message += f"\n💰 Total: R$ {sum(result['total'] for result in results):.2f}"
+    
+    await query.edit_message_text(message)
+    
+    context.user_data.pop('nf_batch', None)
@@ -0,0 +1,125 @@
+"""
+Detecção do QR Code da nota em estágios, do mais barato ao mais caro.
+
+A maioria das fotos é lida no primeiro estágio (tons de cinza, reduzida);
+os seguintes só rodam se os anteriores falharem: escalas maiores, recortes,
+nitidez e binarização. A partir do estágio original a foto inteira é
+decodificada uma única vez e reaproveitada. O tempo de cada estágio
+tentado é registrado.
+"""
+import io
+import time
+from PIL import Image, ImageFilter, ImageOps, ImageStat
+from pyzbar.pyzbar import decode, ZBarSymbol
+
+FAST_MAX_SIDE = 1024
+MEDIUM_MAX_SIDE = 2048
+SMALL_IMAGE_SIDE = 800
+
+
+def open_gray(image, max_side: int = None):
+    """Abre a imagem em tons de cinza; com max_side, JPEGs são decodificados já reduzidos (draft)"""
+    if isinstance(image, (bytes, bytearray)):
+        image = io.BytesIO(image)
+    elif hasattr(image, 'seek'):
+        image.seek(0)
+    img = Image.open(image)
+    if max_side:
+        img.draft('L', (max_side, max_side))
+    img = img.convert('L')
+    return scaled(img, max_side) if max_side else img
+
+
+def scaled(gray, max_side: int):
+    if max(gray.size) <= max_side:
+        return gray
+    img = gray.copy()
+    img.thumbnail((max_side, max_side), Image.Resampling.BILINEAR)
+    return img
+
+
+def crops(gray):
+    """Centro e metades com sobreposição, para QR Codes pequenos em fotos grandes"""
+    w, h = gray.size
+    boxes = [
+        (w // 5, h // 5, w * 4 // 5, h * 4 // 5),
+        (0, 0, w, h * 11 // 20), (0, h * 9 // 20, w, h),
+        (0, 0, w * 11 // 20, h), (w * 9 // 20, 0, w, h),
+    ]
+    return [gray.crop(box) for box in boxes]
+
+
+def sharpened(gray):
+    return ImageOps.autocontrast(gray).filter(ImageFilter.UnsharpMask(radius=2, percent=160, threshold=2))
+
+
+def binarized(gray):
+    contrasted = ImageOps.autocontrast(gray, cutoff=2)
+    threshold = ImageStat.Stat(contrasted).mean[0]
+    return contrasted.point(lambda p: 255 if p > threshold else 0)
+
+
+def upscaled(gray):
+    w, h = gray.size
+    return gray.resize((w * 2, h * 2), Image.Resampling.LANCZOS)
+
+
+def candidates(image, stage: str, full=None):
+    """Imagens a testar em cada estágio; full é a imagem inteira já em tons de cinza"""
+    if stage == 'reduzida':
+        return [open_gray(image, FAST_MAX_SIDE)]
+    if stage == 'media':
+        return [open_gray(image, MEDIUM_MAX_SIDE)]
+    if full is None:
+        full = open_gray(image)
+    if stage == 'original':
+        return [full]
+    if stage == 'recortes':
+        return crops(full)
+    if stage == 'nitidez':
+        return [sharpened(scaled(full, MEDIUM_MAX_SIDE))]
+    if stage == 'binarizada':
+        images = [binarized(scaled(full, MEDIUM_MAX_SIDE))]
+        if max(full.size) < SMALL_IMAGE_SIDE:
+            images.append(binarized(upscaled(full)))
+        return images
+    return []
+
+
+STAGES = ['reduzida', 'media', 'original', 'recortes', 'nitidez', 'binarizada']
+
+
+def read_qr(gray):
+    result = decode(gray, symbols=[ZBarSymbol.QRCODE])
+    return result[0].data.decode('utf-8') if result else None
+
+
+def detect_qrcode(image):
+    """
+    Procura o QR Code em estágios e retorna
+    {'url': str|None, 'stage': str|None, 'timings': {estágio: ms}}.
+    """
+    timings = {}
+    tried_sizes = set()
+    full = None
+
+    for stage in STAGES:
+        start = time.perf_counter()
+        url = None
+        # A imagem inteira é decodificada uma vez e compartilhada pelos estágios seguintes
+        if full is None and stage not in ('reduzida', 'media'):
+            full = open_gray(image)
+        for gray in candidates(image, stage, full):
+            # Pula escalas idênticas a uma já tentada (imagens pequenas)
+            if stage in ('reduzida', 'media', 'original'):
+                if gray.size in tried_sizes:
+                    continue
+                tried_sizes.add(gray.size)
+            url = read_qr(gray)
+            if url:
+                break
+        timings[stage] = round((time.perf_counter() - start) * 1000, 1)
+        if url:
+            return {'url': url, 'stage': stage, 'timings': timings}
+
+    return {'url': None, 'stage': None, 'timings': timings}
@@ -0,0 +1,252 @@
+"""
+Fila de saída das mensagens do bot, dentro dos limites do Telegram.
+
+Todo envio/edição para um chat passa por dois baldes de tokens: um global
+(RATE_LIMIT_GLOBAL mensagens/s) e um por chat (RATE_LIMIT_CHAT mensagens/s
+em conversas privadas, RATE_LIMIT_GROUP_PER_MINUTE em grupos, com rajadas
+de até RATE_LIMIT_BURST). Quando não há token, a requisição espera na fila
+em vez de levar 429 do Telegram.
+
+Há duas filas de prioridade: respostas interativas (padrão) saem antes das
+mensagens de andamento em massa (rate_limit_args=BULK, ex.: posição na fila
+de notas). Mensagens de um mesmo chat saem na ordem em que foram pedidas,
+em qualquer fila: um pedido só é liberado depois que o anterior do mesmo
+chat terminou, então uma resposta interativa espera a edição em massa
+pedida antes dela (e não é sobrescrita por ela).
+Se mesmo assim vier um RetryAfter, os envios são pausados pelo tempo pedido
+e a requisição volta para o início da fila (até RATE_LIMIT_MAX_RETRIES).
+
+Requisições sem chat_id (answerCallbackQuery, getUpdates...) não passam
+pela fila.
+"""
+import asyncio
+import itertools
+import os
+import time
+from collections import deque
+from datetime import timedelta
+from telegram.error import RetryAfter
+from telegram.ext import BaseRateLimiter
+
+INTERACTIVE = 0
+BULK = 1
+LANES = {INTERACTIVE: 'interactive', BULK: 'bulk'}
+
+
+class TokenBucket:
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate                    # tokens por segundo
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+
+    def _refill(self, now: float):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def delay(self, now: float) -> float:
+        """Segundos até haver um token (0 se já há)"""
+        self._refill(now)
+        return 0.0 if self.tokens >= 1 else (1 - self.tokens) / self.rate
+
+    def take(self, now: float):
+        self._refill(now)
+        self.tokens -= 1
+
+    def full(self, now: float) -> bool:
+        self._refill(now)
+        return self.tokens >= self.capacity
+
+
+class OutboundRateLimiter(BaseRateLimiter):
+    def __init__(self):
+        # O limite global é do token, não do processo: com vários workers
+        # (BOT_WORKERS) cada um usa a sua fração
+        self.global_rate = float(os.getenv('RATE_LIMIT_GLOBAL', '30')) / max(1, int(os.getenv('BOT_WORKERS', '1')))
+        self.chat_rate = float(os.getenv('RATE_LIMIT_CHAT', '1'))
+        self.group_rate = float(os.getenv('RATE_LIMIT_GROUP_PER_MINUTE', '20')) / 60
+        self.burst = float(os.getenv('RATE_LIMIT_BURST', '3'))
+        self.max_retries = int(os.getenv('RATE_LIMIT_MAX_RETRIES', '3'))
+        self.warn_depth = int(os.getenv('RATE_LIMIT_WARN_DEPTH', '100'))
+        self.max_chat_buckets = 10000
+
+        self._global = TokenBucket(self.global_rate, self.burst)
+        self._chats = {}
+        self._lanes = {lane: deque() for lane in LANES}
+        self._seq = itertools.count()
+        self._chat_order = {}               # chat_id -> deque de pedidos pendentes/em envio, em ordem
+        self._paused_until = 0.0
+        self._wakeup = None
+        self._task = None
+        self._closing = False
+        self._warned = False
+
+        # Métricas
+        self.sent = 0
+        self.retries = 0
+        self.max_depth = 0
+        self._wait_total = 0.0
+
+    async def initialize(self) -> None:
+        if self._task is None:
+            self._closing = False
+            self._wakeup = asyncio.Event()
+            self._task = asyncio.create_task(self._dispatch())
+
+    async def shutdown(self) -> None:
+        if self._task is not None:
+            # O wait_for pode engolir o cancelamento se o evento disparar junto;
+            # a flag garante que o dispatcher sai
+            self._closing = True
+            self._wakeup.set()
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        for queue in self._lanes.values():
+            for _, _, future, _ in queue:
+                if not future.done():
+                    future.cancel()
+            queue.clear()
+
+    def metrics(self) -> dict:
+        depth = {name: len(self._lanes[lane]) for lane, name in LANES.items()}
+        return {
+            'queued': depth,
+            'max_queued': self.max_depth,
+            'sent': self.sent,
+            'retries': self.retries,
+            'avg_wait_ms': round(self._wait_total / self.sent * 1000, 1) if self.sent else 0.0,
+            'paused_for': round(max(0.0, self._paused_until - time.monotonic()), 1),
+        }
+
+    async def process_request(self, callback, args, kwargs, endpoint, data, rate_limit_args):
+        chat_id = data.get('chat_id')
+        if chat_id is None:
+            return await callback(*args, **kwargs)
+
+        try:
+            chat_id = int(chat_id)
+        except (TypeError, ValueError):
+            pass
+        lane = BULK if rate_limit_args == BULK else INTERACTIVE
+        seq = next(self._seq)
+        self._chat_order.setdefault(chat_id, deque()).append(seq)
+
+        try:
+            for attempt in range(self.max_retries + 1):
+                await self._wait_turn(lane, chat_id, seq, retry=attempt > 0)
+                try:
+                    return await callback(*args, **kwargs)
+                except RetryAfter as e:
+                    self.retries += 1
+                    delay = e.retry_after
+                    if isinstance(delay, timedelta):
+                        delay = delay.total_seconds()
+                    if attempt == self.max_retries:
+                        print(f"Limite do Telegram em {endpoint} após {self.max_retries} tentativas")
+                        raise
+                    # Pausa todos os envios: o Telegram não diz se o limite é do chat ou global
+                    self._paused_until = max(self._paused_until, time.monotonic() + delay + 0.1)
+                    print(f"⚠️ Limite do Telegram em {endpoint}; aguardando {delay:.0f}s")
+        finally:
+            # Libera o próximo pedido do chat (também se este foi cancelado na fila)
+            order = self._chat_order[chat_id]
+            order.remove(seq)
+            if not order:
+                del self._chat_order[chat_id]
+            if self._wakeup is not None:
+                self._wakeup.set()
+
+    async def _wait_turn(self, lane: int, chat_id, seq: int, retry: bool = False):
+        await self.initialize()
+        future = asyncio.get_running_loop().create_future()
+        request = (chat_id, seq, future, time.monotonic())
+        queue = self._lanes[lane]
+        if retry:
+            queue.appendleft(request)
+        else:
+            queue.append(request)
+        self._track_depth()
+        self._wakeup.set()
+        await future
+
+    def _track_depth(self):
+        depth = sum(len(queue) for queue in self._lanes.values())
+        self.max_depth = max(self.max_depth, depth)
+        if depth >= self.warn_depth and not self._warned:
+            self._warned = True
+            print(f"⚠️ Fila de saída com {depth} mensagens: {self.metrics()['queued']}")
+        elif depth < self.warn_depth // 2:
+            self._warned = False
+
+    def _chat_bucket(self, chat_id) -> TokenBucket:
+        bucket = self._chats.get(chat_id)
+        if bucket is None:
+            # Chats com id negativo (ou @canal) são grupos/canais
+            is_group = isinstance(chat_id, str) or chat_id < 0
+            bucket = TokenBucket(self.group_rate if is_group else self.chat_rate, self.burst)
+            self._chats[chat_id] = bucket
+        return bucket
+
+    def _grant(self, now: float):
+        """Libera o que os baldes permitem; retorna segundos até a próxima tentativa ou None sem fila"""
+        if not any(self._lanes.values()):
+            return None
+        if now < self._paused_until:
+            return self._paused_until - now
+
+        next_wait = None
+        blocked = set()                     # chats cujo próximo pedido ainda não pode sair
+        for lane in LANES:
+            queue = self._lanes[lane]
+            remaining = deque()
+            while queue:
+                request = queue.popleft()
+                chat_id, seq, future, queued_at = request
+                if future.done():           # handler cancelado enquanto esperava
+                    continue
+
+                global_wait = self._global.delay(now)
+                if global_wait > 0:
+                    queue.appendleft(request)
+                    queue.extendleft(reversed(remaining))
+                    return global_wait if next_wait is None else min(global_wait, next_wait)
+
+                if chat_id in blocked:
+                    remaining.append(request)
+                    continue
+                if self._chat_order[chat_id][0] != seq:
+                    # Um pedido anterior do chat (talvez na outra fila, ainda por liberar nesta
+                    # passada) não terminou; quando terminar, o dispatcher é acordado
+                    remaining.append(request)
+                    continue
+                bucket = self._chat_bucket(chat_id)
+                chat_wait = bucket.delay(now)
+                if chat_wait > 0:
+                    blocked.add(chat_id)
+                    next_wait = chat_wait if next_wait is None else min(chat_wait, next_wait)
+                    remaining.append(request)
+                    continue
+
+                self._global.take(now)
+                bucket.take(now)
+                self.sent += 1
+                self._wait_total += now - queued_at
+                future.set_result(None)
+            self._lanes[lane] = remaining
+
+        if len(self._chats) > self.max_chat_buckets:
+            self._chats = {chat_id: bucket for chat_id, bucket in self._chats.items() if not bucket.full(now)}
+        return next_wait
+
+    async def _dispatch(self):
+        while not self._closing:
+            self._wakeup.clear()
+            wait = self._grant(time.monotonic())
+            try:
+                if wait is None:
+                    await self._wakeup.wait()
+                else:
+                    await asyncio.wait_for(self._wakeup.wait(), wait)
+            except asyncio.TimeoutError:
+                pass
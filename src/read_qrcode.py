@@ -1,120 +1,202 @@
-from pyzbar.pyzbar import decode
-from PIL import Image
-import os
-from selenium import webdriver
-from selenium.webdriver.chrome.options import Options
-from selenium.webdriver.common.by import By
-from selenium.webdriver.support.ui import WebDriverWait
-from selenium.webdriver.support import expected_conditions as EC
-from bs4 import BeautifulSoup
-import pandas as pd
 import os
+import copy
+from dataclasses import dataclass
 from dotenv import load_dotenv
+from webdriver_pool import WebDriverPool
+from nf_fetcher import NfHttpFetcher
+from nf_cache import ReceiptCache, extract_access_key
+from nf_workers import NfWorkerPool, grid_sessions
+from nf_parser import parse_nf_page
+import asyncio
 
 # Carregar variáveis de ambiente
 load_dotenv()
 
+
+# Etapas CPU-bound no nível do módulo para poderem rodar em ProcessPoolExecutor
+
+def detect_qrcode(image):
+    """Localiza e lê o QR Code; o pyzbar (e a libzbar) só é carregado aqui, no executor de CPU"""
+    from qr_detection import detect_qrcode as detect
+    return detect(image)
+
+
+def decode_qrcode(image):
+    """Lê o QR Code da imagem (bytes ou caminho) e retorna a URL da consulta, ou None"""
+    return detect_qrcode(image)['url']
+
+
+def parse_nf_html(html):
+    """Converte o HTML da consulta da NFC-e nos dados da nota (uma passada por linha de item)"""
+    return parse_nf_page(html)
+
+
+@dataclass(frozen=True)
+class NfReaderConfig:
+    """Configuração imutável do leitor, compartilhada por todas as requisições"""
+    user_agent: str = 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/58.0.3029.110 Safari/537.3'
+    selenium_remote_url: str = 'http://selenium:4444'
+    page_timeout: float = 10
+    driver_pool_size: int = 5
+    driver_max_uses: int = 50
+    driver_max_idle: float = 240
+
+    @classmethod
+    def from_env(cls):
+        return cls(
+            selenium_remote_url=os.getenv('SELENIUM_REMOTE_URL', 'http://selenium:4444'),
+            page_timeout=float(os.getenv('NF_PAGE_TIMEOUT', '10')),
+            driver_pool_size=grid_sessions(),
+            driver_max_uses=int(os.getenv('NF_DRIVER_MAX_USES', '50')),
+            driver_max_idle=float(os.getenv('NF_DRIVER_MAX_IDLE', '240'))
+        )
+
+
 class ReadQrcode:
-    def __init__(self):
-        self.image_folder = "images"
-        self.image_name = "4929540085854702461.jpg"
-        self.user_agent = 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/58.0.3029.110 Safari/537.3'
+    """
+    Leitor de notas fiscais sem estado por requisição.
+
+    A imagem e as opções são passadas a cada chamada; a instância guarda
+    apenas a configuração imutável e recursos compartilhados e seguros para
+    uso concorrente (pool do Selenium, cliente HTTP, cache e workers), então
+    uma única instância atende várias notas em paralelo.
+    """
+
+    def __init__(self, config: NfReaderConfig = None):
+        self.config = config or NfReaderConfig.from_env()
+        # Sessões do Chrome reaproveitadas entre notas (a parte deste worker no SE_NODE_MAX_SESSIONS do grid)
+        self.driver_pool = WebDriverPool(
+            self.create_driver,
+            size=self.config.driver_pool_size,
+            max_uses=self.config.driver_max_uses,
+            max_idle=self.config.driver_max_idle
+        )
+        # Caminho rápido: GET direto na página da SEFAZ, sem navegador
+        self.http_fetcher = NfHttpFetcher(self.config.user_agent)
+        # Notas já consultadas, pela chave de acesso
+        self.cache = ReceiptCache()
+        # Decodificação/parsing em processos e Selenium em threads, fora do event loop
+        self.workers = NfWorkerPool()
     
-    def read_qrcode(self, image_path):
-        result = decode(Image.open(os.path.join(self.image_folder, self.image_name)))
-        url = result[0].data.decode('utf-8')
-        #URL teste
-        #url2 = 'file:///C:/Users/Fabio/Documents/github/chatbot-telegram/DOCUMENTO%20AUXILIAR%20DA%20NOTA%20FISCAL%20DE%20CONSUMIDOR%20ELETR%C3%94NICA.html'
-        return url
-
-    def extract_nf_data(self, image_path):
-        """Método principal para extrair dados da NF"""
-        driver = None
+    def read_qrcode(self, image):
+        """Lê o QR Code da imagem (bytes ou caminho) informada nesta chamada"""
+        return decode_qrcode(image)
+
+    def create_driver(self):
+        """Cria uma nova sessão do Chrome (remota, com fallback local)"""
+        # Selenium só é carregado quando a consulta precisa de navegador
+        from selenium import webdriver
+        from selenium.webdriver.chrome.options import Options
+
+        # Configurar opções para o Chrome remoto
+        options = Options()
+        options.add_argument('--disable-blink-features=AutomationControlled')
+        options.add_argument('--user-agent=' + self.config.user_agent)
+        options.add_argument('--no-sandbox')
+        options.add_argument('--disable-gpu')
+        options.add_argument('--disable-setuid-sandbox')
+        options.add_argument('--disable-web-security')
+        options.add_argument('--disable-dev-shm-usage')
+        options.add_argument('--memory-pressure-off')
+        options.add_argument('--ignore-certificate-errors')
+        options.add_argument('--disable-features=site-per-process')
+        options.add_argument('--incognito')
+        options.add_argument('--headless')
+        options.add_argument('--disable-features=IsolateOrigins')
+
         try:
-            url = self.read_qrcode(image_path)
+            # Conectar ao Selenium remoto
+            return webdriver.Remote(
+                command_executor=self.config.selenium_remote_url,
+                options=options
+            )
+        except:
+            return webdriver.Chrome(options=options)
 
-            if not url:
-                print("Não foi possível ler o QR Code")
-                return None
+    def fetch_with_selenium(self, url):
+        """Carrega a página no Chrome (para consultas que dependem de JavaScript)"""
+        from selenium.webdriver.common.by import By
+        from selenium.webdriver.support.ui import WebDriverWait
+        from selenium.webdriver.support import expected_conditions as EC
 
-            # Obter URL do Selenium remoto das variáveis de ambiente
-            selenium_remote_url = os.getenv('SELENIUM_REMOTE_URL', 'http://selenium:4444')
-            
-            # Configurar opções para o Chrome remoto
-            options = Options()
-            options.add_argument('--disable-blink-features=AutomationControlled')
-            options.add_argument('--user-agent=' + self.user_agent)
-            options.add_argument('--no-sandbox')
-            options.add_argument('--disable-gpu')
-            options.add_argument('--disable-setuid-sandbox')
-            options.add_argument('--disable-web-security')
-            options.add_argument('--disable-dev-shm-usage')
-            options.add_argument('--memory-pressure-off')
-            options.add_argument('--ignore-certificate-errors')
-            options.add_argument('--disable-features=site-per-process')
-            options.add_argument('--incognito')
-            options.add_argument('--headless')
-            options.add_argument('--disable-features=IsolateOrigins')
-
-            
-            try:
-                # Conectar ao Selenium remoto
-                driver = webdriver.Remote(
-                    command_executor=selenium_remote_url,
-                    options=options
-                )
-            except:
-                driver = webdriver.Chrome(options=options)
-            
+        with self.driver_pool.lease() as driver:
             driver.get(url)
 
-            WebDriverWait(driver, 10).until(
+            WebDriverWait(driver, self.config.page_timeout).until(
                 EC.presence_of_element_located((By.ID, "tabResult"))
             )
-            html = driver.page_source
-            soup = BeautifulSoup(html, "html.parser")
+            return driver.page_source
 
-            return self.extract_data_from_soup(soup)
+    def parse_nf_html(self, html):
+        return parse_nf_html(html)
+
+    def extract_nf_data(self, image):
+        """Extrai os dados da NF de forma síncrona (scripts); o bot usa extract_nf_data_async"""
+        try:
+            url = self.read_qrcode(image)
+
+            if not url:
+                print("Não foi possível ler o QR Code")
+                return None
+
+            html = self.fetch_with_selenium(url)
+
+            return self.parse_nf_html(html)
 
         except Exception as e:
             print(f"Erro ao extrair dados da NF: {str(e)}")
             return None
-        finally:
-            if driver:
-                driver.quit()
-
-    def extract_data_from_soup(self, soup):
-        """Método para extrair dados da NF a partir do BeautifulSoup"""
-        #Shop info
-        header = soup.find('div', {'class': 'txtCenter'})
-        divs = header.find_all('div')
-        
-        #Items
-        items = {}
-
-        span_descricao = [i.text.strip() for i in soup.find_all('span', {'class': 'txtTit'}) if i.text.strip()]
-        span_codigo = [i.text.split(':')[1].split(')')[0].strip() for i in soup.find_all('span', {'class': 'RCod'}) if i.text.strip()]
-        span_quantidade = [i.text.strip().split(':')[1].strip() for i in soup.find_all('span', {'class': 'Rqtd'}) if i.text.strip()]
-        span_unidade = [i.text.split(':')[1].strip() for i in soup.find_all('span', {'class': 'RUN'}) if i.text.strip()]
-        span_valor_unitario = [i.text.strip().split(':')[1].strip() for i in soup.find_all('span', {'class': 'RvlUnit'}) if i.text.strip()]
-        span_valor_total = [i.text.strip() for i in soup.find_all('span', {'class': 'valor'}) if i.text.strip()]
-
-        for i in range(len(span_descricao)):
-            items[str(i)] = {
-                'descricao': span_descricao[i] if i < len(span_descricao) else '',
-                'codigo': span_codigo[i] if i < len(span_codigo) else '',
-                'quantidade': span_quantidade[i] if i < len(span_quantidade) else '',
-                'unidade': span_unidade[i] if i < len(span_unidade) else '',
-                'valor_unitario': span_valor_unitario[i] if i < len(span_valor_unitario) else '',
-                'valor_total': span_valor_total[i] if i < len(span_valor_total) else '',
-            }
-
-        return {
-            'shop_info': {
-                "loja": divs[0].text.strip(),
-                "cnpj": divs[1].text.strip().split(':')[1].strip(),
-                "endereco": divs[2].text.strip().replace('\n', '').replace('\t', ''),
-            },
-            'items': items
-        }
-    
\ No newline at end of file
+
+    async def extract_nf_data_async(self, image, progress=None, use_cache: bool = True, allow_browser: bool = True):
+        """
+        Extrai os dados da NF (imagem em bytes ou caminho) no pool de workers, com limite de concorrência e timeout.
+
+        Opções por chamada:
+        - progress: corrotina chamada com o texto de cada etapa
+        - use_cache: consultar/gravar o cache pela chave de acesso
+        - allow_browser: permitir o fallback com Selenium
+        """
+        try:
+            return await self.workers.run_job(self._extract_nf_data_job(image, progress, use_cache, allow_browser))
+        except asyncio.TimeoutError:
+            print(f"Tempo esgotado ao processar a NF ({self.workers.job_timeout:.0f}s)")
+            return None
+        except Exception as e:
+            print(f"Erro ao extrair dados da NF: {str(e)}")
+            return None
+
+    async def _extract_nf_data_job(self, image, progress, use_cache, allow_browser):
+        """Tenta primeiro o cache, depois HTTP direto e só então o Selenium"""
+        detection = await self.workers.run_cpu(detect_qrcode, image)
+        url = detection['url']
+        timings = ', '.join(f"{stage} {ms:.0f}ms" for stage, ms in detection['timings'].items())
+
+        if not url:
+            print(f"Não foi possível ler o QR Code ({timings})")
+            return None
+        print(f"QR Code lido no estágio '{detection['stage']}' ({timings})")
+
+        access_key = extract_access_key(url)
+        if use_cache:
+            cached = await self.cache.get(access_key)
+            if cached:
+                # Cópia: o resultado de uma requisição nunca é compartilhado com outra
+                return copy.deepcopy(cached)
+
+        if progress:
+            await progress("🌐 QR Code lido! Consultando a nota na SEFAZ...")
+        html = await self.http_fetcher.fetch(url)
+        if html is None:
+            # Página sem #tabResult: precisa renderizar JavaScript
+            if not allow_browser:
+                print("Consulta da NF exige navegador, mas o fallback está desativado")
+                return None
+            if progress:
+                await progress("🌐 Carregando a consulta no navegador...")
+            html = await self.workers.run_io(self.fetch_with_selenium, url)
+
+        result_data = await self.workers.run_cpu(parse_nf_html, html)
+        result_data['access_key'] = access_key
+        if use_cache:
+            await self.cache.set(access_key, copy.deepcopy(result_data))
+        return result_data
@@ -0,0 +1,272 @@
+"""
+Persistência do context.user_data (fluxo das notas) na tabela user_state.
+
+- Carregamento sob demanda: nada é lido na inicialização; os dados de um
+  usuário são carregados do banco na primeira atualização dele
+  (refresh_user_data, chamado pela Application antes dos handlers).
+- TTL por chave: cada chave expira STATE_TTL segundos após a última
+  escrita (NF_STATE_TTL para nf_data/nf_batch/selected_category), tanto
+  na memória quanto no banco. Fluxos abandonados não ficam para sempre.
+- Limite de memória: no máximo STATE_MAX_USERS usuários ficam em memória;
+  o menos recente é gravado e descartado (LRU) e recarregado se voltar.
+- Escritas agrupadas: a Application entrega os usuários alterados a cada
+  STATE_FLUSH_INTERVAL segundos; só as chaves que mudaram são gravadas,
+  todas em uma única transação.
+
+Os valores são gravados em JSON; chaves com valores não serializáveis
+ficam só em memória.
+"""
+import asyncio
+import json
+import os
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from sqlalchemy import select, delete, insert, tuple_
+from telegram.ext import BasePersistence, PersistenceInput
+from tools.database import get_async_session, UserState
+
+NF_STATE_KEYS = ('nf_data', 'nf_batch', 'selected_category')
+SWEEP_INTERVAL = timedelta(minutes=5)
+
+
+class LoadedUser:
+    def __init__(self, user_data: dict):
+        self.user_data = user_data          # o mesmo dict de context.user_data
+        self.values = {}                    # chave -> JSON gravado
+        self.written_at = {}                # chave -> datetime da última escrita
+
+
+class UserStatePersistence(BasePersistence):
+    def __init__(self):
+        super().__init__(
+            store_data=PersistenceInput(bot_data=False, chat_data=False, user_data=True, callback_data=False),
+            update_interval=float(os.getenv('STATE_FLUSH_INTERVAL', '10'))
+        )
+        self.default_ttl = timedelta(seconds=int(os.getenv('STATE_TTL', str(7 * 86400))))
+        nf_ttl = timedelta(seconds=int(os.getenv('NF_STATE_TTL', '86400')))
+        self.key_ttls = {key: nf_ttl for key in NF_STATE_KEYS}
+        self.max_users = int(os.getenv('STATE_MAX_USERS', '1000'))
+
+        self.application = None
+        self._users = OrderedDict()         # user_id -> LoadedUser (LRU)
+        # user_id -> descartes da memória (LRU) cujo drop_user_data adiado ainda não chegou
+        self._evicted = {}
+        self._dirty = {}                    # user_id -> {chave: JSON ou None (apagar)}
+        self._write_lock = asyncio.Lock()
+        self._swept_at = datetime.min
+
+    def attach(self, application):
+        """Necessário para descartar da memória os usuários menos recentes"""
+        self.application = application
+
+    def ttl(self, key: str) -> timedelta:
+        return self.key_ttls.get(key, self.default_ttl)
+
+    # Carregamento sob demanda, expiração e LRU
+
+    async def refresh_user_data(self, user_id: int, user_data: dict) -> None:
+        now = datetime.utcnow()
+        loaded = self._users.get(user_id)
+        if loaded is None or loaded.user_data is not user_data:
+            loaded = await self._load(user_id, user_data, now)
+            self._users[user_id] = loaded
+        self._users.move_to_end(user_id)
+
+        for key, written_at in list(loaded.written_at.items()):
+            if now - written_at > self.ttl(key):
+                user_data.pop(key, None)
+                self._forget(user_id, loaded, key)
+
+        self._evict(keep=user_id)
+
+    async def _load(self, user_id: int, user_data: dict, now: datetime) -> LoadedUser:
+        loaded = LoadedUser(user_data)
+        # Com o lock, uma gravação em andamento termina antes da leitura e o que
+        # ainda não foi gravado está em self._dirty
+        async with self._write_lock:
+            session = get_async_session()
+            try:
+                rows = (await session.execute(
+                    select(UserState.key, UserState.value, UserState.updated_at)
+                    .where(UserState.user_id == user_id, UserState.expires_at > now)
+                )).all()
+            except Exception as e:
+                print(f"Erro ao carregar estado do usuário {user_id}: {e}")
+                rows = []
+            finally:
+                await session.close()
+            # Alterações ainda não gravadas (ex.: usuário descartado pelo LRU e que voltou
+            # antes da próxima gravação) são mais novas que o banco
+            pending = dict(self._dirty.get(user_id, {}))
+
+        values = {key: (value, updated_at) for key, value, updated_at in rows}
+        for key, value in pending.items():
+            if value is None:
+                values.pop(key, None)
+            else:
+                values[key] = (value, now)
+
+        for key, (value, written_at) in values.items():
+            # O que já está em memória é mais novo que o banco
+            if key not in user_data:
+                user_data[key] = json.loads(value)
+            loaded.values[key] = value
+            loaded.written_at[key] = written_at
+        return loaded
+
+    def _evict(self, keep: int):
+        if self.application is None:
+            return
+        while len(self._users) > self.max_users:
+            user_id, loaded = next(iter(self._users.items()))
+            if user_id == keep:
+                break
+            del self._users[user_id]
+            # Marca o estado atual para gravação antes de soltar a memória; o
+            # drop_user_data adiado da Application não apaga do banco (ver abaixo)
+            self._track(user_id, loaded, loaded.user_data)
+            self._evicted[user_id] = self._evicted.get(user_id, 0) + 1
+            self.application.drop_user_data(user_id)
+
+    def _forget(self, user_id: int, loaded: LoadedUser, key: str):
+        loaded.values.pop(key, None)
+        loaded.written_at.pop(key, None)
+        self._dirty.setdefault(user_id, {})[key] = None
+
+    # Escritas agrupadas
+
+    def _track(self, user_id: int, loaded: LoadedUser, data: dict):
+        """Marca para gravação só as chaves novas, alteradas ou removidas"""
+        now = datetime.utcnow()
+        for key, value in data.items():
+            try:
+                encoded = json.dumps(value, ensure_ascii=False, sort_keys=True)
+            except (TypeError, ValueError):
+                continue
+            if loaded.values.get(key) != encoded:
+                loaded.values[key] = encoded
+                loaded.written_at[key] = now
+                self._dirty.setdefault(user_id, {})[key] = encoded
+        for key in [key for key in loaded.values if key not in data]:
+            self._forget(user_id, loaded, key)
+
+    async def update_user_data(self, user_id: int, data: dict) -> None:
+        loaded = self._users.get(user_id)
+        if loaded is None:
+            # Usuário fora da memória (ex.: descartado pelo LRU): grava tudo o que veio
+            loaded = LoadedUser(data)
+        self._track(user_id, loaded, data)
+        # A Application chama update_user_data para vários usuários em paralelo;
+        # quem pegar o lock grava todos os pendentes
+        await asyncio.sleep(0)
+        await self._write()
+
+    async def _write(self, sweep: bool = False):
+        async with self._write_lock:
+            now = datetime.utcnow()
+            sweep = sweep or now - self._swept_at > SWEEP_INTERVAL
+            if not self._dirty and not sweep:
+                return
+            dirty, self._dirty = self._dirty, {}
+
+            rows = [
+                {'user_id': user_id, 'key': key, 'value': value, 'updated_at': now, 'expires_at': now + self.ttl(key)}
+                for user_id, keys in dirty.items() for key, value in keys.items() if value is not None
+            ]
+            session = get_async_session()
+            try:
+                if dirty:
+                    await session.execute(delete(UserState).where(
+                        tuple_(UserState.user_id, UserState.key).in_(
+                            [(user_id, key) for user_id, keys in dirty.items() for key in keys]
+                        )
+                    ))
+                if rows:
+                    await session.execute(insert(UserState), rows)
+                if sweep:
+                    # Estado expirado de usuários que não voltaram
+                    await session.execute(delete(UserState).where(UserState.expires_at <= now))
+                    self._swept_at = now
+                await session.commit()
+            except Exception as e:
+                await session.rollback()
+                print(f"Erro ao gravar estado dos usuários: {e}")
+                # Tenta de novo na próxima rodada, sem sobrescrever alterações mais novas
+                for user_id, keys in dirty.items():
+                    for key, value in keys.items():
+                        self._dirty.setdefault(user_id, {}).setdefault(key, value)
+            finally:
+                await session.close()
+
+    async def drop_user_data(self, user_id: int) -> None:
+        if self._evicted.get(user_id):
+            # Descartado só da memória (LRU): mantém no banco. A Application chama isto só
+            # na rodada seguinte, quando o usuário pode já ter voltado
+            self._evicted[user_id] -= 1
+            if not self._evicted[user_id]:
+                del self._evicted[user_id]
+            loaded = self._users.get(user_id)
+            if loaded is not None:
+                # Nesta rodada a Application não entrega o user_data de quem está sendo descartado
+                self._track(user_id, loaded, loaded.user_data)
+            await self._write()
+            return
+        loaded = self._users.pop(user_id, None)
+        if loaded is not None:
+            for key in list(loaded.values):
+                self._forget(user_id, loaded, key)
+        session = get_async_session()
+        try:
+            await session.execute(delete(UserState).where(UserState.user_id == user_id))
+            await session.commit()
+        except Exception as e:
+            await session.rollback()
+            print(f"Erro ao apagar estado do usuário {user_id}: {e}")
+        finally:
+            await session.close()
+        self._dirty.pop(user_id, None)
+
+    async def flush(self) -> None:
+        # Usuários ainda em memória: grava o que mudou desde a última rodada
+        for user_id, loaded in self._users.items():
+            self._track(user_id, loaded, loaded.user_data)
+        await self._write(sweep=True)
+
+    async def get_user_data(self) -> dict:
+        # Nada na inicialização: cada usuário é carregado na primeira atualização
+        return {}
+
+    # Só user_data é persistido
+
+    async def get_chat_data(self) -> dict:
+        return {}
+
+    async def get_bot_data(self) -> dict:
+        return {}
+
+    async def get_callback_data(self):
+        return None
+
+    async def get_conversations(self, name: str) -> dict:
+        return {}
+
+    async def update_conversation(self, name: str, key, new_state) -> None:
+        pass
+
+    async def update_chat_data(self, chat_id: int, data: dict) -> None:
+        pass
+
+    async def update_bot_data(self, data: dict) -> None:
+        pass
+
+    async def update_callback_data(self, data) -> None:
+        pass
+
+    async def drop_chat_data(self, chat_id: int) -> None:
+        pass
+
+    async def refresh_chat_data(self, chat_id: int, chat_data: dict) -> None:
+        pass
+
+    async def refresh_bot_data(self, bot_data: dict) -> None:
+        pass
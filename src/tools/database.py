@@ -1,11 +1,107 @@
-from sqlalchemy import create_engine, Column, Integer, String, Date, DateTime, DECIMAL, Enum
+from sqlalchemy import create_engine, event, Column, Integer, BigInteger, String, Text, Date, DateTime, DECIMAL, Enum, Index, ForeignKey
 from sqlalchemy.orm import declarative_base, sessionmaker
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
 from datetime import datetime, timezone
+from dotenv import load_dotenv
 import enum
+import os
 
-DATABASE_URL = "sqlite:///finance_bot_sqlalchemy.db"
-engine = create_engine(DATABASE_URL)
+# Carregar variáveis de ambiente antes de montar os engines
+load_dotenv()
+
+DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///finance_bot_sqlalchemy.db")
+
+
+def env_int(name: str, default: int) -> int:
+    value = os.getenv(name)
+    return int(value) if value else default
+
+
+# Perfil do SQLite (ignorado em bancos servidor)
+SQLITE_PRAGMAS = {
+    "journal_mode": os.getenv("SQLITE_JOURNAL_MODE", "WAL"),
+    "synchronous": os.getenv("SQLITE_SYNCHRONOUS", "NORMAL"),
+    "cache_size": env_int("SQLITE_CACHE_SIZE", -64000),  # negativo = KiB (64 MB)
+    "mmap_size": env_int("SQLITE_MMAP_SIZE", 268435456),  # 256 MB
+    "busy_timeout": env_int("SQLITE_BUSY_TIMEOUT", 5000),  # ms
+    "temp_store": os.getenv("SQLITE_TEMP_STORE", "MEMORY"),
+}
+
+# Pool de conexões para bancos servidor (PostgreSQL)
+POOL_SETTINGS = {
+    "pool_size": env_int("DB_POOL_SIZE", 5),
+    "max_overflow": env_int("DB_MAX_OVERFLOW", 10),
+    "pool_timeout": env_int("DB_POOL_TIMEOUT", 30),
+    "pool_recycle": env_int("DB_POOL_RECYCLE", 1800),
+    "pool_pre_ping": True,
+}
+
+
+def to_sync_url(url: str) -> str:
+    """Normaliza 'postgres://' (Heroku/Render) e usa o psycopg 3 no engine síncrono (migrações)"""
+    if url.startswith("postgres://"):
+        return url.replace("postgres://", "postgresql+psycopg://", 1)
+    if url.startswith("postgresql://"):
+        return url.replace("postgresql://", "postgresql+psycopg://", 1)
+    return url
+
+
+def to_async_url(url: str) -> str:
+    """Converte a URL síncrona para o driver assíncrono equivalente (aiosqlite/asyncpg)"""
+    if url.startswith("sqlite://"):
+        return url.replace("sqlite://", "sqlite+aiosqlite://", 1)
+    if url.startswith("postgresql://"):
+        return url.replace("postgresql://", "postgresql+asyncpg://", 1)
+    if url.startswith("postgres://"):
+        return url.replace("postgres://", "postgresql+asyncpg://", 1)
+    return url
+
+
+def is_sqlite(url: str) -> bool:
+    return url.startswith("sqlite")
+
+
+def set_sqlite_pragmas(dbapi_connection, connection_record):
+    """Aplica o perfil de PRAGMAs em cada nova conexão SQLite"""
+    cursor = dbapi_connection.cursor()
+    try:
+        for name, value in SQLITE_PRAGMAS.items():
+            cursor.execute(f"PRAGMA {name}={value}")
+    finally:
+        cursor.close()
+
+
+def engine_options(url: str) -> dict:
+    if is_sqlite(url):
+        return {"connect_args": {"timeout": SQLITE_PRAGMAS["busy_timeout"] / 1000}}
+    return dict(POOL_SETTINGS)
+
+
+def build_engine(url: str = None):
+    """Cria o engine síncrono (migrações e scripts) a partir do ambiente"""
+    url = to_sync_url(url or DATABASE_URL)
+    new_engine = create_engine(url, **engine_options(url))
+    if is_sqlite(url):
+        event.listen(new_engine, "connect", set_sqlite_pragmas)
+    return new_engine
+
+
+def build_async_engine(url: str = None):
+    """Cria o engine assíncrono usado pelos handlers do bot"""
+    url = url or os.getenv("ASYNC_DATABASE_URL") or to_async_url(DATABASE_URL)
+    new_engine = create_async_engine(url, **engine_options(url))
+    if is_sqlite(url):
+        event.listen(new_engine.sync_engine, "connect", set_sqlite_pragmas)
+    return new_engine
+
+
+engine = build_engine()
 Session = sessionmaker(bind=engine)
+
+# Engine assíncrono usado pelos handlers do bot (não bloqueia o event loop)
+async_engine = build_async_engine()
+AsyncSession = async_sessionmaker(bind=async_engine, expire_on_commit=False)
+
 Base = declarative_base()
 
 class TransactionType(enum.Enum):
@@ -16,37 +112,159 @@ class Transaction(Base):
     __tablename__ = 'transactions'
     
     id = Column(Integer, primary_key=True, autoincrement=True)
-    user_id = Column(Integer, nullable=False)
+    user_id = Column(BigInteger, nullable=False)
     type = Column(Enum(TransactionType), nullable=False)
     amount = Column(DECIMAL(10, 2), nullable=False)
     category = Column(String(100), nullable=False)
     description = Column(String(500))
     date = Column(Date, nullable=False)
     created_at = Column(DateTime, default=datetime.utcnow)
+    # Nota fiscal resumida por esta transação (id em receipts); itens em receipt_items
+    receipt_id = Column(Integer)
+    
+    __table_args__ = (
+        # Extrato, saldo e relatório: user_id + intervalo de datas, ordenado por date/id
+        Index('ix_transactions_user_date_id', 'user_id', 'date', 'id'),
+        # Totais por tipo no mês
+        Index('ix_transactions_user_type_date', 'user_id', 'type', 'date'),
+    )
     
 class Category(Base):
     __tablename__ = 'categories'
     
     id = Column(Integer, primary_key=True, autoincrement=True)
-    user_id = Column(Integer, nullable=False)
+    user_id = Column(BigInteger, nullable=False)
     name = Column(String(100), nullable=False)
     type = Column(Enum(TransactionType), nullable=False)
     
+    __table_args__ = (
+        Index('ix_categories_user_type_name', 'user_id', 'type', 'name'),
+    )
+    
+
+class CategoryAlias(Base):
+    """Apelidos de categoria do usuário ("almoço" -> "alimentação"), usados pelo índice de categorias"""
+    __tablename__ = 'category_aliases'
+    
+    user_id = Column(BigInteger, primary_key=True)
+    type = Column(Enum(TransactionType), primary_key=True)
+    alias = Column(String(100), primary_key=True)  # sem acentos, minúsculo
+    category = Column(String(100), nullable=False)
+
+
+class MonthlyTotal(Base):
+    """Totais mensais por categoria, mantidos junto com cada escrita em transactions"""
+    __tablename__ = 'monthly_totals'
+    
+    user_id = Column(BigInteger, primary_key=True)
+    month = Column(String(7), primary_key=True)  # 'YYYY-MM'
+    type = Column(Enum(TransactionType), primary_key=True)
+    category = Column(String(100), primary_key=True)
+    # Centavos em inteiro: somas incrementais sem erro de ponto flutuante
+    total_cents = Column(Integer, nullable=False, default=0)
+    count = Column(Integer, nullable=False, default=0)
+
+
+class NfCache(Base):
+    """Dados já extraídos de cada NFC-e, pela chave de acesso (44 dígitos)"""
+    __tablename__ = 'nf_cache'
+    
+    access_key = Column(String(44), primary_key=True)
+    payload = Column(Text, nullable=False)  # JSON com shop_info/items
+    fetched_at = Column(DateTime, nullable=False, default=datetime.utcnow)
+
+
+class NfConfirmation(Base):
+    """Notas cujas despesas o usuário já registrou (detecção de duplicadas)"""
+    __tablename__ = 'nf_confirmations'
+    
+    user_id = Column(BigInteger, primary_key=True)
+    access_key = Column(String(44), primary_key=True)
+    confirmed_at = Column(DateTime, nullable=False, default=datetime.utcnow)
+
+
+class UserState(Base):
+    """context.user_data persistido por chave (fluxo das notas), com expiração"""
+    __tablename__ = 'user_state'
+    
+    user_id = Column(BigInteger, primary_key=True)
+    key = Column(String(64), primary_key=True)
+    value = Column(Text, nullable=False)  # JSON
+    updated_at = Column(DateTime, nullable=False, default=datetime.utcnow)
+    expires_at = Column(DateTime, nullable=False)
+    
+    __table_args__ = (
+        Index('ix_user_state_expires_at', 'expires_at'),
+    )
+
+
+class PendingUpdate(Base):
+    """Atualizações do Telegram aguardando o worker da partição (BOT_WORKERS > 1)"""
+    __tablename__ = 'pending_updates'
+    
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    update_id = Column(BigInteger, nullable=False, unique=True)  # reentregas do Telegram são ignoradas
+    shard = Column(Integer, nullable=False)
+    payload = Column(Text, nullable=False)  # JSON da atualização
+    created_at = Column(DateTime, nullable=False, default=datetime.utcnow)
+    
+    __table_args__ = (
+        Index('ix_pending_updates_shard_update_id', 'shard', 'update_id'),
+    )
+
+
+class Receipt(Base):
+    """Nota fiscal registrada; vira uma única transação, com os itens em receipt_items"""
+    __tablename__ = 'receipts'
+    
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    user_id = Column(BigInteger, nullable=False)
+    access_key = Column(String(44))
+    cnpj = Column(String(20))
+    store = Column(String(200), nullable=False)
+    total = Column(DECIMAL(10, 2), nullable=False)
+    date = Column(Date, nullable=False)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    
+    __table_args__ = (
+        Index('ix_receipts_user_access_key', 'user_id', 'access_key'),
+    )
+
+
+class ReceiptItem(Base):
+    """Item de uma nota fiscal, lido só no detalhamento (/nota)"""
+    __tablename__ = 'receipt_items'
+    
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    receipt_id = Column(Integer, ForeignKey('receipts.id', ondelete='CASCADE'), nullable=False)
+    position = Column(Integer, nullable=False)
+    code = Column(String(60))
+    description = Column(String(500), nullable=False)
+    quantity = Column(DECIMAL(12, 4))
+    unit = Column(String(10))
+    unit_price = Column(DECIMAL(10, 2))
+    total = Column(DECIMAL(10, 2), nullable=False)
+    
+    __table_args__ = (
+        Index('ix_receipt_items_receipt_position', 'receipt_id', 'position'),
+    )
+
 
 class Budget(Base):
     __tablename__ = 'budgets'
     
     id = Column(Integer, primary_key=True, autoincrement=True)
-    user_id = Column(Integer, nullable=False)
+    user_id = Column(BigInteger, nullable=False)
     name = Column(String(100), nullable=False)
     category = Column(String(100), nullable=False)
     amount = Column(DECIMAL(10, 2), nullable=False)
     month = Column(String(10), nullable=False)
 
 def init_database():
-    """Criar todas as tabelas no banco de dados"""
+    """Criar/atualizar o schema do banco aplicando as migrações pendentes"""
+    from tools.migrations import run_migrations
     try:
-        Base.metadata.create_all(engine)
+        run_migrations(engine)
         print("✅ Banco de dados criado com sucesso!")
         return True
     except Exception as e:
@@ -57,6 +275,14 @@ def get_session():
     """Obter nova sessão do banco"""
     return Session()
 
+def get_async_session():
+    """Obter nova sessão assíncrona do banco (usar com await nos handlers)"""
+    return AsyncSession()
+
+async def close_database(*args):
+    """Libera as conexões do engine assíncrono ao encerrar o bot"""
+    await async_engine.dispose()
+
 class Database:
     def __init__(self):
         self.engine = engine
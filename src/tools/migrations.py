@@ -0,0 +1,153 @@
+"""
+Migrações versionadas do schema.
+
+Cada migração recebe uma conexão já dentro de uma transação e deve ser
+idempotente (checkfirst), pois bancos antigos foram criados com create_all
+e não possuem a tabela schema_version.
+"""
+from contextlib import contextmanager
+from datetime import datetime
+from sqlalchemy import MetaData, Table, Column, Integer, String, DateTime, select, insert, inspect, text
+from tools.database import (
+    Base, Transaction, Category, Budget, MonthlyTotal, NfCache, NfConfirmation, Receipt, ReceiptItem,
+    CategoryAlias, UserState, PendingUpdate
+)
+from tools.rollup import rebuild_statements
+
+schema_version = Table(
+    'schema_version', MetaData(),
+    Column('version', Integer, primary_key=True),
+    Column('description', String(200), nullable=False),
+    Column('applied_at', DateTime, nullable=False),
+)
+
+MIGRATIONS = []
+# Chave do pg_advisory_lock que serializa as migrações entre workers
+MIGRATION_LOCK_KEY = 7290431
+
+
+def migration(version: int, description: str):
+    """Registra uma função como migração da versão informada"""
+    def decorator(func):
+        MIGRATIONS.append((version, description, func))
+        return func
+    return decorator
+
+
+def create_indexes(connection, table, *names):
+    """Cria os índices declarados no modelo (por nome) caso ainda não existam"""
+    for index in table.indexes:
+        if index.name in names:
+            index.create(connection, checkfirst=True)
+
+
+def add_column(connection, table, name):
+    """Adiciona a coluna declarada no modelo (ALTER TABLE ... ADD COLUMN) caso ainda não exista"""
+    if name in {column['name'] for column in inspect(connection).get_columns(table.name)}:
+        return
+    column_type = table.c[name].type.compile(dialect=connection.dialect)
+    connection.execute(text(f'ALTER TABLE {table.name} ADD COLUMN {name} {column_type}'))
+
+
+@migration(1, "Tabelas iniciais")
+def create_initial_tables(connection):
+    Base.metadata.create_all(
+        connection,
+        tables=[Transaction.__table__, Category.__table__, Budget.__table__],
+        checkfirst=True
+    )
+
+
+@migration(2, "Índices compostos em transactions e categories")
+def add_composite_indexes(connection):
+    create_indexes(connection, Transaction.__table__,
+                   'ix_transactions_user_date_id', 'ix_transactions_user_type_date')
+    create_indexes(connection, Category.__table__, 'ix_categories_user_type_name')
+
+
+@migration(3, "Tabela de totais mensais (monthly_totals)")
+def add_monthly_totals(connection):
+    MonthlyTotal.__table__.create(connection, checkfirst=True)
+    for stmt in rebuild_statements(connection.dialect.name):
+        connection.execute(stmt)
+
+
+@migration(4, "Cache de notas fiscais e confirmações (nf_cache, nf_confirmations)")
+def add_nf_cache(connection):
+    NfCache.__table__.create(connection, checkfirst=True)
+    NfConfirmation.__table__.create(connection, checkfirst=True)
+
+
+@migration(5, "Notas fiscais normalizadas (receipts, receipt_items, transactions.receipt_id)")
+def add_receipts(connection):
+    Receipt.__table__.create(connection, checkfirst=True)
+    ReceiptItem.__table__.create(connection, checkfirst=True)
+    add_column(connection, Transaction.__table__, 'receipt_id')
+
+
+@migration(6, "Apelidos de categoria (category_aliases)")
+def add_category_aliases(connection):
+    CategoryAlias.__table__.create(connection, checkfirst=True)
+
+
+@migration(7, "Estado das conversas por usuário (user_state)")
+def add_user_state(connection):
+    UserState.__table__.create(connection, checkfirst=True)
+
+
+@migration(8, "user_id em BIGINT e fila de atualizações entre workers (pending_updates)")
+def add_pending_updates(connection):
+    # Ids do Telegram passam de 2^31; no SQLite INTEGER já tem 64 bits
+    if connection.dialect.name == 'postgresql':
+        for table in (Transaction, Category, Budget, CategoryAlias, MonthlyTotal, NfConfirmation, Receipt, UserState):
+            connection.execute(text(f'ALTER TABLE {table.__tablename__} ALTER COLUMN user_id TYPE BIGINT'))
+    PendingUpdate.__table__.create(connection, checkfirst=True)
+
+
+@migration(9, "Partições de pending_updates consumidas na ordem do update_id")
+def order_pending_updates(connection):
+    create_indexes(connection, PendingUpdate.__table__, 'ix_pending_updates_shard_update_id')
+    connection.execute(text('DROP INDEX IF EXISTS ix_pending_updates_shard_id'))
+
+
+def get_current_version(connection) -> int:
+    schema_version.create(connection, checkfirst=True)
+    current = connection.execute(select(schema_version.c.version).order_by(schema_version.c.version.desc())).first()
+    return current[0] if current else 0
+
+
+@contextmanager
+def migration_lock(engine):
+    """No PostgreSQL, só um worker aplica as migrações; os demais esperam e encontram o schema pronto"""
+    if engine.dialect.name != 'postgresql':
+        yield
+        return
+    with engine.connect() as connection:
+        connection.execute(text('SELECT pg_advisory_lock(:key)'), {'key': MIGRATION_LOCK_KEY})
+        try:
+            yield
+        finally:
+            connection.execute(text('SELECT pg_advisory_unlock(:key)'), {'key': MIGRATION_LOCK_KEY})
+            connection.commit()
+
+
+def run_migrations(engine):
+    """Aplica, em ordem, as migrações ainda não registradas em schema_version"""
+    with migration_lock(engine):
+        with engine.begin() as connection:
+            current = get_current_version(connection)
+
+        for version, description, func in sorted(MIGRATIONS, key=lambda m: m[0]):
+            if version <= current:
+                continue
+            with engine.begin() as connection:
+                func(connection)
+                connection.execute(insert(schema_version).values(
+                    version=version,
+                    description=description,
+                    applied_at=datetime.utcnow()
+                ))
+            print(f"🔧 Migração {version} aplicada: {description}")
+            current = version
+
+    return current
@@ -0,0 +1,98 @@
+"""
+Servidor HTTP local que simula a consulta de NFC-e da SEFAZ.
+
+Rotas:
+  /nfce/<arquivo>           página salva em fixtures/nfce/<arquivo>.html
+  /nfce/gerada?itens=N      página sintética com N itens
+  /nfce/js                  página sem #tabResult (força o fallback Selenium)
+
+Uso (a partir de src/):
+  python -m tools.nf_fixture_server [--port 8765]
+  python -m tools.nf_fixture_server --check   # valida o caminho HTTP sem rede externa
+"""
+import argparse
+import asyncio
+import os
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlparse, parse_qs
+from tools.nf_fixtures import render_receipt, JS_SHELL
+
+FIXTURES_DIR = os.path.join(os.path.dirname(__file__), '..', '..', 'fixtures', 'nfce')
+
+
+class NfFixtureHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep-alive, como a SEFAZ
+
+    def do_GET(self):
+        parsed = urlparse(self.path)
+        name = parsed.path.rstrip('/').split('/')[-1]
+
+        if parsed.path.startswith('/nfce/gerada'):
+            items = int(parse_qs(parsed.query).get('itens', ['10'])[0])
+            return self.send_html(render_receipt(items))
+        if parsed.path == '/nfce/js':
+            return self.send_html(JS_SHELL)
+
+        path = os.path.join(FIXTURES_DIR, f"{os.path.basename(name)}.html")
+        if parsed.path.startswith('/nfce/') and os.path.isfile(path):
+            with open(path, encoding='utf-8') as f:
+                return self.send_html(f.read())
+
+        self.send_error(404)
+
+    def send_html(self, html: str):
+        body = html.encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/html; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_server(port: int = 0) -> ThreadingHTTPServer:
+    """Sobe o servidor em uma thread e retorna a instância (porta em server_address)"""
+    server = ThreadingHTTPServer(('127.0.0.1', port), NfFixtureHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+async def check(base_url: str):
+    """Busca as páginas locais com o NfHttpFetcher e confere o parsing"""
+    from nf_fetcher import NfHttpFetcher
+    from nf_parser import parse_nf_page
+    from read_qrcode import NfReaderConfig
+
+    fetcher = NfHttpFetcher(NfReaderConfig().user_agent)
+    try:
+        for name in sorted(os.listdir(FIXTURES_DIR)):
+            url = f"{base_url}/nfce/{name[:-5]}"
+            html = await fetcher.fetch(url)
+            if html is None:
+                print(f"↪️  {name}: sem #tabResult (usaria Selenium)")
+                continue
+            data = parse_nf_page(html)
+            print(f"✅ {name}: {data['shop_info']['loja']} - {len(data['items'])} itens")
+        assert await fetcher.fetch(f"{base_url}/nfce/js") is None
+        print("✅ /nfce/js cai no fallback do Selenium")
+    finally:
+        await fetcher.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--check', action='store_true')
+    args = parser.parse_args()
+
+    server = start_server(0 if args.check else args.port)
+    base_url = f"http://127.0.0.1:{server.server_address[1]}"
+    if args.check:
+        asyncio.run(check(base_url))
+        server.shutdown()
+    else:
+        print(f"🧾 Servindo NFC-e de teste em {base_url}/nfce/")
+        threading.Event().wait()
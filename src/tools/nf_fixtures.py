@@ -0,0 +1,85 @@
+"""
+Páginas de consulta de NFC-e sintéticas, no mesmo layout da SEFAZ
+(div.txtCenter + table#tabResult), para testes offline e benchmarks.
+"""
+import random
+
+PRODUCTS = [
+    ("ARROZ TIPO 1 5KG", "UN", 24.90), ("FEIJAO CARIOCA 1KG", "UN", 8.49),
+    ("LEITE INTEGRAL 1L", "UN", 4.79), ("CAFE TORRADO 500G", "UN", 17.90),
+    ("BANANA PRATA", "KG", 5.99), ("TOMATE ITALIANO", "KG", 8.90),
+    ("PAO FRANCES", "KG", 14.90), ("DETERGENTE NEUTRO 500ML", "UN", 2.39),
+    ("SABONETE 85G", "UN", 1.99), ("FRANGO PEITO S/OSSO", "KG", 21.90),
+    ("OVOS BRANCOS DZ", "DZ", 12.50), ("ACUCAR CRISTAL 1KG", "UN", 4.69),
+]
+
+PAGE = """<!DOCTYPE html>
+<html lang="pt-br">
+<head><meta charset="utf-8"><title>DOCUMENTO AUXILIAR DA NOTA FISCAL DE CONSUMIDOR ELETRÔNICA</title></head>
+<body>
+<div id="conteudo">
+  <div class="txtCenter">
+    <div id="u20" class="txtTopo">{loja}</div>
+    <div class="text">
+      CNPJ:
+      {cnpj}
+    </div>
+    <div class="text">
+      {endereco}
+    </div>
+  </div>
+  <table id="tabResult" cellspacing="0" cellpadding="0" align="center" border="0">
+{rows}
+  </table>
+  <div id="totalNota" class="txtRight">
+    <div id="linhaTotal"><label>Qtd. total de itens:</label><span class="totalNumb">{count}</span></div>
+    <div id="linhaTotal" class="linhaShade"><label>Valor a pagar R$:</label><span class="totalNumb txtMax">{total}</span></div>
+  </div>
+</div>
+</body>
+</html>
+"""
+
+ROW = """    <tr id="Item + {n}">
+      <td valign="top"><span class="txtTit">{descricao}</span><span class="RCod">(Código: {codigo} )</span><br/><span class="Rqtd"><strong>Qtde.:</strong>{quantidade}</span><span class="RUN"><strong>UN: </strong>{unidade}</span><span class="RvlUnit"><strong>Vl. Unit.:</strong>&nbsp;&nbsp;{valor_unitario}</span></td>
+      <td align="right" valign="top" class="txtTit noWrap">Vl. Total<br/><span class="valor">{valor_total}</span></td>
+    </tr>"""
+
+# Página que só preenche a tabela via JavaScript (exige o fallback com Selenium)
+JS_SHELL = """<!DOCTYPE html>
+<html><head><meta charset="utf-8"><title>Consulta NFC-e</title></head>
+<body><div id="conteudo"></div><script src="/static/consulta.js"></script></body></html>
+"""
+
+
+def br_number(value: float, decimals: int = 2) -> str:
+    return f"{value:.{decimals}f}".replace('.', ',')
+
+
+def render_receipt(items: int = 10, seed: int = 0) -> str:
+    """Gera o HTML de uma NFC-e com a quantidade de itens pedida"""
+    rng = random.Random(seed)
+    rows = []
+    total = 0
+    for n in range(1, items + 1):
+        descricao, unidade, preco = rng.choice(PRODUCTS)
+        quantidade = round(rng.uniform(0.2, 2.5), 3) if unidade == "KG" else rng.randint(1, 4)
+        valor_total = round(preco * quantidade, 2)
+        total += valor_total
+        rows.append(ROW.format(
+            n=n,
+            descricao=descricao,
+            codigo=f"789{rng.randint(0, 10**10 - 1):010d}",
+            quantidade=br_number(quantidade, 3 if unidade == "KG" else 0),
+            unidade=unidade,
+            valor_unitario=br_number(preco),
+            valor_total=br_number(valor_total),
+        ))
+    return PAGE.format(
+        loja="SUPERMERCADO EXEMPLO LTDA",
+        cnpj="12.345.678/0001-90",
+        endereco="RUA DAS FLORES, 123, , CENTRO, CURITIBA, PR",
+        rows="\n".join(rows),
+        count=items,
+        total=br_number(total),
+    )
@@ -0,0 +1,145 @@
+"""
+Manutenção da tabela monthly_totals.
+
+Toda escrita em transactions (inserção, edição e exclusão) deve aplicar o
+delta correspondente na mesma sessão/commit, para que /saldo e /relatorio
+leiam apenas os totais já agregados.
+"""
+import asyncio
+import sys
+from datetime import date
+from decimal import Decimal
+from sqlalchemy import select, delete, insert, func, cast, Integer
+from sqlalchemy.dialects import postgresql, sqlite
+from tools.database import MonthlyTotal, Transaction
+
+
+def month_key(day: date) -> str:
+    return day.strftime('%Y-%m')
+
+
+def to_cents(amount) -> int:
+    return int((Decimal(str(amount)) * 100).to_integral_value())
+
+
+def _dialect_insert(dialect_name: str):
+    return postgresql.insert if dialect_name == 'postgresql' else sqlite.insert
+
+
+def _month_expression(dialect_name: str):
+    if dialect_name == 'postgresql':
+        return func.to_char(Transaction.date, 'YYYY-MM')
+    return func.strftime('%Y-%m', Transaction.date)
+
+
+async def apply_delta(session, user_id: int, day: date, trans_type, category: str, amount, count: int):
+    """Soma (ou subtrai) valor e quantidade no total do mês/categoria"""
+    dialect_name = session.bind.dialect.name
+    key = dict(user_id=user_id, month=month_key(day), type=trans_type, category=category)
+
+    stmt = _dialect_insert(dialect_name)(MonthlyTotal).values(**key, total_cents=to_cents(amount), count=count)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=['user_id', 'month', 'type', 'category'],
+        set_={
+            'total_cents': MonthlyTotal.total_cents + stmt.excluded.total_cents,
+            'count': MonthlyTotal.count + stmt.excluded.count,
+        }
+    )
+    await session.execute(stmt)
+
+    if count < 0:
+        await session.execute(delete(MonthlyTotal).filter_by(**key).where(MonthlyTotal.count <= 0))
+
+
+async def record_transaction(session, transaction):
+    await apply_delta(session, transaction.user_id, transaction.date, transaction.type,
+                      transaction.category, transaction.amount, 1)
+
+
+async def unrecord_transaction(session, transaction):
+    await apply_delta(session, transaction.user_id, transaction.date, transaction.type,
+                      transaction.category, -Decimal(str(transaction.amount)), -1)
+
+
+def aggregate_transactions(dialect_name: str, user_id: int = None):
+    """SELECT que recalcula os totais mensais direto de transactions"""
+    month = _month_expression(dialect_name)
+    stmt = select(
+        Transaction.user_id,
+        month.label('month'),
+        Transaction.type,
+        Transaction.category,
+        cast(func.round(func.sum(Transaction.amount) * 100), Integer).label('total_cents'),
+        func.count(Transaction.id).label('count')
+    ).group_by(Transaction.user_id, month, Transaction.type, Transaction.category)
+    if user_id is not None:
+        stmt = stmt.where(Transaction.user_id == user_id)
+    return stmt
+
+
+def rebuild_statements(dialect_name: str, user_id: int = None):
+    """DELETE + INSERT ... SELECT que reconstroem monthly_totals"""
+    clear = delete(MonthlyTotal)
+    if user_id is not None:
+        clear = clear.where(MonthlyTotal.user_id == user_id)
+    fill = insert(MonthlyTotal).from_select(
+        ['user_id', 'month', 'type', 'category', 'total_cents', 'count'],
+        aggregate_transactions(dialect_name, user_id)
+    )
+    return [clear, fill]
+
+
+async def rebuild_monthly_totals(session, user_id: int = None):
+    for stmt in rebuild_statements(session.bind.dialect.name, user_id):
+        await session.execute(stmt)
+
+
+async def verify_monthly_totals(session, user_id: int = None):
+    """Compara monthly_totals com transactions e retorna as divergências encontradas"""
+    expected = {
+        (row.user_id, row.month, row.type, row.category): (row.total_cents, row.count)
+        for row in (await session.execute(aggregate_transactions(session.bind.dialect.name, user_id))).all()
+    }
+
+    stored_query = select(MonthlyTotal)
+    if user_id is not None:
+        stored_query = stored_query.where(MonthlyTotal.user_id == user_id)
+    stored = {
+        (t.user_id, t.month, t.type, t.category): (t.total_cents, t.count)
+        for t in (await session.scalars(stored_query)).all()
+    }
+
+    drift = []
+    for key in expected.keys() | stored.keys():
+        if expected.get(key) != stored.get(key):
+            drift.append({
+                'user_id': key[0],
+                'month': key[1],
+                'type': key[2],
+                'category': key[3],
+                'expected': expected.get(key),
+                'stored': stored.get(key),
+            })
+    return drift
+
+
+async def _main(args):
+    from tools.database import get_async_session, close_database
+    session = get_async_session()
+    try:
+        drift = await verify_monthly_totals(session)
+        print(f"🔎 {len(drift)} divergência(s) em monthly_totals")
+        for item in drift:
+            print(f"  • {item}")
+        if drift and '--rebuild' in args:
+            await rebuild_monthly_totals(session)
+            await session.commit()
+            print("✅ monthly_totals reconstruída")
+    finally:
+        await session.close()
+        await close_database()
+
+
+if __name__ == "__main__":
+    # python -m tools.rollup [--rebuild]  (executar a partir de src/)
+    asyncio.run(_main(sys.argv[1:]))
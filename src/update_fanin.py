@@ -0,0 +1,174 @@
+"""
+Vários workers com o mesmo token (BOT_WORKERS > 1), sobre um banco servidor.
+
+Cada atualização pertence a uma partição, pelo hash do user_id (ou do chat,
+quando não há usuário): crc32(id) % BOT_WORKERS. O worker BOT_WORKER_INDEX
+só processa a sua partição, então todas as atualizações de um usuário caem
+sempre no mesmo worker e em ordem: o estado em memória (índice de
+categorias, álbuns, fila de notas, user_data carregado) nunca é disputado
+entre processos.
+
+Entrada (fan-in): no modo webhook qualquer worker recebe a atualização; no
+modo polling só o worker 0 chama getUpdates. Em ambos a atualização é
+gravada em pending_updates com a sua partição (reentregas com o mesmo
+update_id são ignoradas) e cada worker consome a própria partição na ordem
+do update_id, com FOR UPDATE SKIP LOCKED no PostgreSQL.
+
+No modo webhook a ordem por usuário é a melhor possível, não garantida:
+entregas simultâneas são gravadas em transações independentes, e uma
+atualização que só é gravada depois que outra mais nova do mesmo usuário
+já foi consumida é processada depois dela. No modo polling o lote inteiro
+é gravado em uma transação e a ordem é a do getUpdates.
+"""
+import asyncio
+import json
+import os
+import signal
+import zlib
+from datetime import datetime
+from sqlalchemy import select, delete
+from sqlalchemy.dialects import postgresql, sqlite
+from telegram import Update
+from tools.database import get_async_session, PendingUpdate
+
+
+def _dialect_insert(dialect_name: str):
+    return postgresql.insert if dialect_name == 'postgresql' else sqlite.insert
+
+
+class UpdateFanIn:
+    def __init__(self, application):
+        self.application = application
+        self.workers = int(os.getenv('BOT_WORKERS', '1'))
+        self.index = int(os.getenv('BOT_WORKER_INDEX', '0'))
+        self.batch_size = int(os.getenv('FANIN_BATCH_SIZE', '100'))
+        self.poll_interval = float(os.getenv('FANIN_POLL_INTERVAL', '0.2'))
+        if not 0 <= self.index < self.workers:
+            raise RuntimeError(f"BOT_WORKER_INDEX deve estar entre 0 e {self.workers - 1}")
+
+    def shard_for(self, update: Update) -> int:
+        owner = update.effective_user or update.effective_chat
+        if owner is None:
+            return 0
+        return zlib.crc32(str(owner.id).encode()) % self.workers
+
+    async def ingest(self, updates: list) -> None:
+        """Grava as atualizações na partição de cada uma (uma transação)"""
+        if not updates:
+            return
+        now = datetime.utcnow()
+        rows = [{
+            'update_id': update.update_id,
+            'shard': self.shard_for(update),
+            'payload': json.dumps(update.to_dict(), ensure_ascii=False),
+            'created_at': now,
+        } for update in updates]
+
+        session = get_async_session()
+        try:
+            stmt = _dialect_insert(session.bind.dialect.name)(PendingUpdate).on_conflict_do_nothing(
+                index_elements=['update_id']
+            )
+            await session.execute(stmt, rows)
+            await session.commit()
+        except Exception:
+            await session.rollback()
+            raise
+        finally:
+            await session.close()
+
+    async def ingest_one(self, update: Update) -> None:
+        await self.ingest([update])
+
+    async def _take_batch(self) -> list:
+        session = get_async_session()
+        try:
+            rows = (await session.execute(
+                select(PendingUpdate.id, PendingUpdate.payload)
+                .where(PendingUpdate.shard == self.index)
+                .order_by(PendingUpdate.update_id)
+                .limit(self.batch_size)
+                .with_for_update(skip_locked=True)
+            )).all()
+            if rows:
+                await session.execute(delete(PendingUpdate).where(PendingUpdate.id.in_([row.id for row in rows])))
+            await session.commit()
+        except Exception:
+            await session.rollback()
+            raise
+        finally:
+            await session.close()
+        return [Update.de_json(json.loads(payload), self.application.bot) for _, payload in rows]
+
+    async def consume(self) -> None:
+        """Entrega à Application, em ordem, as atualizações da partição deste worker"""
+        while True:
+            try:
+                updates = await self._take_batch()
+            except Exception as e:
+                print(f"Erro ao ler atualizações da partição {self.index}: {e}")
+                await asyncio.sleep(self.poll_interval * 10)
+                continue
+            for update in updates:
+                await self.application.update_queue.put(update)
+            if len(updates) < self.batch_size:
+                await asyncio.sleep(self.poll_interval)
+
+    async def poll_telegram(self) -> None:
+        """getUpdates (só no worker 0): o offset só avança depois que o lote foi gravado"""
+        bot = self.application.bot
+        await bot.delete_webhook()
+        offset = None
+        while True:
+            try:
+                updates = await bot.get_updates(offset=offset, timeout=30, allowed_updates=Update.ALL_TYPES)
+                await self.ingest(updates)
+            except Exception as e:
+                print(f"Erro ao buscar atualizações do Telegram: {e}")
+                await asyncio.sleep(3)
+                continue
+            if updates:
+                offset = updates[-1].update_id + 1
+
+    async def run(self) -> None:
+        """Modo polling com vários workers; bloqueia até SIGINT/SIGTERM"""
+        stop = asyncio.Event()
+        loop = asyncio.get_running_loop()
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            loop.add_signal_handler(sig, stop.set)
+
+        application = self.application
+        await application.initialize()
+        if application.post_init:
+            await application.post_init(application)
+        await application.start()
+
+        tasks = [asyncio.create_task(self.consume())]
+        if self.index == 0:
+            tasks.append(asyncio.create_task(self.poll_telegram()))
+        print(f"🧩 Worker {self.index + 1}/{self.workers} consumindo a partição {self.index}")
+
+        try:
+            await stop.wait()
+        finally:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            # Processa o que já foi retirado da partição antes de sair
+            await application.stop()
+            if application.post_stop:
+                await application.post_stop(application)
+            await application.shutdown()
+            if application.post_shutdown:
+                await application.post_shutdown(application)
+
+
+def run_worker(application):
+    """Bloqueia rodando este worker (webhook ou polling) até SIGINT/SIGTERM"""
+    fanin = UpdateFanIn(application)
+    if os.getenv('BOT_MODE', 'polling').lower() == 'webhook':
+        from webhook_server import WebhookServer
+        server = WebhookServer(application, ingress=fanin.ingest_one, tasks=[fanin.consume])
+        asyncio.run(server.run())
+    else:
+        asyncio.run(fanin.run())
@@ -0,0 +1,71 @@
+import asyncio
+import os
+from telegram.ext import BaseUpdateProcessor
+
+
+class PerUserUpdateProcessor(BaseUpdateProcessor):
+    """
+    Processa atualizações de usuários diferentes em paralelo e as de um
+    mesmo usuário em ordem, uma de cada vez.
+
+    Assim um /relatorio ou uma nota demorada não trava os outros usuários,
+    e os fluxos que usam context.user_data (nf_data, confirmações de
+    edição/exclusão) nunca rodam duas vezes ao mesmo tempo para o mesmo
+    usuário. Atualizações sem usuário caem no chat; sem nenhum dos dois,
+    não são serializadas.
+
+    O limite de execução (BOT_MAX_CONCURRENT_UPDATES) só é ocupado depois
+    que a atualização pega a vez do usuário: atualizações esperando atrás
+    de outra do mesmo usuário não tiram a vaga de outros usuários.
+    BOT_MAX_PENDING_UPDATES limita o total aceito (rodando + esperando).
+    """
+
+    def __init__(self, max_concurrent_updates: int = None, max_pending_updates: int = None):
+        self.running_limit = max_concurrent_updates or int(os.getenv('BOT_MAX_CONCURRENT_UPDATES', '16'))
+        pending = max_pending_updates or int(os.getenv('BOT_MAX_PENDING_UPDATES', '256'))
+        super().__init__(max(pending, self.running_limit))
+        self._running = asyncio.Semaphore(self.running_limit)
+        # chave -> [lock, atualizações usando a chave]; removida quando a última termina
+        self._locks = {}
+
+    @staticmethod
+    def key_for(update: object):
+        user = getattr(update, 'effective_user', None)
+        if user is not None:
+            return ('user', user.id)
+        chat = getattr(update, 'effective_chat', None)
+        if chat is not None:
+            return ('chat', chat.id)
+        return None
+
+    @property
+    def waiting_users(self) -> int:
+        """Usuários/chats com atualizações rodando ou na fila"""
+        return len(self._locks)
+
+    async def do_process_update(self, update: object, coroutine) -> None:
+        key = self.key_for(update)
+        if key is None:
+            async with self._running:
+                await coroutine
+            return
+
+        entry = self._locks.get(key)
+        if entry is None:
+            entry = self._locks[key] = [asyncio.Lock(), 0]
+        entry[1] += 1
+        try:
+            # asyncio.Lock atende em ordem de chegada: a ordem das mensagens é mantida
+            async with entry[0]:
+                async with self._running:
+                    await coroutine
+        finally:
+            entry[1] -= 1
+            if entry[1] == 0:
+                del self._locks[key]
+
+    async def initialize(self) -> None:
+        pass
+
+    async def shutdown(self) -> None:
+        self._locks.clear()
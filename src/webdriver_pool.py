@@ -0,0 +1,116 @@
+import queue
+import threading
+import time
+from contextlib import contextmanager
+
+
+class WebDriverPool:
+    """
+    Pool de sessões do Selenium reaproveitadas entre notas fiscais.
+
+    Cada sessão é emprestada com lease() e devolvida ao final; sessões com
+    erro, com muitos usos ou ociosas demais (o grid encerra sessões paradas)
+    são descartadas e recriadas sob demanda.
+    """
+
+    def __init__(self, factory, size: int = 5, max_uses: int = 50, max_idle: float = 240):
+        self.factory = factory
+        self.size = size
+        self.max_uses = max_uses
+        self.max_idle = max_idle
+        self._idle = queue.LifoQueue()
+        self._slots = threading.BoundedSemaphore(size)
+        self._uses = {}
+        self._lock = threading.Lock()
+        self._closed = False
+
+    def warm_up(self, count: int = 1):
+        """Abre sessões antecipadamente para que a primeira nota não pague o startup do Chrome"""
+        count = min(count, self.size) - self._idle.qsize()
+        for _ in range(count):
+            try:
+                driver = self._create()
+            except Exception as e:
+                print(f"Erro ao aquecer sessão do Selenium: {e}")
+                break
+            self._idle.put((driver, time.monotonic()))
+
+    @contextmanager
+    def lease(self, timeout: float = 30):
+        """Empresta uma sessão saudável; a sessão volta ao pool ao sair do bloco"""
+        if not self._slots.acquire(timeout=timeout):
+            raise TimeoutError("Nenhuma sessão do Selenium disponível")
+        driver = None
+        failed = False
+        try:
+            driver = self._acquire()
+            yield driver
+        except Exception:
+            failed = True
+            raise
+        finally:
+            try:
+                if driver is not None:
+                    self._release(driver, failed)
+            finally:
+                self._slots.release()
+
+    def close(self):
+        """Encerra todas as sessões ociosas (chamado no desligamento do bot)"""
+        self._closed = True
+        while True:
+            try:
+                driver, _ = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            self._discard(driver)
+
+    def _create(self):
+        driver = self.factory()
+        with self._lock:
+            self._uses[id(driver)] = 0
+        return driver
+
+    def _acquire(self):
+        while True:
+            try:
+                driver, idle_since = self._idle.get_nowait()
+            except queue.Empty:
+                return self._create()
+            if time.monotonic() - idle_since > self.max_idle or not self._is_healthy(driver):
+                self._discard(driver)
+                continue
+            return driver
+
+    def _release(self, driver, failed: bool):
+        with self._lock:
+            self._uses[id(driver)] = self._uses.get(id(driver), 0) + 1
+            uses = self._uses[id(driver)]
+
+        if failed or self._closed or uses >= self.max_uses:
+            self._discard(driver)
+            return
+
+        try:
+            # Limpa o estado da navegação anterior antes de devolver ao pool
+            driver.delete_all_cookies()
+            driver.get("about:blank")
+        except Exception:
+            self._discard(driver)
+            return
+        self._idle.put((driver, time.monotonic()))
+
+    def _is_healthy(self, driver) -> bool:
+        try:
+            driver.execute_script("return 1")
+            return True
+        except Exception:
+            return False
+
+    def _discard(self, driver):
+        with self._lock:
+            self._uses.pop(id(driver), None)
+        try:
+            driver.quit()
+        except Exception:
+            pass
@@ -0,0 +1,147 @@
+"""
+Modo webhook (BOT_MODE=webhook), alternativa ao long polling.
+
+O Telegram entrega cada atualização por POST em WEBHOOK_PATH; o servidor
+(aiohttp) confere o cabeçalho X-Telegram-Bot-Api-Secret-Token, coloca a
+atualização na fila da Application e responde na hora. Como não há
+polling, várias réplicas podem ficar atrás de um balanceador.
+
+GET /healthz responde 200 enquanto o bot aceita atualizações e 503
+durante o encerramento, para o balanceador parar de enviar tráfego.
+No SIGTERM/SIGINT o servidor para de aceitar atualizações (503, que o
+Telegram reenvia depois), processa as que já estão na fila por até
+WEBHOOK_DRAIN_TIMEOUT segundos e só então encerra a Application.
+
+Com vários workers (update_fanin) a atualização recebida não vai direto
+para a fila: `ingress` a grava na partição do usuário, e `tasks` (o
+consumidor da partição deste worker) rodam junto com o servidor.
+"""
+import asyncio
+import hmac
+import json
+import os
+import signal
+from aiohttp import web
+from telegram import Update
+
+SECRET_HEADER = 'X-Telegram-Bot-Api-Secret-Token'
+
+
+class WebhookServer:
+    def __init__(self, application, ingress=None, tasks=()):
+        self.application = application
+        self.ingress = ingress or application.update_queue.put
+        self.task_factories = list(tasks)
+        self._tasks = []
+        self.url = os.getenv('WEBHOOK_URL', '').rstrip('/')
+        self.path = '/' + os.getenv('WEBHOOK_PATH', 'telegram').strip('/')
+        self.secret = os.getenv('WEBHOOK_SECRET', '')
+        self.listen = os.getenv('WEBHOOK_LISTEN', '0.0.0.0')
+        self.port = int(os.getenv('WEBHOOK_PORT', '8000'))
+        self.drain_timeout = float(os.getenv('WEBHOOK_DRAIN_TIMEOUT', '30'))
+        self.draining = False
+        self._stop = None
+
+    def build_app(self) -> web.Application:
+        app = web.Application()
+        app.router.add_post(self.path, self.handle_update)
+        app.router.add_get('/healthz', self.handle_health)
+        return app
+
+    async def handle_update(self, request: web.Request) -> web.Response:
+        if self.draining:
+            return web.Response(status=503)
+
+        # Sem o segredo correto, qualquer um poderia injetar atualizações
+        token = request.headers.get(SECRET_HEADER, '')
+        if not hmac.compare_digest(token.encode(), self.secret.encode()):
+            return web.Response(status=403)
+
+        try:
+            data = await request.json()
+            update = Update.de_json(data, self.application.bot)
+        except (json.JSONDecodeError, ValueError, TypeError, KeyError) as e:
+            print(f"Atualização inválida recebida no webhook: {e}")
+            return web.Response(status=400)
+
+        try:
+            await self.ingress(update)
+        except Exception as e:
+            # 500: o Telegram reenvia a atualização depois
+            print(f"Erro ao enfileirar atualização {update.update_id}: {e}")
+            return web.Response(status=500)
+        return web.Response()
+
+    async def handle_health(self, request: web.Request) -> web.Response:
+        status = 503 if self.draining or not self.application.running else 200
+        health = {
+            'status': 'draining' if self.draining else ('ok' if status == 200 else 'starting'),
+            'pending_updates': self.application.update_queue.qsize(),
+        }
+        rate_limiter = getattr(self.application.bot, 'rate_limiter', None)
+        if hasattr(rate_limiter, 'metrics'):
+            health['outbound'] = rate_limiter.metrics()
+        return web.json_response(health, status=status)
+
+    async def run(self):
+        if not self.url:
+            raise RuntimeError("WEBHOOK_URL é obrigatório no modo webhook")
+        if not self.secret:
+            raise RuntimeError("WEBHOOK_SECRET é obrigatório no modo webhook")
+
+        self._stop = asyncio.Event()
+        loop = asyncio.get_running_loop()
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            loop.add_signal_handler(sig, self._stop.set)
+
+        application = self.application
+        await application.initialize()
+        if application.post_init:
+            await application.post_init(application)
+
+        runner = web.AppRunner(self.build_app(), handle_signals=False)
+        await runner.setup()
+        try:
+            await application.start()
+            self._tasks = [asyncio.create_task(factory()) for factory in self.task_factories]
+            await web.TCPSite(runner, self.listen, self.port).start()
+            # Várias réplicas podem registrar a mesma URL; a última chamada vale
+            await application.bot.set_webhook(
+                url=self.url + self.path,
+                secret_token=self.secret,
+                allowed_updates=Update.ALL_TYPES,
+            )
+            print(f"🌐 Webhook ouvindo em {self.listen}:{self.port}{self.path}")
+
+            await self._stop.wait()
+        finally:
+            await self.drain(runner)
+
+    async def drain(self, runner: web.AppRunner):
+        """Para de aceitar atualizações e processa as que já estão na fila"""
+        self.draining = True
+        application = self.application
+        print(f"⏳ Encerrando: {application.update_queue.qsize()} atualizações pendentes")
+
+        # Aguarda as requisições em andamento; as novas recebem 503
+        await runner.cleanup()
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+
+        if application.running:
+            try:
+                await asyncio.wait_for(application.stop(), self.drain_timeout)
+            except asyncio.TimeoutError:
+                print(f"⚠️ Atualizações ainda pendentes após {self.drain_timeout:.0f}s; encerrando assim mesmo")
+            if application.post_stop:
+                await application.post_stop(application)
+
+        await application.shutdown()
+        if application.post_shutdown:
+            await application.post_shutdown(application)
+
+
+def run_webhook(application):
+    """Bloqueia servindo o webhook até SIGINT/SIGTERM"""
+    asyncio.run(WebhookServer(application).run())